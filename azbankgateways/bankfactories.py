@@ -1,18 +1,33 @@
 from __future__ import absolute_import, unicode_literals
 
+import contextvars
 import importlib
 import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.db import close_old_connections
 
 from . import default_settings as settings
 from .banks import BaseBank
+from .deadline import deadline, get_remaining_time
 from .exceptions.exceptions import BankGatewayAutoConnectionFailed
+from .health import health_registry
+from .metrics import metrics
 from .models import BankType
 
 
 class BankFactory:
+    # shared by all factories, probes of auto_create run on these threads.
+    _executor = None
+    _executor_lock = threading.Lock()
+
     def __init__(self):
         logging.debug("Create bank factory")
         self._secret_value_reader = self._import(settings.SETTING_VALUE_READER_CLASS)()
+        self._routing_policy = self._import(settings.ROUTING_POLICY_CLASS)()
 
     @staticmethod
     def _import(path):
@@ -31,28 +46,57 @@ class BankFactory:
 
         return bank_class, self._secret_value_reader.read(bank_type=bank_type, identifier=identifier)
 
-    def create(self, bank_type: BankType = None, identifier: str = "1") -> BaseBank:
-        """Build bank class"""
+    def create(
+        self, bank_type: BankType = None, identifier: str = "1", check_health: bool = False
+    ) -> BaseBank:
+        """
+        Build bank class
+
+        :param check_health: fail fast with BankGatewayUnavailable if the gateway circuit is open. Never set it
+        when the bank is created to verify a payment.
+        """
         if not bank_type:
             bank_type = self._secret_value_reader.default(identifier)
         logging.debug("Request create bank", extra={"bank_type": bank_type})
 
-        bank_klass, bank_settings = self._import_bank(bank_type, identifier)
-        bank = bank_klass(**bank_settings, identifier=identifier)
-        bank.set_currency(self._secret_value_reader.currency(identifier))
+        with metrics.measure(
+            "factory", operation="create", bank_type=bank_type, bank_choose_identifier=identifier
+        ):
+            bank_klass, bank_settings = self._import_bank(bank_type, identifier)
+            bank = bank_klass(**bank_settings, identifier=identifier)
+            bank.set_currency(self._secret_value_reader.currency(identifier))
+
+            if check_health:
+                bank.check_health()
 
         logging.debug("Create bank")
         return bank
 
-    def auto_create(self, identifier: str = "1", amount=None) -> BaseBank:
+    def auto_create(self, identifier: str = "1", amount=None, prepare_bank=None) -> BaseBank:
+        """
+        :param prepare_bank: callable(bank) that sets the real payment info (amount, request, callback url, ...)
+        of each candidate bank. When it is set the gateway is probed by prepay() instead of check_gateway(), so
+        ready() reuses the token of the probe.
+        All probes together wait at most AUTO_CREATE_BUDGET and the deadline of the caller, see deadline.deadline.
+        """
+        # the gateway is chosen by the probes, its latency is recorded by them.
+        with deadline(settings.AUTO_CREATE_BUDGET), metrics.measure(
+            "factory", operation="auto_create", bank_type="", bank_choose_identifier=identifier
+        ):
+            return self._auto_create(identifier, amount, prepare_bank)
+
+    def _auto_create(self, identifier, amount, prepare_bank) -> BaseBank:
         logging.debug("Request create bank automatically")
         bank_list = self._secret_value_reader.get_bank_priorities(identifier)
+        bank_list = self._get_available_banks(self._routing_policy.order(bank_list, identifier), identifier)
+        if settings.AUTO_CREATE_MODE in ["parallel", "hedged"]:
+            return self._concurrent_auto_create(bank_list, identifier, amount, prepare_bank)
         errors = []
-        for bank_type in bank_list:
+        for index, bank_type in enumerate(bank_list):
+            # a saturated gateway fails fast and the next one is tried, only the last one waits for its limiter.
+            rate_limit_wait = 0 if index < len(bank_list) - 1 else None
             try:
-                bank = self.create(bank_type, identifier)
-                bank.check_gateway(amount)
-                return bank
+                return self._probe_bank(bank_type, identifier, amount, prepare_bank, rate_limit_wait)
             except Exception as e:
                 logging.debug(str(e))
                 logging.debug("Try to connect another bank...")
@@ -61,3 +105,137 @@ class BankFactory:
         logging.debug("All banks failed to connect")
         errors_msg = "\n".join([str(e) for e in errors])
         raise BankGatewayAutoConnectionFailed(errors_msg)
+
+    @staticmethod
+    def _get_available_banks(bank_list, identifier):
+        """skip the gateways with open circuit without any request."""
+        available_banks = []
+        for bank_type in bank_list:
+            try:
+                is_available = health_registry.is_available(bank_type, identifier)
+            except Exception as e:
+                logging.exception(e)
+                is_available = True
+            if is_available:
+                available_banks.append(bank_type)
+            else:
+                logging.debug("Skip unavailable bank", extra={"bank_type": bank_type})
+        if not available_banks:
+            raise BankGatewayAutoConnectionFailed("All banks are unavailable, their circuits are open.")
+        return available_banks
+
+    def _concurrent_auto_create(self, bank_list, identifier, amount, prepare_bank) -> BaseBank:
+        """
+        درگاه ها به صورت همزمان بررسی می شوند (در حالت hedged هر درگاه با تاخیر نسبت به درگاه قبلی) و درگاهی
+        با بالاترین اولویت که تا پایان مهلت پاسخ دهد انتخاب می شود.
+        """
+        hedge_delay = settings.AUTO_CREATE_HEDGE_DELAY if settings.AUTO_CREATE_MODE == "hedged" else 0
+        start = time.monotonic()
+        budget = settings.AUTO_CREATE_DEADLINE
+        remaining = get_remaining_time()
+        if remaining is not None:
+            budget = min(budget, remaining)
+        deadline_at = start + budget
+        executor = self._get_executor()
+        futures = []
+        bank = None
+        while True:
+            now = time.monotonic()
+            next_launch = start + len(futures) * hedge_delay
+            running = [future for future in futures if not future.done()]
+            # the next gateway starts after the hedge delay, or at once when every started probe failed.
+            if len(futures) < len(bank_list) and (now >= next_launch or not running):
+                bank_type = bank_list[len(futures)]
+                # the probe gets the deadline of the caller and gives up at the auto create deadline.
+                futures.append(
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        self._probe_bank_in_thread,
+                        bank_type,
+                        identifier,
+                        amount,
+                        prepare_bank,
+                        deadline_at,
+                    )
+                )
+                continue
+
+            bank = self._select_probe(futures, wait_for_priorities=True)
+            if bank or (not running and len(futures) == len(bank_list)) or now >= deadline_at:
+                break
+            timeout = min(deadline_at, next_launch) if len(futures) < len(bank_list) else deadline_at
+            wait(running, timeout=max(timeout - now, 0), return_when=FIRST_COMPLETED)
+
+        bank = bank or self._select_probe(futures, wait_for_priorities=False)
+        for future in futures:
+            # probes that already started are ignored.
+            future.cancel()
+        if bank:
+            return bank
+
+        logging.debug("All banks failed to connect")
+        errors = []
+        for bank_type, future in zip(bank_list, futures):
+            if future.cancelled() or not future.done():
+                errors.append(f"{bank_type}: no response before auto create deadline")
+            else:
+                errors.append(str(future.exception()))
+        raise BankGatewayAutoConnectionFailed("\n".join(errors))
+
+    @staticmethod
+    def _select_probe(futures, wait_for_priorities):
+        for future in futures:
+            if not future.done():
+                if wait_for_priorities:
+                    # a gateway with higher priority may still answer.
+                    return None
+                continue
+            if not future.cancelled() and future.exception() is None:
+                return future.result()
+        return None
+
+    def _probe_bank(self, bank_type, identifier, amount, prepare_bank=None, rate_limit_wait=None) -> BaseBank:
+        # subclasses may override create() with payment arguments, the probe only needs the bank.
+        bank = BankFactory.create(self, bank_type, identifier)
+        bank.set_rate_limit_wait(rate_limit_wait)
+        try:
+            if prepare_bank:
+                prepare_bank(bank)
+                bank.prepay()
+            else:
+                bank.check_gateway(amount)
+        finally:
+            bank.set_rate_limit_wait(None)
+        return bank
+
+    def _probe_bank_in_thread(self, bank_type, identifier, amount, prepare_bank, deadline_at) -> BaseBank:
+        close_old_connections()
+        try:
+            with deadline(deadline_at - time.monotonic()):
+                # the probes run concurrently, a saturated gateway is left to the others.
+                return self._probe_bank(bank_type, identifier, amount, prepare_bank, rate_limit_wait=0)
+        except Exception as e:
+            logging.debug(str(e))
+            raise
+        finally:
+            close_old_connections()
+
+    @classmethod
+    def _get_executor(cls) -> ThreadPoolExecutor:
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=settings.AUTO_CREATE_MAX_WORKERS,
+                    thread_name_prefix="azbankgateways-auto-create",
+                )
+            return cls._executor
+
+    @classmethod
+    def _reset_executor(cls):
+        cls._executor = None
+        cls._executor_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    # threads do not survive fork, a child process starts its own pool.
+    os.register_at_fork(after_in_child=BankFactory._reset_executor)
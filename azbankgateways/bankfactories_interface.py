@@ -1,7 +1,10 @@
+from functools import partial
+
 from django.http import request
+
+from azbankgateways.bankfactories import BankFactory as BaseBankFactory
 from azbankgateways.banks import BaseBank
 from azbankgateways.models import BankType
-from azbankgateways.bankfactories import BankFactory as BaseBankFactory
 
 
 class BankFactory(BaseBankFactory):
@@ -9,12 +12,12 @@ class BankFactory(BaseBankFactory):
         self,
         request: request,
         amount: int,
-        callback_url : str,
+        callback_url: str,
         mobile_number: str = None,
         bank_type: BankType = None,
         identifier: str = "1",
     ) -> BaseBank:
-        bank = super().create(bank_type, identifier)
+        bank = super().create(bank_type, identifier, check_health=True)
 
         bank = self.set_payment_info(
             bank=bank,
@@ -24,15 +27,29 @@ class BankFactory(BaseBankFactory):
             mobile_number=mobile_number,
         )
         return bank
-    
+
     def auto_create(
         self,
         request: request,
         amount: int,
-        callback_url : str,
+        callback_url: str,
         mobile_number: str = None,
         identifier: str = "1",
+        reuse_probe_token: bool = False,
     ) -> BaseBank:
+        """
+        :param reuse_probe_token: probe the gateways with the real payment info, ready() then reuses the token
+        of the probe instead of requesting a new one.
+        """
+        if reuse_probe_token:
+            prepare_bank = partial(
+                self.set_payment_info,
+                request=request,
+                amount=amount,
+                callback_url=callback_url,
+                mobile_number=mobile_number,
+            )
+            return super().auto_create(identifier, amount, prepare_bank=prepare_bank)
 
         bank = super().auto_create(identifier, amount)
 
@@ -44,17 +61,17 @@ class BankFactory(BaseBankFactory):
             mobile_number=mobile_number,
         )
         return bank
-    
+
     def set_payment_info(
         self,
         bank: BaseBank,
         request: request,
         amount: int,
-        callback_url : str,
+        callback_url: str,
         mobile_number: str = None,
     ):
         bank.set_request(request=request)
         bank.set_amount(amount=amount)
         bank.set_client_callback_url(callback_url=callback_url)
         bank.set_mobile_number(mobile_number=mobile_number)
-        return bank
\ No newline at end of file
+        return bank
@@ -1,5 +1,7 @@
-import json
+import datetime
 import logging
+import threading
+import time
 
 import requests
 
@@ -10,13 +12,25 @@ from azbankgateways.exceptions import (
     BankGatewayRejectPayment,
     SettingDoesNotExist,
 )
-from azbankgateways.models import BankType, CurrencyEnum, PaymentStatus
+from azbankgateways.models import (
+    BankType,
+    CurrencyEnum,
+    PaymentStatus,
+    SettlementStatus,
+)
 
 
 class AsanPardakht(BaseBank):
+    _idempotent_operations = frozenset(["Time", "TranResult"])
     _merchant_configuration_id = None
     _username = None
     _password = None
+    _time_offset_ttl = None
+    # offset of the clock of the payment server from the local UTC clock, shared by the process.
+    _time_offset = None
+    _time_offset_fetched_at = None
+    _time_offset_lock = threading.Lock()
+    _local_date_format = "%Y%m%d %H%M%S"
 
     def __init__(self, **kwargs):
         super(AsanPardakht, self).__init__(**kwargs)
@@ -39,14 +53,16 @@ class AsanPardakht(BaseBank):
                 raise SettingDoesNotExist(f"{item} is not set in settings.")
 
             setattr(self, f"_{item.lower()}", self.default_setting_kwargs[item])
+        # seconds, the gateway accepts a localDate at most one day apart from its clock.
+        self._time_offset_ttl = self.default_setting_kwargs.get("TIME_OFFSET_TTL", 3600)
 
-    def get_pay_data(self):
+    def get_pay_data(self, local_date=None):
         data = {
             "serviceTypeId": 1,  # Service type code. For making a purchase, send code 1.
             "merchantConfigurationId": self._merchant_configuration_id,
             "localInvoiceId": self.get_tracking_code(),
             "amountInRials": self.get_gateway_amount(),
-            "localDate": self._get_local_date(),
+            "localDate": local_date or self._get_local_date(),
             "callbackURL": self._get_gateway_callback_url() + f'&localInvoiceId={self.get_tracking_code()}',
             "paymentId": self.get_tracking_code(),
             **self.get_custom_data(),
@@ -60,6 +76,15 @@ class AsanPardakht(BaseBank):
         super(AsanPardakht, self).pay()
         data = self.get_pay_data()
         token = self._send_request(self._token_api_url, data)
+        self._set_pay_response(token)
+
+    async def apay(self):
+        await self.aprepare_pay()
+        data = self.get_pay_data(local_date=await self._aget_local_date())
+        token = await self._asend_request(self._token_api_url, data)
+        self._set_pay_response(token)
+
+    def _set_pay_response(self, token):
         if token:
             self._set_reference_number(token)
         else:
@@ -82,12 +107,29 @@ class AsanPardakht(BaseBank):
 
     def prepare_verify_from_gateway(self):
         super(AsanPardakht, self).prepare_verify_from_gateway()
-        request = self.get_request()
-        tracking_code = request.GET.get("localInvoiceId")
+        tracking_code = self.get_callback_reference()
         self._set_tracking_code(tracking_code)
         self._set_bank_record()
         self._check_transaction_data()
 
+    async def aprepare_verify_from_gateway(self):
+        tracking_code = self.get_callback_reference()
+        self._set_tracking_code(tracking_code)
+        await self._aset_bank_record()
+        await self._acheck_transaction_data()
+
+    def prepare_defer_verify_from_gateway(self):
+        # TranResult is requested when the queued verification runs.
+        self._set_tracking_code(self.get_callback_reference())
+        self._set_bank_record()
+
+    async def aprepare_defer_verify_from_gateway(self):
+        self._set_tracking_code(self.get_callback_reference())
+        await self._aset_bank_record()
+
+    def get_callback_reference(self):
+        return self.get_request().GET.get("localInvoiceId")
+
     def verify_from_gateway(self, request):
         super(AsanPardakht, self).verify_from_gateway(request)
 
@@ -105,18 +147,51 @@ class AsanPardakht(BaseBank):
         super(AsanPardakht, self).verify(transaction_code)
         data = self.get_verify_data()
         self._send_request(self._verify_api_url, data, is_json=False)
+        # the pending settlement is saved with the status.
+        is_settlement_deferred = self._defer_settlement()
         self._set_payment_status(PaymentStatus.COMPLETE)
-        self._settle_transaction()
+        if not is_settlement_deferred:
+            self._settle_transaction()
 
-    def _send_request(self, api_url, data, method='POST', is_json=True):
-        headers = {
+    async def averify(self, transaction_code):
+        await self.aprepare_verify(transaction_code)
+        if not self._has_pay_gate_tran_id():
+            self._load_pay_gate_tran_id(await self._aget_transaction_data())
+        data = self.get_verify_data()
+        await self._asend_request(self._verify_api_url, data, is_json=False)
+        is_settlement_deferred = self._defer_settlement()
+        await self._aset_payment_status(PaymentStatus.COMPLETE)
+        if not is_settlement_deferred:
+            await self._asettle_transaction()
+
+    def _get_headers(self):
+        return {
             "usr": self._username,
             "pwd": self._password,
         }
+
+    def _send_request(self, api_url, data, method='POST', is_json=True):
+        headers = self._get_headers()
         try:
-            response = requests.request(
-                method, api_url, json=data, headers=headers, timeout=self.get_timeout()
-            )
+            response = self._http_request(method, api_url, json=data, headers=headers)
+            response.raise_for_status()
+        except requests.Timeout:
+            logging.exception(f"Asan Pardakht gateway timeout: {data}")
+            raise BankGatewayConnectionError()
+        except requests.ConnectionError:
+            logging.exception(f"Asan Pardakht gateway connection error: {data}")
+            raise BankGatewayConnectionError()
+        except requests.HTTPError as e:
+            logging.exception(f"HTTP error occurred: {e}")
+            raise BankGatewayConnectionError()
+        if is_json:
+            return response.json()
+        return response.text
+
+    async def _asend_request(self, api_url, data, method='POST', is_json=True):
+        headers = self._get_headers()
+        try:
+            response = await self._ahttp_request(method, api_url, json=data, headers=headers)
             response.raise_for_status()
         except requests.Timeout:
             logging.exception(f"Asan Pardakht gateway timeout: {data}")
@@ -132,22 +207,91 @@ class AsanPardakht(BaseBank):
         return response.text
 
     def _get_local_date(self):
-        return self._send_request(self._local_date_api_url, {}, method='GET')
+        """
+        تاریخ و زمان سرور پرداخت، بر اساس اختلاف ساعت ذخیره شده و بدون درخواست به درگاه محاسبه می شود.
 
-    def _get_transaction_data(self):
-        data = {
+        The Time API is called only when the offset is missing, invalid or older than TIME_OFFSET_TTL. Meanwhile
+        one request refreshes it and the others keep using the previous offset.
+        """
+        local_date = self._get_cached_local_date()
+        if local_date is not None:
+            return local_date
+        with self._time_offset_lock:
+            if self._is_time_offset_fresh():
+                # refreshed by another request while waiting for the lock.
+                return self._get_cached_local_date()
+            local_date = self._send_request(self._local_date_api_url, {}, method='GET')
+            self._set_time_offset(local_date)
+        return local_date
+
+    async def _aget_local_date(self):
+        local_date = self._get_cached_local_date()
+        if local_date is not None:
+            return local_date
+        # threading.Lock must not be awaited while held, a duplicate refresh of the offset is harmless.
+        local_date = await self._asend_request(self._local_date_api_url, {}, method='GET')
+        self._set_time_offset(local_date)
+        return local_date
+
+    @staticmethod
+    def _get_utc_now():
+        return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+    def _is_time_offset_fresh(self):
+        fetched_at = AsanPardakht._time_offset_fetched_at
+        return fetched_at is not None and time.monotonic() - fetched_at < self._time_offset_ttl
+
+    def _get_cached_local_date(self):
+        offset = AsanPardakht._time_offset
+        if offset is None:
+            return None
+        # a stale offset is used while another request refreshes it.
+        if not self._is_time_offset_fresh() and not AsanPardakht._time_offset_lock.locked():
+            return None
+        return (self._get_utc_now() + offset).strftime(self._local_date_format)
+
+    def _set_time_offset(self, local_date):
+        try:
+            server_now = datetime.datetime.strptime(str(local_date).strip(), self._local_date_format)
+        except ValueError:
+            logging.warning("Invalid Asan Pardakht server time", extra={"local_date": local_date})
+            AsanPardakht._time_offset = None
+            AsanPardakht._time_offset_fetched_at = None
+            return
+        AsanPardakht._time_offset_fetched_at = time.monotonic()
+        AsanPardakht._time_offset = server_now - self._get_utc_now()
+
+    def _get_transaction_data_request(self):
+        return {
             'merchantConfigurationId': self._merchant_configuration_id,
             'localInvoiceId': self.get_tracking_code(),
         }
+
+    def _get_transaction_data(self):
+        data = self._get_transaction_data_request()
         return self._send_request(self._transaction_result_api_url, data, method='GET')
 
+    async def _aget_transaction_data(self):
+        data = self._get_transaction_data_request()
+        return await self._asend_request(self._transaction_result_api_url, data, method='GET')
+
     def _check_transaction_data(self):
         transaction_data = self._get_transaction_data()
+        self._validate_transaction_data(transaction_data)
+        self._set_pay_gate_tran_id(transaction_data)
+
+    async def _acheck_transaction_data(self):
+        transaction_data = await self._aget_transaction_data()
+        self._validate_transaction_data(transaction_data)
+        self._update_bank_record(extra_information={'payGateTranID': transaction_data.get('payGateTranID')})
+        await self._asave_bank_record()
+
+    def _validate_transaction_data(self, transaction_data):
         is_valid = (
             transaction_data
             and self._bank.reference_number == transaction_data.get('refID')
             and transaction_data.get('amount') is not None
-            and int(self._bank.amount) == transaction_data.get('amount')
+            and self._bank.amount == transaction_data.get('amount')
         )
         if not is_valid:
             error_message = (
@@ -155,21 +299,53 @@ class AsanPardakht(BaseBank):
                 "received from the gateway does not match the internal bank record."
             )
             raise AZBankGatewaysException(error_message)
-        self._set_pay_gate_tran_id(transaction_data)
 
-    def _settle_transaction(self):
+    def settle(self) -> bool:
         try:
-            data = {
-                "merchantConfigurationId": self._merchant_configuration_id,
-                "payGateTranId": self._get_pay_gate_tran_id(),
-            }
-            self._send_request(self._settlement_api_url, data=data, is_json=False)
+            self._send_request(self._settlement_api_url, data=self.get_verify_data(), is_json=False)
+        except Exception:
+            logging.debug("AsanPardakht gateway did not settle the payment")
+            return False
+        return True
+
+    async def asettle(self) -> bool:
+        try:
+            await self._asend_request(self._settlement_api_url, data=self.get_verify_data(), is_json=False)
         except Exception:
             logging.debug("AsanPardakht gateway did not settle the payment")
+            return False
+        return True
+
+    def _settle_transaction(self):
+        # a failed settlement is retried by settle_bank_records.
+        self._set_settlement_status(SettlementStatus.SETTLED if self.settle() else SettlementStatus.PENDING)
+        self._save_bank_record()
+
+    async def _asettle_transaction(self):
+        self._set_settlement_status(
+            SettlementStatus.SETTLED if await self.asettle() else SettlementStatus.PENDING
+        )
+        await self._asave_bank_record()
 
     def _set_pay_gate_tran_id(self, transaction_data):
-        self._bank.extra_information = json.dumps({'payGateTranID': transaction_data.get('payGateTranID')})
-        self._bank.save(update_fields={'extra_information'})
+        self._update_bank_record(extra_information={'payGateTranID': transaction_data.get('payGateTranID')})
+        self._save_bank_record()
+
+    def _has_pay_gate_tran_id(self):
+        return bool((self._bank.extra_information or {}).get('payGateTranID'))
+
+    def _load_pay_gate_tran_id(self, transaction_data):
+        # the record is saved by the caller with the status of the verify.
+        self._validate_transaction_data(transaction_data)
+        self._update_bank_record(
+            extra_information={
+                **(self._bank.extra_information or {}),
+                'payGateTranID': transaction_data.get('payGateTranID'),
+            }
+        )
 
     def _get_pay_gate_tran_id(self):
-        return json.loads(self._bank.extra_information)['payGateTranID']
+        # the queued and the reverified payments are verified without the TranResult of the callback.
+        if not self._has_pay_gate_tran_id():
+            self._load_pay_gate_tran_id(self._get_transaction_data())
+        return self._bank.extra_information['payGateTranID']
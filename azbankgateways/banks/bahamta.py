@@ -1,4 +1,3 @@
-import json
 import logging
 
 import requests
@@ -68,6 +67,15 @@ class Bahamta(BaseBank):
         super(Bahamta, self).pay()
         data = self.get_pay_data()
         response_json = self._send_data(self._token_api_url, data)
+        self._set_pay_response(response_json)
+
+    async def apay(self):
+        await self.aprepare_pay()
+        data = self.get_pay_data()
+        response_json = await self._asend_data(self._token_api_url, data)
+        self._set_pay_response(response_json)
+
+    def _set_pay_response(self, response_json):
         if response_json["ok"]:
             # در این سیستم رفرنس برای ذخیره سازی بر نمی گردد!
             token = self.get_tracking_code()
@@ -85,10 +93,13 @@ class Bahamta(BaseBank):
 
     def prepare_verify_from_gateway(self):
         super(Bahamta, self).prepare_verify_from_gateway()
-        token = self.get_request().GET.get("reference")
+        token = self.get_callback_reference()
         self._set_reference_number(token)
         self._set_bank_record()
 
+    def get_callback_reference(self):
+        return self.get_request().GET.get("reference")
+
     def verify_from_gateway(self, request):
         super(Bahamta, self).verify_from_gateway(request)
 
@@ -112,19 +123,25 @@ class Bahamta(BaseBank):
         super(Bahamta, self).verify(transaction_code)
         data = self.get_verify_data()
         response_json = self._send_data(self._verify_api_url, data)
+        self._set_payment_status(self._get_verify_payment_status(response_json))
+
+    async def averify(self, transaction_code):
+        await self.aprepare_verify(transaction_code)
+        data = self.get_verify_data()
+        response_json = await self._asend_data(self._verify_api_url, data)
+        await self._aset_payment_status(self._get_verify_payment_status(response_json))
+
+    def _get_verify_payment_status(self, response_json):
         if response_json.get("ok", False) and response_json.get("result", {}).get("state") == "paid":
-            self._set_payment_status(PaymentStatus.COMPLETE)
-            extra_information = json.dumps(response_json.get("result", {}))
-            self._bank.extra_information = extra_information
-            self._bank.save()
-        else:
-            self._set_payment_status(PaymentStatus.CANCEL_BY_USER)
-            logging.debug("Bahamta gateway unapprove payment")
+            self._update_bank_record(extra_information=response_json.get("result", {}))
+            return PaymentStatus.COMPLETE
+        logging.debug("Bahamta gateway unapprove payment")
+        return PaymentStatus.CANCEL_BY_USER
 
     def _send_data(self, api, data):
         try:
             url = append_querystring(api, data)
-            response = requests.get(url, timeout=self.get_timeout())
+            response = self._http_request("GET", url)
         except requests.Timeout:
             logging.exception("Bahamta time out gateway {}".format(data))
             raise BankGatewayConnectionError()
@@ -132,6 +149,22 @@ class Bahamta(BaseBank):
             logging.exception("Bahamta time out gateway {}".format(data))
             raise BankGatewayConnectionError()
 
+        return self._get_response_json(response)
+
+    async def _asend_data(self, api, data):
+        try:
+            url = append_querystring(api, data)
+            response = await self._ahttp_request("GET", url)
+        except requests.Timeout:
+            logging.exception("Bahamta time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+        except requests.ConnectionError:
+            logging.exception("Bahamta time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+
+        return self._get_response_json(response)
+
+    def _get_response_json(self, response):
         response_json = get_json(response)
         self._set_transaction_status_text(response_json.get("error"))
         return response_json
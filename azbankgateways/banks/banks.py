@@ -1,26 +1,53 @@
 import abc
+import asyncio
+import json
 import logging
-import uuid
+import math
+import random
+import time
+from contextlib import contextmanager
 from urllib import parse
 
+import requests
 import six
+from asgiref.sync import sync_to_async
 from django.conf import settings as django_settings
 from django.db.models import Q
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.utils import timezone
 
-from azbankgateways.utils import append_querystring, build_full_url
+from azbankgateways.deadline import deadline, get_deadline_timeout, get_remaining_time
+from azbankgateways.health import health_registry
+from azbankgateways.metrics import metrics
+from azbankgateways.rate_limit import rate_limiter
+from azbankgateways.tracking_codes import get_tracking_code_generator
+from azbankgateways.transports import async_session_pool, session_pool
+from azbankgateways.utils import (
+    append_querystring,
+    build_callback_request,
+    build_full_url,
+    get_callback_payload,
+)
 
 from .. import default_settings as settings
 from ..exceptions import (
     AmountDoesNotSupport,
+    BankGatewayRateLimited,
     BankGatewayStateInvalid,
     BankGatewayTokenExpired,
+    BankGatewayUnavailable,
     CurrencyDoesNotSupport,
     SafeSettingsEnabled,
 )
-from ..models import Bank, CurrencyEnum, PaymentStatus
+from ..models import (
+    FINAL_PAYMENT_STATUSES,
+    PAYMENT_STATUS_TRANSITIONS,
+    Bank,
+    CurrencyEnum,
+    PaymentStatus,
+    SettlementStatus,
+)
 
 
 # TODO: handle and expire record after 15 minutes
@@ -39,11 +66,26 @@ class BaseBank:
     _client_callback_url: str = ""
     _bank: Bank = None
     _request = None
+    _prepaid_signature: tuple = None
+    # callback url of a bank without request, built from django sites (database) before the async pay.
+    _callback_full_url: str = None
+    _is_health_checked: bool = False
+    # during verify from gateway changes of the bank record are saved with the status transitions.
+    _is_save_deferred: bool = False
+    # during verify of a record the status is only set on the record, the caller saves it, see verify_record.
+    _is_status_deferred: bool = False
+    # operations (the operation label of gateway_request) that are safe to send again after a connection error,
+    # a timeout or a 502/503/504 answer, a payment or a verify is never sent twice.
+    _idempotent_operations: frozenset = frozenset()
+    _retry_status_codes = (502, 503, 504)
+    # seconds a call waits for the RATE_LIMIT of the gateway, None is WAIT of RATE_LIMIT or RATE_LIMIT_WAIT.
+    _rate_limit_wait: float = None
 
     def __init__(self, identifier: str, **kwargs):
         self.identifier = identifier
         self.default_setting_kwargs = kwargs
         self._custom_data: dict = {}
+        self._dirty_fields: set = set()
         self.set_default_settings()
 
     def _is_strict_origin_policy_enabled(self):
@@ -92,9 +134,9 @@ class BaseBank:
     @abc.abstractmethod
     def prepare_pay(self):
         logging.debug("Prepare pay method")
+        self.check_health()
         self.prepare_amount()
-        tracking_code = int(str(uuid.uuid4().int)[-1 * settings.TRACKING_CODE_LENGTH :])
-        self._set_tracking_code(tracking_code)
+        self._set_tracking_code(get_tracking_code_generator().generate())
 
     @abc.abstractmethod
     def get_pay_data(self):
@@ -113,7 +155,8 @@ class BaseBank:
     def prepare_verify(self, tracking_code):
         logging.debug("Prepare verify method")
         self._set_tracking_code(tracking_code)
-        self._set_bank_record()
+        if not self._is_bank_record_loaded():
+            self._set_bank_record()
         self.prepare_amount()
 
     @abc.abstractmethod
@@ -121,32 +164,230 @@ class BaseBank:
         logging.debug("Verify method")
         self.prepare_verify(tracking_code)
 
+    def verify_record(self, bank_record: Bank) -> set:
+        """
+        تایید پرداخت رکوردی که از قبل خوانده شده، بدون هیچ کوئری. وضعیت و فیلد های تغییر کرده فقط روی رکورد تنظیم
+        می شوند و ذخیره آنها (مثلا به صورت دسته ای در azbankgateways.reverify) بر عهده فراخواننده است.
+
+        :return: name of changed fields
+        """
+        self._bank = bank_record
+        self._load_bank_record()
+        self._is_save_deferred = True
+        self._is_status_deferred = True
+        try:
+            with self._measure_verify():
+                self.verify(bank_record.tracking_code)
+        finally:
+            self._is_save_deferred = False
+            self._is_status_deferred = False
+        update_fields, self._dirty_fields = self._dirty_fields, set()
+        return update_fields
+
+    def settle(self) -> bool:
+        """
+        درخواست تسویه پرداخت تایید شده، فقط درگاه هایی که تسویه جداگانه دارند آن را پیاده سازی می کنند.
+
+        :return: True if the gateway settled the payment
+        """
+        raise NotImplementedError(f"{self.get_bank_type()} gateway does not have settlement.")
+
+    async def asettle(self) -> bool:
+        return await sync_to_async(self.settle, thread_sensitive=False)()
+
+    def settle_record(self, bank_record: Bank) -> bool:
+        """
+        تسویه پرداختی که تسویه آن به تعویق افتاده است.
+        وضعیت تسویه توسط فراخواننده (azbankgateways.settlement) ذخیره می شود.
+        """
+        self._bank = bank_record
+        self._load_bank_record()
+        return self.settle()
+
+    def _set_settlement_status(self, settlement_status):
+        fields = {"settlement_status": settlement_status}
+        if settlement_status == SettlementStatus.SETTLED:
+            fields["settled_at"] = timezone.now()
+        self._update_bank_record(**fields)
+
+    def _defer_settlement(self) -> bool:
+        """در حالت IS_DEFERRED_SETTLEMENT_ENABLE تسویه به جای کال بک توسط دستور settle_bank_records انجام می شود."""
+        if not settings.IS_DEFERRED_SETTLEMENT_ENABLE:
+            return False
+        self._set_settlement_status(SettlementStatus.PENDING)
+        return True
+
+    def prepay(self):
+        """توکن درگاه را با اطلاعات واقعی پرداخت دریافت می کند تا ready بدون درخواست مجدد از همان توکن استفاده کند."""
+        with self._measure_operation("pay"):
+            self.pay()
+        self._prepaid_signature = self._get_pay_signature()
+
+    def _get_pay_signature(self):
+        """اطلاعاتی که به درگاه ارسال می شود، در صورت تغییر آنها توکن قبلی قابل استفاده نیست."""
+        return (
+            self.get_bank_type(),
+            self.get_amount(),
+            self.get_currency(),
+            self.get_mobile_number(),
+            json.dumps(self.get_custom_data(), sort_keys=True, default=str),
+            self._get_gateway_callback_url(),
+        )
+
+    def _is_prepaid(self) -> bool:
+        is_prepaid = (
+            self._prepaid_signature is not None and self._prepaid_signature == self._get_pay_signature()
+        )
+        self._prepaid_signature = None
+        if is_prepaid:
+            logging.debug("Reuse gateway token of prepay")
+        return is_prepaid
+
     def ready(self) -> Bank:
-        self.pay()
-        bank = Bank.objects.create(
+        if not self._is_prepaid():
+            with self._measure_operation("pay"):
+                self.pay()
+        with self._measure("db_write", operation="create"):
+            bank = Bank.objects.create(**self._get_bank_record_data())
+        self._bank = bank
+        return bank
+
+    def _get_bank_record_data(self):
+        return dict(
+            status=PaymentStatus.WAITING,
             bank_choose_identifier=self.identifier,
             bank_type=self.get_bank_type(),
             amount=self.get_amount(),
             reference_number=self.get_reference_number(),
             response_result=self.get_transaction_status_text(),
             tracking_code=self.get_tracking_code(),
+            callback_url=self._client_callback_url,
         )
-        self._bank = bank
-        self._set_payment_status(PaymentStatus.WAITING)
-        if self._client_callback_url:
-            self._bank.callback_url = self._client_callback_url
-        return bank
 
     @abc.abstractmethod
     def prepare_verify_from_gateway(self):
         pass
 
+    def get_callback_reference(self):
+        """شناسه پرداخت (توکن یا کد پیگیری) در درخواست کال بک درگاه، کال بک های تکراری با آن تشخیص داده می شوند."""
+        return None
+
     def verify_from_gateway(self, request):
         """زمانی که کاربر از گیت وی بانک باز میگردد این متد فراخوانی می شود."""
         self.set_request(request)
+        # after VERIFY_BUDGET the record stays in RETURN_FROM_BANK and reverify_bank_records verifies it later.
+        with deadline(settings.VERIFY_BUDGET), self._measure_verify(), self._deferred_bank_record_save():
+            self.prepare_verify_from_gateway()
+            self._set_payment_status(PaymentStatus.RETURN_FROM_BANK)
+            self.verify(self.get_tracking_code())
+
+    def prepare_defer_verify_from_gateway(self):
+        """شناسایی رکورد بانک در کال بک، درگاه هایی که در prepare_verify_from_gateway درخواست ارسال می کنند آن را
+        بازنویسی می کنند تا کال بک منتظر درگاه نماند."""
         self.prepare_verify_from_gateway()
-        self._set_payment_status(PaymentStatus.RETURN_FROM_BANK)
-        self.verify(self.get_tracking_code())
+
+    def defer_verify_from_gateway(self, request):
+        """
+        در حالت IS_DEFERRED_VERIFY_ENABLE به جای verify_from_gateway فراخوانی می شود. اطلاعات بازگشتی درگاه ذخیره و
+        تایید پرداخت در صف VERIFY_QUEUE_CLASS قرار می گیرد تا کاربر بدون انتظار برای پاسخ درگاه بازگردد.
+        """
+        self.set_request(request)
+        with self._deferred_bank_record_save():
+            self.prepare_defer_verify_from_gateway()
+            self._update_bank_record(callback_payload={**get_callback_payload(request), "attempts": 0})
+            self._set_payment_status(PaymentStatus.RETURN_FROM_BANK)
+        from azbankgateways.verify_queue import get_verify_queue
+
+        get_verify_queue().enqueue(self._bank)
+
+    def verify_deferred_from_gateway(self, bank_record: Bank):
+        """تایید پرداختی که در صف قرار گرفته، با اطلاعات ذخیره شده کال بک."""
+        self.set_request(build_callback_request(bank_record.callback_payload))
+        with self._measure_verify(), self._deferred_bank_record_save():
+            self.prepare_verify_from_gateway()
+            self.verify(self.get_tracking_code())
+
+    @contextmanager
+    def _deferred_bank_record_save(self):
+        """
+        رکورد بانک یک بار خوانده می شود و تغییرات فیلد ها همراه با UPDATE شرطی تغییر وضعیت ذخیره می شوند. تغییر
+        وضعیت به بازگشت از بانک رکورد را برای این پردازش claim می کند و کال بک های تکراری بدون قفل رد می شوند.
+        """
+        self._is_save_deferred = True
+        try:
+            yield
+        finally:
+            self._is_save_deferred = False
+            self._save_bank_record()
+
+    """
+    async
+    """
+
+    async def aprepare_pay(self):
+        """نسخه async متد prepare_pay، آدرس کال بک بدون request در یک thread از django sites ساخته می شود."""
+        self.prepare_pay()
+        if not self.get_request():
+            self._callback_full_url = await sync_to_async(build_full_url)(settings.CALLBACK_NAMESPACE)
+
+    async def apay(self):
+        """نسخه async متد pay. درگاه هایی که پیاده سازی async ندارند در یک thread جداگانه اجرا می شوند."""
+        await sync_to_async(self.pay, thread_sensitive=False)()
+
+    async def aprepare_verify(self, tracking_code):
+        logging.debug("Prepare verify method")
+        self._set_tracking_code(tracking_code)
+        if not self._is_bank_record_loaded():
+            await self._aset_bank_record()
+        self.prepare_amount()
+
+    async def averify(self, tracking_code):
+        """نسخه async متد verify."""
+        await sync_to_async(self.verify)(tracking_code)
+
+    async def aready(self) -> Bank:
+        # callback url of a bank without request is built from django sites (database).
+        if not (self._prepaid_signature and await sync_to_async(self._is_prepaid)()):
+            with self._measure_operation("pay"):
+                await self.apay()
+        self._prepaid_signature = None
+        with self._measure("db_write", operation="create"):
+            bank = await Bank.objects.acreate(**self._get_bank_record_data())
+        self._bank = bank
+        return bank
+
+    async def aprepare_verify_from_gateway(self):
+        await sync_to_async(self.prepare_verify_from_gateway)()
+
+    async def averify_from_gateway(self, request):
+        """نسخه async متد verify_from_gateway برای استفاده در ویو های async."""
+        self.set_request(request)
+        with deadline(settings.VERIFY_BUDGET), self._measure_verify():
+            self._is_save_deferred = True
+            try:
+                await self.aprepare_verify_from_gateway()
+                await self._aset_payment_status(PaymentStatus.RETURN_FROM_BANK)
+                await self.averify(self.get_tracking_code())
+            finally:
+                self._is_save_deferred = False
+                await self._asave_bank_record()
+
+    async def aprepare_defer_verify_from_gateway(self):
+        await self.aprepare_verify_from_gateway()
+
+    async def adefer_verify_from_gateway(self, request):
+        self.set_request(request)
+        self._is_save_deferred = True
+        try:
+            await self.aprepare_defer_verify_from_gateway()
+            self._update_bank_record(callback_payload={**get_callback_payload(request), "attempts": 0})
+            await self._aset_payment_status(PaymentStatus.RETURN_FROM_BANK)
+        finally:
+            self._is_save_deferred = False
+            await self._asave_bank_record()
+        from azbankgateways.verify_queue import get_verify_queue
+
+        await sync_to_async(get_verify_queue().enqueue)(self._bank)
 
     def get_client_callback_url(self):
         """این متد پس از وریفای شدن استفاده خواهد شد. لینک برگشت را بر میگرداند.حال چه وریفای موفقیت آمیز باشد چه با
@@ -156,6 +397,10 @@ class BaseBank:
             {settings.TRACKING_CODE_QUERY_PARAM: self.get_tracking_code()},
         )
 
+    def is_payment_final(self) -> bool:
+        """وضعیت پرداخت نهایی است و با کال بک دیگری تغییر نمی کند."""
+        return self._bank is not None and self._bank.status in FINAL_PAYMENT_STATUSES
+
     def redirect_client_callback(self):
         """ "این متد کاربر را به مسیری که نرم افزار میخواهد هدایت خواهد کرد و پس از وریفای شدن استفاده می شود."""
         logging.debug("Redirect to client")
@@ -197,23 +442,62 @@ class BaseBank:
         """reference number get from bank"""
         self._reference_number = reference_number
 
+    def _get_bank_record_query(self):
+        return Q(
+            Q(reference_number=self.get_reference_number()) | Q(tracking_code=self.get_tracking_code())
+        ) & Q(bank_type=self.get_bank_type())
+
+    def _get_bank_record_not_found_error(self):
+        logging.debug("Cant find bank record object.")
+        return BankGatewayStateInvalid(
+            "Cant find bank record with reference number reference number is {}".format(
+                self.get_reference_number()
+            )
+        )
+
     def _set_bank_record(self):
         try:
-            self._bank = Bank.objects.get(
-                Q(
-                    Q(reference_number=self.get_reference_number())
-                    | Q(tracking_code=self.get_tracking_code())
-                ),
-                Q(bank_type=self.get_bank_type()),
-            )
+            self._bank = Bank.objects.get(self._get_bank_record_query())
             logging.debug("Set reference find bank object.")
         except Bank.DoesNotExist:
-            logging.debug("Cant find bank record object.")
-            raise BankGatewayStateInvalid(
-                "Cant find bank record with reference number reference number is {}".format(
-                    self.get_reference_number()
-                )
-            )
+            raise self._get_bank_record_not_found_error()
+        self._load_bank_record()
+
+    async def _aset_bank_record(self):
+        try:
+            self._bank = await Bank.objects.aget(self._get_bank_record_query())
+            logging.debug("Set reference find bank object.")
+        except Bank.DoesNotExist:
+            raise self._get_bank_record_not_found_error()
+        self._load_bank_record()
+
+    def _is_bank_record_loaded(self) -> bool:
+        return self._bank is not None and str(self._bank.tracking_code) == str(self.get_tracking_code())
+
+    def _update_bank_record(self, **fields):
+        """تغییر فیلد های رکورد بانک، فقط فیلد های تغییر کرده ذخیره می شوند."""
+        for name, value in fields.items():
+            setattr(self._bank, name, value)
+        self._dirty_fields.update(fields)
+
+    def _get_update_fields(self):
+        return self._dirty_fields | {"update_at"}
+
+    def _save_bank_record(self):
+        if self._is_save_deferred or self._bank is None or not self._dirty_fields:
+            return
+        with self._measure("db_write", operation="save"):
+            self._bank.save(update_fields=self._get_update_fields())
+        self._dirty_fields = set()
+
+    async def _asave_bank_record(self):
+        if self._is_save_deferred or self._bank is None or not self._dirty_fields:
+            return
+        with self._measure("db_write", operation="save"):
+            await self._bank.asave(update_fields=self._get_update_fields())
+        self._dirty_fields = set()
+
+    def _load_bank_record(self):
         self._set_tracking_code(self._bank.tracking_code)
         self._set_reference_number(self._bank.reference_number)
         self.set_amount(self._bank.amount)
@@ -231,23 +515,49 @@ class BaseBank:
     def get_transaction_status_text(self):
         return self._transaction_status_text
 
+    def _get_transition_error(self, payment_status):
+        logging.debug(
+            "Payment status is not status suitable.",
+            extra={"status": self._bank.status, "new_status": payment_status},
+        )
+        return BankGatewayStateInvalid(
+            f"Bank record status can not change to {payment_status}, it is changed before or by another process. "
+            f"status must be one of {PAYMENT_STATUS_TRANSITIONS[payment_status]}"
+        )
+
+    def _set_deferred_payment_status(self, payment_status):
+        if self._bank.status not in PAYMENT_STATUS_TRANSITIONS[payment_status]:
+            raise self._get_transition_error(payment_status)
+        self._update_bank_record(status=payment_status, update_at=timezone.now())
+        logging.debug("Change bank payment status", extra={"status": payment_status})
+
     def _set_payment_status(self, payment_status):
-        if (
-            payment_status == PaymentStatus.RETURN_FROM_BANK
-            and self._bank.status != PaymentStatus.REDIRECT_TO_BANK
-        ):
-            logging.debug(
-                "Payment status is not status suitable.",
-                extra={"status": self._bank.status},
-            )
-            raise BankGatewayStateInvalid(
-                "You change the status bank record before/after this record change status from redirect to bank. "
-                "current status is {}".format(self._bank.status)
-            )
-        self._bank.status = payment_status
-        self._bank.save()
+        """تغییر وضعیت به صورت compare and swap، فیلد های تغییر کرده نیز در همین UPDATE ذخیره می شوند."""
+        if self._is_status_deferred:
+            return self._set_deferred_payment_status(payment_status)
+        with self._measure("db_write", operation="transition"):
+            is_changed = self._bank.transition(payment_status, update_fields=self._dirty_fields)
+        if not is_changed:
+            raise self._get_transition_error(payment_status)
+        self._dirty_fields = set()
+        self._record_status_transition(payment_status)
         logging.debug("Change bank payment status", extra={"status": payment_status})
 
+    async def _aset_payment_status(self, payment_status):
+        if self._is_status_deferred:
+            return self._set_deferred_payment_status(payment_status)
+        with self._measure("db_write", operation="transition"):
+            is_changed = await self._bank.atransition(payment_status, update_fields=self._dirty_fields)
+        if not is_changed:
+            raise self._get_transition_error(payment_status)
+        self._dirty_fields = set()
+        self._record_status_transition(payment_status)
+        logging.debug("Change bank payment status", extra={"status": payment_status})
+
+    def _record_status_transition(self, payment_status):
+        # deferred statuses of verify_record are saved in bulk by the caller and are not counted.
+        metrics.inc("status_transitions_total", status=payment_status, **self._get_metric_labels())
+
     def set_gateway_currency(self, currency: CurrencyEnum):
         """واحد پولی درگاه بانک"""
         if currency not in [CurrencyEnum.IRR, CurrencyEnum.IRT]:
@@ -270,6 +580,238 @@ class BaseBank:
     def get_timeout():
         return settings.BANK_TIMEOUT
 
+    def get_operation_timeout(self, operation) -> tuple:
+        """
+        (connect, read) timeout of an operation of the gateway, bounded by the deadline of the context.
+        TIMEOUTS of the gateway settings, for example {"default": 10, "TranResult": [3, 20]}, is by the operation
+        label of gateway_request, without it BANK_CONNECT_TIMEOUT and BANK_TIMEOUT are used.
+        """
+        timeouts = self.default_setting_kwargs.get("TIMEOUTS") or {}
+        timeout = timeouts.get(operation, timeouts.get("default"))
+        if timeout is None:
+            timeout = (settings.BANK_CONNECT_TIMEOUT, settings.BANK_TIMEOUT)
+        elif not isinstance(timeout, (list, tuple)):
+            timeout = (timeout, timeout)
+        return get_deadline_timeout(tuple(timeout))
+
+    def _get_request_timeout(self, operation, timeout=None) -> tuple:
+        if timeout is None:
+            return self.get_operation_timeout(operation)
+        if not isinstance(timeout, (list, tuple)):
+            timeout = (timeout, timeout)
+        return get_deadline_timeout(tuple(timeout))
+
+    def _get_retry_attempts(self, operation) -> int:
+        if operation not in self._idempotent_operations:
+            return 1
+        return max(self.default_setting_kwargs.get("RETRY_MAX_ATTEMPTS", settings.RETRY_MAX_ATTEMPTS), 1)
+
+    def _get_retry_delay(self, operation, attempt, attempts):
+        """
+        exponential backoff with full jitter before the next attempt.
+        :return: seconds, None if there is no attempt left or the deadline leaves no time for it.
+        """
+        if attempt >= attempts:
+            return None
+        backoff = min(settings.RETRY_BACKOFF * 2 ** (attempt - 1), settings.RETRY_BACKOFF_MAX)
+        delay = random.uniform(0, backoff)
+        remaining = get_remaining_time()
+        if remaining is not None and remaining <= delay:
+            return None
+        logging.debug("Retry gateway request", extra={"operation": operation, "attempt": attempt + 1})
+        metrics.inc("gateway_retries_total", operation=operation, **self._get_metric_labels())
+        return delay
+
+    def _http_request(self, method, url, **kwargs):
+        """
+        تمام درخواست های HTTP به درگاه از این متد و از طریق کانکشن های keep-alive مشترک ارسال می شود.
+        عملیات های _idempotent_operations پس از خطای شبکه یا پاسخ 502/503/504 دوباره ارسال می شوند.
+        """
+        operation = self._get_request_operation(url)
+        attempts = self._get_retry_attempts(operation)
+        for attempt in range(1, attempts + 1):
+            try:
+                response = self._send_http_request(method, url, operation, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                delay = self._get_retry_delay(operation, attempt, attempts)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            if response.status_code in self._retry_status_codes:
+                delay = self._get_retry_delay(operation, attempt, attempts)
+                if delay is not None:
+                    time.sleep(delay)
+                    continue
+            return response
+
+    def _send_http_request(self, method, url, operation, timeout=None, **kwargs):
+        slot = self._take_rate_limit_slot(operation, timeout)
+        try:
+            kwargs["timeout"] = self._get_request_timeout(operation, timeout)
+            started_at = time.monotonic()
+            with self._measure("gateway_request", operation=operation) as result:
+                try:
+                    response = session_pool.request(method, self._get_simulated_url(url), **kwargs)
+                except requests.RequestException:
+                    self._record_health(False, started_at)
+                    raise
+                if response.status_code >= 400:
+                    result["outcome"] = "http_error"
+        finally:
+            rate_limiter.release(slot)
+        self._record_health(response.status_code < 500, started_at)
+        return response
+
+    async def _ahttp_request(self, method, url, **kwargs):
+        operation = self._get_request_operation(url)
+        attempts = self._get_retry_attempts(operation)
+        for attempt in range(1, attempts + 1):
+            try:
+                response = await self._asend_http_request(method, url, operation, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                delay = self._get_retry_delay(operation, attempt, attempts)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            if response.status_code in self._retry_status_codes:
+                delay = self._get_retry_delay(operation, attempt, attempts)
+                if delay is not None:
+                    await asyncio.sleep(delay)
+                    continue
+            return response
+
+    async def _asend_http_request(self, method, url, operation, timeout=None, **kwargs):
+        slot = await self._atake_rate_limit_slot(operation, timeout)
+        try:
+            kwargs["timeout"] = self._get_request_timeout(operation, timeout)
+            started_at = time.monotonic()
+            with self._measure("gateway_request", operation=operation) as result:
+                try:
+                    response = await async_session_pool.request(
+                        method, self._get_simulated_url(url), **kwargs
+                    )
+                except requests.RequestException:
+                    self._record_health(False, started_at)
+                    raise
+                if response.status_code >= 400:
+                    result["outcome"] = "http_error"
+        finally:
+            rate_limiter.release(slot)
+        self._record_health(response.status_code < 500, started_at)
+        return response
+
+    def set_rate_limit_wait(self, seconds):
+        """مدت انتظار در صف محدودیت نرخ درگاه، صفر برای خطای فوری. None مقدار تنظیمات است."""
+        self._rate_limit_wait = seconds
+
+    def _get_rate_limit_wait(self, limits) -> float:
+        wait = self._rate_limit_wait
+        if wait is None:
+            wait = limits.get("WAIT", settings.RATE_LIMIT_WAIT)
+        remaining = get_remaining_time()
+        return wait if remaining is None else min(wait, remaining)
+
+    def _take_rate_limit_slot(self, operation, timeout=None):
+        """
+        فراخوانی ها در صورت اشباع محدودیت نرخ یا همزمانی درگاه (RATE_LIMIT) کوتاه مدت منتظر می مانند و سپس خطای
+        BankGatewayRateLimited می دهند.
+        :return: slot of the concurrency limit, it is released after the call.
+        """
+        limits = self.default_setting_kwargs.get("RATE_LIMIT")
+        if not limits:
+            return None
+        lease = math.ceil(sum(self._get_request_timeout(operation, timeout))) + 1
+        give_up_at = time.monotonic() + self._get_rate_limit_wait(limits)
+        while True:
+            is_allowed, slot = rate_limiter.acquire(self.get_bank_type(), self.identifier, limits, lease)
+            if is_allowed:
+                return slot
+            if time.monotonic() + rate_limiter.poll_interval > give_up_at:
+                raise self._get_rate_limited_error(operation)
+            time.sleep(rate_limiter.poll_interval)
+
+    async def _atake_rate_limit_slot(self, operation, timeout=None):
+        limits = self.default_setting_kwargs.get("RATE_LIMIT")
+        if not limits:
+            return None
+        lease = math.ceil(sum(self._get_request_timeout(operation, timeout))) + 1
+        give_up_at = time.monotonic() + self._get_rate_limit_wait(limits)
+        while True:
+            is_allowed, slot = rate_limiter.acquire(self.get_bank_type(), self.identifier, limits, lease)
+            if is_allowed:
+                return slot
+            if time.monotonic() + rate_limiter.poll_interval > give_up_at:
+                raise self._get_rate_limited_error(operation)
+            await asyncio.sleep(rate_limiter.poll_interval)
+
+    def _get_rate_limited_error(self, operation):
+        logging.debug(
+            "Gateway is rate limited", extra={"bank_type": self.get_bank_type(), "operation": operation}
+        )
+        metrics.inc("gateway_rate_limited_total", operation=operation, **self._get_metric_labels())
+        return BankGatewayRateLimited(f"{self.get_bank_type()} gateway is saturated by its rate limit.")
+
+    @staticmethod
+    def _get_request_operation(url):
+        """last part of the path of an API url, for example Token or verify."""
+        return parse.urlsplit(url).path.rstrip("/").rsplit("/", 1)[-1] or "/"
+
+    def _get_simulated_url(self, url):
+        """
+        آدرس درگاه در شبیه ساز، اگر SIMULATOR_URL تنظیم شده باشد.
+        for example https://gateway.zibal.ir/v1/request is {SIMULATOR_URL}/zibal/v1/request
+        """
+        simulator_url = settings.SIMULATOR_URL
+        if not simulator_url or not url or url.startswith(simulator_url):
+            return url
+        url_parts = parse.urlsplit(url)
+        simulated_url = "{}/{}{}".format(
+            simulator_url.rstrip("/"), self.get_bank_type().lower(), url_parts.path or "/"
+        )
+        if url_parts.query:
+            simulated_url = f"{simulated_url}?{url_parts.query}"
+        return simulated_url
+
+    def _get_metric_labels(self):
+        return {"bank_type": self.get_bank_type(), "bank_choose_identifier": self.identifier}
+
+    def _measure(self, name, **labels):
+        return metrics.measure(name, **self._get_metric_labels(), **labels)
+
+    def _measure_operation(self, operation):
+        return self._measure("operation", operation=operation)
+
+    @contextmanager
+    def _measure_verify(self):
+        with self._measure_operation("verify") as result:
+            yield
+            is_approved = self._bank is not None and self._bank.status == PaymentStatus.COMPLETE
+            result["outcome"] = "approved" if is_approved else "rejected"
+
+    def check_health(self):
+        """در صورت باز بودن مدار درگاه (خطاهای پیاپی) بدون ارسال درخواست به درگاه خطا می دهد."""
+        if self._is_health_checked:
+            return
+        try:
+            is_allowed = health_registry.allow_request(self.get_bank_type(), self.identifier)
+        except Exception as e:
+            logging.exception(e)
+            is_allowed = True
+        if not is_allowed:
+            raise BankGatewayUnavailable(f"{self.get_bank_type()} gateway is unavailable, circuit is open.")
+        self._is_health_checked = True
+
+    def _record_health(self, succeeded: bool, started_at: float):
+        try:
+            health_registry.record(
+                self.get_bank_type(), self.identifier, succeeded, time.monotonic() - started_at
+            )
+        except Exception as e:
+            # the health registry must never break a payment.
+            logging.exception(e)
+
     def get_gateway_amount(self):
         return self._gateway_amount
 
@@ -304,7 +846,8 @@ class BaseBank:
     def check_gateway(self, amount=None):
         """با این متد از صحت و سلامت گیت وی برای اتصال اطمینان حاصل می کنیم."""
         self._prepare_check_gateway(amount)
-        self.pay()
+        with self._measure_operation("check_gateway"):
+            self.pay()
 
     @abc.abstractmethod
     def _get_gateway_payment_url_parameter(self):
@@ -357,7 +900,7 @@ class BaseBank:
         return self.safe_get_gateway_payment_url()
 
     def safe_get_gateway_payment_url(self):
-        url = self._get_gateway_payment_url_parameter()
+        url = self._get_simulated_url(self._get_gateway_payment_url_parameter())
         params = self._get_gateway_payment_parameter()
         method = self._get_gateway_payment_method_parameter()
         context = {"params": params, "url": url, "method": method}
@@ -365,7 +908,7 @@ class BaseBank:
 
     def get_gateway_payment_url(self):
         redirect_url = reverse(settings.GO_TO_BANK_GATEWAY_NAMESPACE)
-        url = self._get_gateway_payment_url_parameter()
+        url = self._get_simulated_url(self._get_gateway_payment_url_parameter())
         params = self._get_gateway_payment_parameter()
         method = self._get_gateway_payment_method_parameter()
         params.update(
@@ -390,5 +933,5 @@ class BaseBank:
             query.update({"identifier": self.identifier})
             url = append_querystring(url, query)
         else:
-            url = build_full_url(settings.CALLBACK_NAMESPACE)
+            url = self._callback_full_url or build_full_url(settings.CALLBACK_NAMESPACE)
         return url
@@ -70,6 +70,15 @@ class BMI(BaseBank):
         super(BMI, self).pay()
         data = self.get_pay_data()
         response_json = self._send_data(self._token_api_url, data)
+        self._set_pay_response(response_json)
+
+    async def apay(self):
+        await self.aprepare_pay()
+        data = self.get_pay_data()
+        response_json = await self._asend_data(self._token_api_url, data)
+        self._set_pay_response(response_json)
+
+    def _set_pay_response(self, response_json):
         if str(response_json["ResCode"]) == "0":
             token = response_json["Token"]
             self._set_reference_number(token)
@@ -106,33 +115,40 @@ class BMI(BaseBank):
         super(BMI, self).verify(transaction_code)
         data = self.get_verify_data()
         response_json = self._send_data(self._verify_api_url, data)
+        self._set_payment_status(self._get_verify_payment_status(response_json))
+
+    async def averify(self, transaction_code):
+        await self.aprepare_verify(transaction_code)
+        data = self.get_verify_data()
+        response_json = await self._asend_data(self._verify_api_url, data)
+        await self._aset_payment_status(self._get_verify_payment_status(response_json))
+
+    def _get_verify_payment_status(self, response_json):
         if str(response_json["ResCode"]) == "0":
-            self._set_payment_status(PaymentStatus.COMPLETE)
-            extra_information = (
-                f"RetrivalRefNo={response_json['RetrivalRefNo']}"
-                ",SystemTraceNo={response_json['SystemTraceNo']}"
-            )
-            self._bank.extra_information = extra_information
-            self._bank.save()
-        else:
-            self._set_payment_status(PaymentStatus.CANCEL_BY_USER)
-            logging.debug("BMI gateway unapprove payment")
+            extra_information = {
+                "RetrivalRefNo": response_json["RetrivalRefNo"],
+                "SystemTraceNo": response_json["SystemTraceNo"],
+            }
+            self._update_bank_record(extra_information=extra_information)
+            return PaymentStatus.COMPLETE
+        logging.debug("BMI gateway unapprove payment")
+        return PaymentStatus.CANCEL_BY_USER
 
     def prepare_verify_from_gateway(self):
         super(BMI, self).prepare_verify_from_gateway()
-        request = self.get_request()
-        method_data = getattr(request, "POST", {})
-        token = None
-        for key, value in method_data.items():
-            if key.lower() == "token":
-                token = value
-                break
-
+        token = self.get_callback_reference()
         if not token:
             raise BankGatewayStateInvalid
         self._set_reference_number(token)
         self._set_bank_record()
 
+    def get_callback_reference(self):
+        method_data = getattr(self.get_request(), "POST", {})
+        for key, value in method_data.items():
+            if key.lower() == "token":
+                return value
+        return None
+
     def verify_from_gateway(self, request):
         super(BMI, self).verify_from_gateway(request)
 
@@ -153,7 +169,19 @@ class BMI(BaseBank):
 
     def _send_data(self, api, data):
         try:
-            response = requests.post(api, json=data, timeout=self.get_timeout())
+            response = self._http_request("POST", api, json=data)
+        except requests.Timeout:
+            logging.exception("BMI time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+        except requests.ConnectionError:
+            logging.exception("BMI time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+
+        return self._get_response_json(response)
+
+    async def _asend_data(self, api, data):
+        try:
+            response = await self._ahttp_request("POST", api, json=data)
         except requests.Timeout:
             logging.exception("BMI time out gateway {}".format(data))
             raise BankGatewayConnectionError()
@@ -161,6 +189,9 @@ class BMI(BaseBank):
             logging.exception("BMI time out gateway {}".format(data))
             raise BankGatewayConnectionError()
 
+        return self._get_response_json(response)
+
+    def _get_response_json(self, response):
         response_json = get_json(response)
         self._set_transaction_status_text(response_json["Description"])
         return response_json
@@ -1,4 +1,3 @@
-import json
 import logging
 
 import requests
@@ -70,6 +69,15 @@ class IDPay(BaseBank):
         super(IDPay, self).pay()
         data = self.get_pay_data()
         response_json = self._send_data(self._token_api_url, data)
+        self._set_pay_response(response_json)
+
+    async def apay(self):
+        await self.aprepare_pay()
+        data = self.get_pay_data()
+        response_json = await self._asend_data(self._token_api_url, data)
+        self._set_pay_response(response_json)
+
+    def _set_pay_response(self, response_json):
         if (
             "id" in response_json
             and "link" in response_json
@@ -89,12 +97,17 @@ class IDPay(BaseBank):
 
     def prepare_verify_from_gateway(self):
         super(IDPay, self).prepare_verify_from_gateway()
+        token = self.get_callback_reference()
+        if token:
+            self._set_reference_number(token)
+            self._set_bank_record()
+
+    def get_callback_reference(self):
         for method in ["GET", "POST", "data"]:
             token = getattr(self.get_request(), method).get("id")
             if token:
-                self._set_reference_number(token)
-                self._set_bank_record()
-                break
+                return token
+        return None
 
     def verify_from_gateway(self, request):
         super(IDPay, self).verify_from_gateway(request)
@@ -118,22 +131,31 @@ class IDPay(BaseBank):
         super(IDPay, self).verify(transaction_code)
         data = self.get_verify_data()
         response_json = self._send_data(self._verify_api_url, data)
+        self._set_payment_status(self._get_verify_payment_status(response_json))
+
+    async def averify(self, transaction_code):
+        await self.aprepare_verify(transaction_code)
+        data = self.get_verify_data()
+        response_json = await self._asend_data(self._verify_api_url, data)
+        await self._aset_payment_status(self._get_verify_payment_status(response_json))
+
+    def _get_verify_payment_status(self, response_json):
         if response_json.get("verify", {}).get("date"):
-            self._set_payment_status(PaymentStatus.COMPLETE)
-            extra_information = json.dumps(response_json)
-            self._bank.extra_information = extra_information
-            self._bank.save()
-        else:
-            self._set_payment_status(PaymentStatus.CANCEL_BY_USER)
-            logging.debug("IDPay gateway unapprove payment")
+            self._update_bank_record(extra_information=response_json)
+            return PaymentStatus.COMPLETE
+        logging.debug("IDPay gateway unapprove payment")
+        return PaymentStatus.CANCEL_BY_USER
 
-    def _send_data(self, api, data):
-        headers = {
+    def _get_headers(self):
+        return {
             "X-API-KEY": self._merchant_code,
             "X-SANDBOX": self._x_sandbox,
         }
+
+    def _send_data(self, api, data):
+        headers = self._get_headers()
         try:
-            response = requests.post(api, headers=headers, json=data, timeout=self.get_timeout())
+            response = self._http_request("POST", api, headers=headers, json=data)
         except requests.Timeout:
             logging.exception("IDPay time out gateway {}".format(data))
             raise BankGatewayConnectionError()
@@ -141,6 +163,22 @@ class IDPay(BaseBank):
             logging.exception("IDPay time out gateway {}".format(data))
             raise BankGatewayConnectionError()
 
+        return self._get_response_json(response)
+
+    async def _asend_data(self, api, data):
+        headers = self._get_headers()
+        try:
+            response = await self._ahttp_request("POST", api, headers=headers, json=data)
+        except requests.Timeout:
+            logging.exception("IDPay time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+        except requests.ConnectionError:
+            logging.exception("IDPay time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+
+        return self._get_response_json(response)
+
+    def _get_response_json(self, response):
         response_json = get_json(response)
         if "error_message" in response_json:
             self._set_transaction_status_text(response_json["error_message"])
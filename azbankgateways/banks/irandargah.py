@@ -64,6 +64,15 @@ class IranDargah(BaseBank):
         super().pay()
         data = self.get_pay_data()
         result = self._send_data(api=self._payment_url, data=data)
+        self._set_pay_response(result)
+
+    async def apay(self):
+        await self.aprepare_pay()
+        data = self.get_pay_data()
+        result = await self._asend_data(api=self._payment_url, data=data)
+        self._set_pay_response(result)
+
+    def _set_pay_response(self, result):
         if result["status"] == 200:
             self._set_reference_number(result["authority"])
         else:
@@ -72,10 +81,13 @@ class IranDargah(BaseBank):
 
     def prepare_verify_from_gateway(self):
         super().prepare_verify_from_gateway()
-        authority = self.get_request().POST.get("authority")
+        authority = self.get_callback_reference()
         self._set_reference_number(authority)
         self._set_bank_record()
 
+    def get_callback_reference(self):
+        return self.get_request().POST.get("authority")
+
     def verify_from_gateway(self, request):
         super().verify_from_gateway(request)
 
@@ -94,21 +106,41 @@ class IranDargah(BaseBank):
         super().verify(transaction_code)
         data = self.get_verify_data()
         result = self._send_data(api=self._verify_url, data=data)
+        self._set_payment_status(self._get_verify_payment_status(result))
 
+    async def averify(self, transaction_code):
+        await self.aprepare_verify(transaction_code)
+        data = self.get_verify_data()
+        result = await self._asend_data(api=self._verify_url, data=data)
+        await self._aset_payment_status(self._get_verify_payment_status(result))
+
+    def _get_verify_payment_status(self, result):
         if result.get("status") in [100, 101]:
-            self._set_payment_status(PaymentStatus.COMPLETE)
-        else:
-            self._set_payment_status(PaymentStatus.CANCEL_BY_USER)
-            logging.debug("IranDargah verify failed: %s", result.get("message"))
+            return PaymentStatus.COMPLETE
+        logging.debug("IranDargah verify failed: %s", result.get("message"))
+        return PaymentStatus.CANCEL_BY_USER
 
     def _send_data(self, api, data):
         try:
-            response = requests.post(api, json=data, timeout=self.get_timeout())
+            response = self._http_request("POST", api, json=data)
             response.raise_for_status()
         except requests.RequestException as e:
             logging.exception("IranDargah connection error: %s", e)
             raise BankGatewayConnectionError()
 
+        return self._get_response_json(response)
+
+    async def _asend_data(self, api, data):
+        try:
+            response = await self._ahttp_request("POST", api, json=data)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logging.exception("IranDargah connection error: %s", e)
+            raise BankGatewayConnectionError()
+
+        return self._get_response_json(response)
+
+    def _get_response_json(self, response):
         result = get_json(response)
         msg = result.get("message", "no message")
         self._set_transaction_status_text(msg)
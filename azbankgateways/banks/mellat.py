@@ -1,19 +1,81 @@
+import asyncio
+import contextvars
 import logging
-from json import dumps, loads
+import os
+import threading
+import time
+import weakref
 from time import gmtime, strftime
 
-from zeep import Client, Transport
+import requests
+from zeep import AsyncClient, Client, Transport
+from zeep.exceptions import TransportError
+from zeep.proxy import AsyncServiceProxy, ServiceProxy
+from zeep.transports import AsyncTransport
 
+from azbankgateways import default_settings as settings
 from azbankgateways.banks import BaseBank
 from azbankgateways.exceptions import SettingDoesNotExist
 from azbankgateways.exceptions.exceptions import BankGatewayRejectPayment
-from azbankgateways.models import BankType, CurrencyEnum, PaymentStatus
+from azbankgateways.models import (
+    BankType,
+    CurrencyEnum,
+    PaymentStatus,
+    SettlementStatus,
+)
+from azbankgateways.rate_limit import rate_limiter
+
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+MELLAT_WSDL = os.path.join(os.path.dirname(__file__), "wsdl", "mellat.wsdl")
+MELLAT_SERVICE_BINDING = "{http://interfaces.core.sw.bps.com/}PaymentGatewayImplServiceSoapBinding"
+MELLAT_SERVICE_ADDRESS = "https://bpm.shaparak.ir/pgwchannel/services/pgw"
+
+# (connect, read) timeout of the running SOAP operation, set by Mellat._call_service and Mellat._acall_service.
+_operation_timeout = contextvars.ContextVar("mellat_operation_timeout", default=None)
+
+
+class _Transport(Transport):
+    """zeep transport of the cached clients, the timeout of each operation comes from its call."""
+
+    @property
+    def operation_timeout(self):
+        return _operation_timeout.get() or self._operation_timeout
+
+    @operation_timeout.setter
+    def operation_timeout(self, value):
+        self._operation_timeout = value
+
+
+class _AsyncTransport(AsyncTransport):
+    async def post(self, address, message, headers):
+        timeout = _operation_timeout.get()
+        if timeout is None:
+            return await super(_AsyncTransport, self).post(address, message, headers)
+        connect_timeout, read_timeout = timeout
+        return await self.client.post(
+            address,
+            content=message,
+            headers=headers,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
 
 
 class Mellat(BaseBank):
+    _idempotent_operations = frozenset(["bpInquiryRequest"])
     _terminal_code = None
     _username = None
     _password = None
+    _wsdl = None
+    # SOAP clients are expensive to build (the WSDL is parsed on creation), keep one per process.
+    _clients = {}
+    _clients_lock = threading.Lock()
+    # async clients are bound to the event loop they were created in.
+    _async_clients = weakref.WeakKeyDictionary()
 
     def __init__(self, **kwargs):
         super(Mellat, self).__init__(**kwargs)
@@ -28,6 +90,7 @@ class Mellat(BaseBank):
             if item not in self.default_setting_kwargs:
                 raise SettingDoesNotExist()
             setattr(self, f"_{item.lower()}", self.default_setting_kwargs[item])
+        self._wsdl = self.default_setting_kwargs.get("WSDL", MELLAT_WSDL)
 
     """
     gateway
@@ -79,7 +142,19 @@ class Mellat(BaseBank):
 
         data = self.get_pay_data()
         client = self._get_client()
-        response = client.service.bpPayRequest(**data)
+        response = self._call_service(client, "bpPayRequest", **data)
+        self._set_pay_response(response)
+
+    async def apay(self):
+        if httpx is None:
+            return await super(Mellat, self).apay()
+        await self.aprepare_pay()
+        data = self.get_pay_data()
+        client = self._get_async_client()
+        response = await self._acall_service(client, "bpPayRequest", **data)
+        self._set_pay_response(response)
+
+    def _set_pay_response(self, response):
         try:
             status, token = response.split(",")
             if status == "0":
@@ -186,13 +261,16 @@ class Mellat(BaseBank):
     def prepare_verify_from_gateway(self):
         super(Mellat, self).prepare_verify_from_gateway()
         post = self.get_request().POST
-        token = post.get("RefId")
+        token = self.get_callback_reference()
         if not token:
             return
         self._set_reference_number(token)
         self._set_bank_record()
-        self._bank.extra_information = dumps(dict(post.items()))
-        self._bank.save()
+        self._update_bank_record(extra_information=dict(post.items()))
+        self._save_bank_record()
+
+    def get_callback_reference(self):
+        return self.get_request().POST.get("RefId")
 
     def verify_from_gateway(self, request):
         super(Mellat, self).verify_from_gateway(request)
@@ -221,16 +299,16 @@ class Mellat(BaseBank):
         data = self.get_verify_data()
         client = self._get_client()
 
-        verify_result = client.service.bpVerifyRequest(**data)
+        verify_result = self._call_service(client, "bpVerifyRequest", **data)
         if verify_result == "0":
             self._settle_transaction()
         else:
-            verify_result = client.service.bpInquiryRequest(**data)
+            verify_result = self._call_service(client, "bpInquiryRequest", **data)
             if verify_result == "0":
                 self._settle_transaction()
             else:
                 logging.debug("Not able to verify the transaction, Making reversal request")
-                reversal_result = client.service.bpReversalRequest(**data)
+                reversal_result = self._call_service(client, "bpReversalRequest", **data)
 
                 if reversal_result != "0":
                     logging.debug("Reversal request was not successfull")
@@ -238,21 +316,171 @@ class Mellat(BaseBank):
                 self._set_payment_status(PaymentStatus.CANCEL_BY_USER)
                 logging.debug("Mellat gateway unapproved the payment")
 
-    def _settle_transaction(self):
+    async def averify(self, transaction_code):
+        if httpx is None:
+            return await super(Mellat, self).averify(transaction_code)
+        await self.aprepare_verify(transaction_code)
+        data = self.get_verify_data()
+        client = self._get_async_client()
+
+        verify_result = await self._acall_service(client, "bpVerifyRequest", **data)
+        if verify_result == "0":
+            await self._asettle_transaction()
+        else:
+            verify_result = await self._acall_service(client, "bpInquiryRequest", **data)
+            if verify_result == "0":
+                await self._asettle_transaction()
+            else:
+                logging.debug("Not able to verify the transaction, Making reversal request")
+                reversal_result = await self._acall_service(client, "bpReversalRequest", **data)
+
+                if reversal_result != "0":
+                    logging.debug("Reversal request was not successfull")
+
+                await self._aset_payment_status(PaymentStatus.CANCEL_BY_USER)
+                logging.debug("Mellat gateway unapproved the payment")
+
+    def settle(self) -> bool:
         data = self.get_verify_data()
         client = self._get_client()
-        settle_result = client.service.bpSettleRequest(**data)
-        if settle_result == "0":
+        return self._call_service(client, "bpSettleRequest", **data) == "0"
+
+    async def asettle(self) -> bool:
+        if httpx is None:
+            return await super(Mellat, self).asettle()
+        data = self.get_verify_data()
+        client = self._get_async_client()
+        return await self._acall_service(client, "bpSettleRequest", **data) == "0"
+
+    def _settle_transaction(self):
+        if self._defer_settlement():
+            self._set_payment_status(PaymentStatus.COMPLETE)
+        elif self.settle():
+            self._set_settlement_status(SettlementStatus.SETTLED)
             self._set_payment_status(PaymentStatus.COMPLETE)
         else:
             logging.debug("Mellat gateway did not settle the payment")
 
-    @staticmethod
-    def _get_client():
-        transport = Transport(timeout=Mellat.get_timeout(), operation_timeout=Mellat.get_timeout())
-        client = Client("https://bpm.shaparak.ir/pgwchannel/services/pgw?wsdl", transport=transport)
+    async def _asettle_transaction(self):
+        if self._defer_settlement():
+            await self._aset_payment_status(PaymentStatus.COMPLETE)
+        elif await self.asettle():
+            self._set_settlement_status(SettlementStatus.SETTLED)
+            await self._aset_payment_status(PaymentStatus.COMPLETE)
+        else:
+            logging.debug("Mellat gateway did not settle the payment")
+
+    def _call_service(self, client, operation, **data):
+        attempts = self._get_retry_attempts(operation)
+        for attempt in range(1, attempts + 1):
+            try:
+                return self._send_service_request(client, operation, **data)
+            except Exception as e:
+                delay = self._get_retry_delay(operation, attempt, attempts) if self._is_retryable(e) else None
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+    async def _acall_service(self, client, operation, **data):
+        attempts = self._get_retry_attempts(operation)
+        for attempt in range(1, attempts + 1):
+            try:
+                return await self._asend_service_request(client, operation, **data)
+            except Exception as e:
+                delay = self._get_retry_delay(operation, attempt, attempts) if self._is_retryable(e) else None
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+    def _send_service_request(self, client, operation, **data):
+        slot = self._take_rate_limit_slot(operation)
+        try:
+            token = _operation_timeout.set(self.get_operation_timeout(operation))
+            started_at = time.monotonic()
+            try:
+                with self._measure("gateway_request", operation=operation) as measure_result:
+                    try:
+                        result = getattr(self._get_service(client), operation)(**data)
+                    except Exception:
+                        self._record_health(False, started_at)
+                        raise
+                    if str(result).split(",")[0] != "0":
+                        measure_result["outcome"] = "rejected"
+            finally:
+                _operation_timeout.reset(token)
+        finally:
+            rate_limiter.release(slot)
+        self._record_health(True, started_at)
+        return result
+
+    async def _asend_service_request(self, client, operation, **data):
+        slot = await self._atake_rate_limit_slot(operation)
+        try:
+            token = _operation_timeout.set(self.get_operation_timeout(operation))
+            started_at = time.monotonic()
+            try:
+                with self._measure("gateway_request", operation=operation) as measure_result:
+                    try:
+                        result = await getattr(self._get_service(client), operation)(**data)
+                    except Exception:
+                        self._record_health(False, started_at)
+                        raise
+                    if str(result).split(",")[0] != "0":
+                        measure_result["outcome"] = "rejected"
+            finally:
+                _operation_timeout.reset(token)
+        finally:
+            rate_limiter.release(slot)
+        self._record_health(True, started_at)
+        return result
+
+    def _is_retryable(self, error) -> bool:
+        if isinstance(error, TransportError):
+            return error.status_code in self._retry_status_codes
+        return isinstance(error, (requests.ConnectionError, requests.Timeout)) or bool(
+            httpx and isinstance(error, httpx.TransportError)
+        )
+
+    def _get_service(self, client):
+        if not settings.SIMULATOR_URL:
+            return client.service
+        # the address of the WSDL is replaced by the address of the service in the simulator.
+        proxy_class = AsyncServiceProxy if isinstance(client, AsyncClient) else ServiceProxy
+        binding = client.wsdl.bindings[MELLAT_SERVICE_BINDING]
+        return proxy_class(client, binding, address=self._get_simulated_url(MELLAT_SERVICE_ADDRESS))
+
+    def _get_client(self):
+        return self._get_cached_client(self._wsdl, self.get_timeout())
+
+    @classmethod
+    def _get_cached_client(cls, wsdl, timeout) -> Client:
+        key = (wsdl, timeout)
+        client = cls._clients.get(key)
+        if client is None:
+            with cls._clients_lock:
+                client = cls._clients.get(key)
+                if client is None:
+                    logging.debug("Create Mellat SOAP client", extra={"wsdl": wsdl})
+                    transport = _Transport(timeout=timeout, operation_timeout=timeout)
+                    client = Client(wsdl, transport=transport)
+                    cls._clients[key] = client
         return client
 
+    def _get_async_client(self) -> AsyncClient:
+        clients = self._async_clients.setdefault(asyncio.get_running_loop(), {})
+        key = (self._wsdl, self.get_timeout())
+        if key not in clients:
+            logging.debug("Create Mellat async SOAP client", extra={"wsdl": self._wsdl})
+            transport = _AsyncTransport(timeout=self.get_timeout(), operation_timeout=self.get_timeout())
+            clients[key] = AsyncClient(self._wsdl, transport=transport)
+        return clients[key]
+
+    @classmethod
+    def _clear_clients(cls):
+        cls._clients = {}
+        cls._clients_lock = threading.Lock()
+        cls._async_clients = weakref.WeakKeyDictionary()
+
     @staticmethod
     def _get_current_time():
         return strftime("%H%M%S")
@@ -262,5 +490,10 @@ class Mellat(BaseBank):
         return strftime("%Y%m%d", gmtime())
 
     def _get_sale_reference_id(self):
-        extra_information = loads(getattr(self._bank, "extra_information", "{}"))
+        extra_information = getattr(self._bank, "extra_information", None) or {}
         return extra_information.get("SaleReferenceId", "1")
+
+
+if hasattr(os, "register_at_fork"):
+    # cached clients hold open connections, a forked child must build its own.
+    os.register_at_fork(after_in_child=Mellat._clear_clients)
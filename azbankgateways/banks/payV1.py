@@ -1,4 +1,3 @@
-import json
 import logging
 
 import requests
@@ -70,6 +69,15 @@ class PayV1(BaseBank):
         super(PayV1, self).pay()
         data = self.get_pay_data()
         response = self._send_data(self._token_api_url, data)
+        self._set_pay_response(response)
+
+    async def apay(self):
+        await self.aprepare_pay()
+        data = self.get_pay_data()
+        response = await self._asend_data(self._token_api_url, data)
+        self._set_pay_response(response)
+
+    def _set_pay_response(self, response):
         response_json = response.json()
         if response.status_code == 200 and int(response_json["status"]) == 1:
             token = response_json["token"]
@@ -88,19 +96,22 @@ class PayV1(BaseBank):
 
     def prepare_verify_from_gateway(self):
         super(PayV1, self).prepare_verify_from_gateway()
+        token = self.get_callback_reference()
+        if not token:
+            raise BankGatewayStateInvalid
+        self._set_reference_number(token)
+        self._set_bank_record()
+
+    def get_callback_reference(self):
         request = self.get_request()
         for method in [
             "GET",
             "POST",
         ]:
             token = getattr(request, method, {}).get("token")
-
             if token:
-                self._set_reference_number(token)
-                self._set_bank_record()
-                break
-        else:
-            raise BankGatewayStateInvalid
+                return token
+        return None
 
     def verify_from_gateway(self, request):
         super(PayV1, self).verify_from_gateway(request)
@@ -122,25 +133,49 @@ class PayV1(BaseBank):
         data = self.get_verify_data()
         try:
             response = self._send_data(self._verify_api_url, data)
-            response.raise_for_status()
-            response_json = response.json()
-            status = str(response_json.get("status", 0))
-            if status == '1':
-                status = PaymentStatus.COMPLETE
-                extra_information = json.dumps(response_json)
-                self._bank.extra_information = extra_information
-            else:
-                status = PaymentStatus.ERROR
+            status = self._get_verify_payment_status(response)
         except (JSONDecodeError, HTTPError, Timeout):
             status = PaymentStatus.ERROR
 
         self._set_payment_status(status)
-        self._bank.save()
+
+    async def averify(self, tracking_code):
+        await self.aprepare_verify(tracking_code)
+        data = self.get_verify_data()
+        try:
+            response = await self._asend_data(self._verify_api_url, data)
+            status = self._get_verify_payment_status(response)
+        except (JSONDecodeError, HTTPError, Timeout):
+            status = PaymentStatus.ERROR
+
+        await self._aset_payment_status(status)
+
+    def _get_verify_payment_status(self, response):
+        response.raise_for_status()
+        response_json = response.json()
+        status = str(response_json.get("status", 0))
+        if status == '1':
+            self._update_bank_record(extra_information=response_json)
+            return PaymentStatus.COMPLETE
+        return PaymentStatus.ERROR
 
     def _send_data(self, url, data) -> requests.post:
         try:
             logging.debug("Sending POST request to {} with data {}".format(url, data))
-            response = requests.post(url, json=data, timeout=self.get_timeout())
+            response = self._http_request("POST", url, json=data)
+        except requests.Timeout:
+            logging.exception("PayV1 time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+        except requests.ConnectionError:
+            logging.exception("PayV1 time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+
+        return response
+
+    async def _asend_data(self, url, data) -> requests.Response:
+        try:
+            logging.debug("Sending POST request to {} with data {}".format(url, data))
+            response = await self._ahttp_request("POST", url, json=data)
         except requests.Timeout:
             logging.exception("PayV1 time out gateway {}".format(data))
             raise BankGatewayConnectionError()
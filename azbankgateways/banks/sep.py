@@ -54,6 +54,15 @@ class SEP(BaseBank):
         super(SEP, self).pay()
         data = self.get_pay_data()
         response_json = self._send_data(self._token_api_url, data)
+        self._set_pay_response(response_json)
+
+    async def apay(self):
+        await self.aprepare_pay()
+        data = self.get_pay_data()
+        response_json = await self._asend_data(self._token_api_url, data)
+        self._set_pay_response(response_json)
+
+    def _set_pay_response(self, response_json):
         if str(response_json["status"]) == "1":
             token = response_json["token"]
             self._set_reference_number(token)
@@ -85,17 +94,19 @@ class SEP(BaseBank):
     def prepare_verify_from_gateway(self):
         super(SEP, self).prepare_verify_from_gateway()
         request = self.get_request()
-        tracking_code = request.GET.get("ResNum")
+        tracking_code = self.get_callback_reference()
         token = request.GET.get("Token")
         self._set_tracking_code(tracking_code)
         self._set_bank_record()
         ref_num = request.GET.get("RefNum")
         if request.GET.get("State", "NOK") == "OK" and ref_num:
             self._set_reference_number(ref_num)
-            self._bank.reference_number = ref_num
-            extra_information = f"TRACENO={request.GET.get('TRACENO')}, RefNum={ref_num}, Token={token}"
-            self._bank.extra_information = extra_information
-            self._bank.save()
+            extra_information = {"TRACENO": request.GET.get("TRACENO"), "RefNum": ref_num, "Token": token}
+            self._update_bank_record(reference_number=ref_num, extra_information=extra_information)
+            self._save_bank_record()
+
+    def get_callback_reference(self):
+        return self.get_request().GET.get("ResNum")
 
     def verify_from_gateway(self, request):
         super(SEP, self).verify_from_gateway(request)
@@ -115,15 +126,35 @@ class SEP(BaseBank):
         super(SEP, self).verify(transaction_code)
         data = self.get_verify_data()
         result = self._send_data(api=self._verify_api_url, data=data)
+        self._set_payment_status(self._get_verify_payment_status(result))
+
+    async def averify(self, transaction_code):
+        await self.aprepare_verify(transaction_code)
+        data = self.get_verify_data()
+        result = await self._asend_data(api=self._verify_api_url, data=data)
+        await self._aset_payment_status(self._get_verify_payment_status(result))
+
+    def _get_verify_payment_status(self, result):
         if result.get('ResultCode') == 0:
-            self._set_payment_status(PaymentStatus.COMPLETE)
-        else:
-            self._set_payment_status(PaymentStatus.CANCEL_BY_USER)
-            logging.debug("SEP gateway unapprove payment")
+            return PaymentStatus.COMPLETE
+        logging.debug("SEP gateway unapprove payment")
+        return PaymentStatus.CANCEL_BY_USER
 
     def _send_data(self, api, data):
         try:
-            response = requests.post(api, json=data, timeout=self.get_timeout())
+            response = self._http_request("POST", api, json=data)
+        except requests.Timeout:
+            logging.exception("SEP time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+        except requests.ConnectionError:
+            logging.exception("SEP time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+
+        return self._get_response_json(response)
+
+    async def _asend_data(self, api, data):
+        try:
+            response = await self._ahttp_request("POST", api, json=data)
         except requests.Timeout:
             logging.exception("SEP time out gateway {}".format(data))
             raise BankGatewayConnectionError()
@@ -131,6 +162,9 @@ class SEP(BaseBank):
             logging.exception("SEP time out gateway {}".format(data))
             raise BankGatewayConnectionError()
 
+        return self._get_response_json(response)
+
+    def _get_response_json(self, response):
         response_json = get_json(response)
         self._set_transaction_status_text(response_json.get("errorDesc"))
         return response_json
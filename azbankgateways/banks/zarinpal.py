@@ -81,6 +81,15 @@ class Zarinpal(BaseBank):
         super(Zarinpal, self).pay()
         data = self.get_pay_data()
         result = self._send_data(api=self._payment_url, data=data)
+        self._set_pay_response(result)
+
+    async def apay(self):
+        await self.aprepare_pay()
+        data = self.get_pay_data()
+        result = await self._asend_data(api=self._payment_url, data=data)
+        self._set_pay_response(result)
+
+    def _set_pay_response(self, result):
         if result['data']:
             token = result['data']['authority']
             self._set_reference_number(token)
@@ -94,10 +103,13 @@ class Zarinpal(BaseBank):
 
     def prepare_verify_from_gateway(self):
         super(Zarinpal, self).prepare_verify_from_gateway()
-        token = self.get_request().GET.get("Authority")
+        token = self.get_callback_reference()
         self._set_reference_number(token)
         self._set_bank_record()
 
+    def get_callback_reference(self):
+        return self.get_request().GET.get("Authority")
+
     def verify_from_gateway(self, request):
         super(Zarinpal, self).verify_from_gateway(request)
 
@@ -120,15 +132,35 @@ class Zarinpal(BaseBank):
         super(Zarinpal, self).verify(transaction_code)
         data = self.get_verify_data()
         result = self._send_data(api=self._verify_url, data=data)
+        self._set_payment_status(self._get_verify_payment_status(result))
+
+    async def averify(self, transaction_code):
+        await self.aprepare_verify(transaction_code)
+        data = self.get_verify_data()
+        result = await self._asend_data(api=self._verify_url, data=data)
+        await self._aset_payment_status(self._get_verify_payment_status(result))
+
+    def _get_verify_payment_status(self, result):
         if result['data'] and result['data']['code'] in [100, 101]:
-            self._set_payment_status(PaymentStatus.COMPLETE)
-        else:
-            self._set_payment_status(PaymentStatus.CANCEL_BY_USER)
-            logging.debug("Zarinpal gateway unapprove payment")
+            return PaymentStatus.COMPLETE
+        logging.debug("Zarinpal gateway unapprove payment")
+        return PaymentStatus.CANCEL_BY_USER
 
     def _send_data(self, api, data):
         try:
-            response = requests.post(api, json=data, timeout=self.get_timeout())
+            response = self._http_request("POST", api, json=data)
+        except requests.Timeout:
+            logging.exception("ZARINPAL time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+        except requests.ConnectionError:
+            logging.exception("ZARINPAL time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+
+        return self._get_response_json(response)
+
+    async def _asend_data(self, api, data):
+        try:
+            response = await self._ahttp_request("POST", api, json=data)
         except requests.Timeout:
             logging.exception("ZARINPAL time out gateway {}".format(data))
             raise BankGatewayConnectionError()
@@ -136,6 +168,9 @@ class Zarinpal(BaseBank):
             logging.exception("ZARINPAL time out gateway {}".format(data))
             raise BankGatewayConnectionError()
 
+        return self._get_response_json(response)
+
+    def _get_response_json(self, response):
         response_json = get_json(response)
         if response_json['data']:
             self._set_transaction_status_text(response_json['data']['message'])
@@ -1,4 +1,3 @@
-import json
 import logging
 
 import requests
@@ -65,6 +64,15 @@ class Zibal(BaseBank):
         super(Zibal, self).pay()
         data = self.get_pay_data()
         response_json = self._send_data(self._token_api_url, data)
+        self._set_pay_response(response_json)
+
+    async def apay(self):
+        await self.aprepare_pay()
+        data = self.get_pay_data()
+        response_json = await self._asend_data(self._token_api_url, data)
+        self._set_pay_response(response_json)
+
+    def _set_pay_response(self, response_json):
         if response_json["result"] == 100:
             token = response_json["trackId"]
             self._set_reference_number(token)
@@ -78,10 +86,13 @@ class Zibal(BaseBank):
 
     def prepare_verify_from_gateway(self):
         super(Zibal, self).prepare_verify_from_gateway()
-        token = self.get_request().GET.get("trackId")
+        token = self.get_callback_reference()
         self._set_reference_number(token)
         self._set_bank_record()
 
+    def get_callback_reference(self):
+        return self.get_request().GET.get("trackId")
+
     def verify_from_gateway(self, request):
         super(Zibal, self).verify_from_gateway(request)
 
@@ -104,18 +115,36 @@ class Zibal(BaseBank):
         super(Zibal, self).verify(transaction_code)
         data = self.get_verify_data()
         response_json = self._send_data(self._verify_api_url, data)
+        self._set_payment_status(self._get_verify_payment_status(response_json))
+
+    async def averify(self, transaction_code):
+        await self.aprepare_verify(transaction_code)
+        data = self.get_verify_data()
+        response_json = await self._asend_data(self._verify_api_url, data)
+        await self._aset_payment_status(self._get_verify_payment_status(response_json))
+
+    def _get_verify_payment_status(self, response_json):
         if response_json["result"] == 100 and response_json["status"] == 1:
-            self._set_payment_status(PaymentStatus.COMPLETE)
-            extra_information = json.dumps(response_json)
-            self._bank.extra_information = extra_information
-            self._bank.save()
-        else:
-            self._set_payment_status(PaymentStatus.CANCEL_BY_USER)
-            logging.debug("Zibal gateway unapprove payment")
+            self._update_bank_record(extra_information=response_json)
+            return PaymentStatus.COMPLETE
+        logging.debug("Zibal gateway unapprove payment")
+        return PaymentStatus.CANCEL_BY_USER
 
     def _send_data(self, api, data):
         try:
-            response = requests.post(api, json=data, timeout=self.get_timeout())
+            response = self._http_request("POST", api, json=data)
+        except requests.Timeout:
+            logging.exception("Zibal time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+        except requests.ConnectionError:
+            logging.exception("Zibal time out gateway {}".format(data))
+            raise BankGatewayConnectionError()
+
+        return self._get_response_json(response)
+
+    async def _asend_data(self, api, data):
+        try:
+            response = await self._ahttp_request("POST", api, json=data)
         except requests.Timeout:
             logging.exception("Zibal time out gateway {}".format(data))
             raise BankGatewayConnectionError()
@@ -123,6 +152,9 @@ class Zibal(BaseBank):
             logging.exception("Zibal time out gateway {}".format(data))
             raise BankGatewayConnectionError()
 
+        return self._get_response_json(response)
+
+    def _get_response_json(self, response):
         response_json = get_json(response)
         self._set_transaction_status_text(response_json["message"])
         return response_json
@@ -0,0 +1,51 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+from .exceptions import BankGatewayDeadlineExceeded
+
+
+_deadline = contextvars.ContextVar("azbankgateways_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    مهلت کلی درخواست ها به درگاه ها در این بلاک، برای مثال بودجه زمانی یک ویو.
+
+    Every gateway call in the block (and in the threads and tasks started with its context) waits at most the
+    remaining time, a call after the deadline raises BankGatewayDeadlineExceeded and no retry is started
+    without time for it. Nested deadlines never extend the outer one. ``None`` does not limit the block.
+    """
+    if seconds is None:
+        yield
+        return
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(current, at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def get_remaining_time():
+    """:return: seconds to the deadline of the context, None without deadline."""
+    at = _deadline.get()
+    if at is None:
+        return None
+    return max(at - time.monotonic(), 0)
+
+
+def get_deadline_timeout(timeout: tuple) -> tuple:
+    """
+    :param timeout: (connect, read) seconds of a gateway call
+    :return: the timeout bounded by the remaining time
+    """
+    remaining = get_remaining_time()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise BankGatewayDeadlineExceeded("The deadline of the request is exceeded.")
+    connect, read = timeout
+    return min(connect, remaining), min(read, remaining)
@@ -26,14 +26,95 @@ BANK_PRIORITIES = _AZ_IRANIAN_BANK_GATEWAYS.get("BANK_PRIORITIES", [])
 BANK_GATEWAYS = _AZ_IRANIAN_BANK_GATEWAYS.get("GATEWAYS", {})
 BANK_DEFAULT = _AZ_IRANIAN_BANK_GATEWAYS.get("DEFAULT", "BMI")
 BANK_TIMEOUT = _AZ_IRANIAN_BANK_GATEWAYS.get("BANK_TIMEOUT", 5)
+BANK_CONNECT_TIMEOUT = _AZ_IRANIAN_BANK_GATEWAYS.get("BANK_CONNECT_TIMEOUT", BANK_TIMEOUT)
+AUTO_CREATE_MODE = _AZ_IRANIAN_BANK_GATEWAYS.get("AUTO_CREATE_MODE", "sequential")
+AUTO_CREATE_DEADLINE = _AZ_IRANIAN_BANK_GATEWAYS.get("AUTO_CREATE_DEADLINE", BANK_TIMEOUT)
+AUTO_CREATE_HEDGE_DELAY = _AZ_IRANIAN_BANK_GATEWAYS.get("AUTO_CREATE_HEDGE_DELAY", 0.5)
+AUTO_CREATE_MAX_WORKERS = _AZ_IRANIAN_BANK_GATEWAYS.get("AUTO_CREATE_MAX_WORKERS", 20)
+CIRCUIT_BREAKER_ENABLE = _AZ_IRANIAN_BANK_GATEWAYS.get("CIRCUIT_BREAKER_ENABLE", False)
+CIRCUIT_BREAKER_CACHE = _AZ_IRANIAN_BANK_GATEWAYS.get("CIRCUIT_BREAKER_CACHE", "default")
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = _AZ_IRANIAN_BANK_GATEWAYS.get("CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5)
+CIRCUIT_BREAKER_RECOVERY_TIMEOUT = _AZ_IRANIAN_BANK_GATEWAYS.get("CIRCUIT_BREAKER_RECOVERY_TIMEOUT", 30)
+CIRCUIT_BREAKER_SLOW_CALL_THRESHOLD = _AZ_IRANIAN_BANK_GATEWAYS.get("CIRCUIT_BREAKER_SLOW_CALL_THRESHOLD")
+ROUTING_POLICY_CLASS = _AZ_IRANIAN_BANK_GATEWAYS.get(
+    "ROUTING_POLICY_CLASS", "azbankgateways.routing.StaticRoutingPolicy"
+)
+ROUTING_MAX_SHIFT = _AZ_IRANIAN_BANK_GATEWAYS.get("ROUTING_MAX_SHIFT", 2)
+ROUTING_MIN_SAMPLES = _AZ_IRANIAN_BANK_GATEWAYS.get("ROUTING_MIN_SAMPLES", 20)
+ROUTING_TOLERANCE = _AZ_IRANIAN_BANK_GATEWAYS.get("ROUTING_TOLERANCE", 0.2)
+ROUTING_STATS_MAX_AGE = _AZ_IRANIAN_BANK_GATEWAYS.get("ROUTING_STATS_MAX_AGE", 300)
+EXPIRE_RECORDS_TTL = _AZ_IRANIAN_BANK_GATEWAYS.get(
+    "EXPIRE_RECORDS_TTL",
+    {"WAITING": 15 * 60, "REDIRECT_TO_BANK": 15 * 60, "RETURN_FROM_BANK": 15 * 60},
+)
+EXPIRE_RECORDS_BATCH_SIZE = _AZ_IRANIAN_BANK_GATEWAYS.get("EXPIRE_RECORDS_BATCH_SIZE", 1000)
+REVERIFY_BATCH_SIZE = _AZ_IRANIAN_BANK_GATEWAYS.get("REVERIFY_BATCH_SIZE", 100)
+REVERIFY_MAX_WORKERS = _AZ_IRANIAN_BANK_GATEWAYS.get("REVERIFY_MAX_WORKERS", 16)
+REVERIFY_MAX_CONCURRENCY_PER_GATEWAY = _AZ_IRANIAN_BANK_GATEWAYS.get(
+    "REVERIFY_MAX_CONCURRENCY_PER_GATEWAY", 4
+)
+REVERIFY_MAX_ATTEMPTS = _AZ_IRANIAN_BANK_GATEWAYS.get("REVERIFY_MAX_ATTEMPTS", 3)
+REVERIFY_GATEWAY_FAILURE_LIMIT = _AZ_IRANIAN_BANK_GATEWAYS.get("REVERIFY_GATEWAY_FAILURE_LIMIT", 20)
+REVERIFY_MIN_AGE = _AZ_IRANIAN_BANK_GATEWAYS.get("REVERIFY_MIN_AGE", 60)
+RECONCILIATION_BATCH_SIZE = _AZ_IRANIAN_BANK_GATEWAYS.get("RECONCILIATION_BATCH_SIZE", 1000)
+RECONCILIATION_FORMATS = _AZ_IRANIAN_BANK_GATEWAYS.get("RECONCILIATION_FORMATS", {})
+HTTP_KEEP_ALIVE = _AZ_IRANIAN_BANK_GATEWAYS.get("HTTP_KEEP_ALIVE", True)
+HTTP_POOL_MAXSIZE = _AZ_IRANIAN_BANK_GATEWAYS.get("HTTP_POOL_MAXSIZE", 10)
+HTTP_POOL_MAXSIZE_PER_HOST = _AZ_IRANIAN_BANK_GATEWAYS.get("HTTP_POOL_MAXSIZE_PER_HOST", {})
 SETTING_VALUE_READER_CLASS = _AZ_IRANIAN_BANK_GATEWAYS.get(
     "SETTING_VALUE_READER_CLASS", "azbankgateways.readers.DefaultReader"
 )
 CURRENCY = _AZ_IRANIAN_BANK_GATEWAYS.get("CURRENCY", "IRR")
 TRACKING_CODE_QUERY_PARAM = _AZ_IRANIAN_BANK_GATEWAYS.get("TRACKING_CODE_QUERY_PARAM", "tc")
 TRACKING_CODE_LENGTH = _AZ_IRANIAN_BANK_GATEWAYS.get("TRACKING_CODE_LENGTH", 16)
+# None: SnowflakeTrackingCodeGenerator, RandomTrackingCodeGenerator for TRACKING_CODE_LENGTH below 16.
+TRACKING_CODE_GENERATOR_CLASS = _AZ_IRANIAN_BANK_GATEWAYS.get("TRACKING_CODE_GENERATOR_CLASS")
+# deprecated and ignored, a setting is the same in every worker process.
+TRACKING_CODE_NODE_ID = _AZ_IRANIAN_BANK_GATEWAYS.get("TRACKING_CODE_NODE_ID")
+TRACKING_CODE_NODE_CACHE = _AZ_IRANIAN_BANK_GATEWAYS.get("TRACKING_CODE_NODE_CACHE", "default")
+TRACKING_CODE_NODE_LEASE = _AZ_IRANIAN_BANK_GATEWAYS.get("TRACKING_CODE_NODE_LEASE", 3600)
 IS_SAMPLE_FORM_ENABLE = _AZ_IRANIAN_BANK_GATEWAYS.get("IS_SAMPLE_FORM_ENABLE", False)
 IS_SAFE_GET_GATEWAY_PAYMENT = _AZ_IRANIAN_BANK_GATEWAYS.get("IS_SAFE_GET_GATEWAY_PAYMENT", False)
+IS_ASYNC_CALLBACK_ENABLE = _AZ_IRANIAN_BANK_GATEWAYS.get("IS_ASYNC_CALLBACK_ENABLE", False)
+IS_DEFERRED_VERIFY_ENABLE = _AZ_IRANIAN_BANK_GATEWAYS.get("IS_DEFERRED_VERIFY_ENABLE", False)
+VERIFY_QUEUE_CLASS = _AZ_IRANIAN_BANK_GATEWAYS.get(
+    "VERIFY_QUEUE_CLASS", "azbankgateways.verify_queue.DatabaseVerifyQueue"
+)
+VERIFY_QUEUE_BATCH_SIZE = _AZ_IRANIAN_BANK_GATEWAYS.get("VERIFY_QUEUE_BATCH_SIZE", 50)
+VERIFY_QUEUE_LEASE = _AZ_IRANIAN_BANK_GATEWAYS.get("VERIFY_QUEUE_LEASE", 60)
+VERIFY_QUEUE_MAX_ATTEMPTS = _AZ_IRANIAN_BANK_GATEWAYS.get("VERIFY_QUEUE_MAX_ATTEMPTS", 5)
+VERIFY_QUEUE_POLL_INTERVAL = _AZ_IRANIAN_BANK_GATEWAYS.get("VERIFY_QUEUE_POLL_INTERVAL", 1)
+CALLBACK_SINGLE_FLIGHT_ENABLE = _AZ_IRANIAN_BANK_GATEWAYS.get("CALLBACK_SINGLE_FLIGHT_ENABLE", False)
+CALLBACK_SINGLE_FLIGHT_CACHE = _AZ_IRANIAN_BANK_GATEWAYS.get("CALLBACK_SINGLE_FLIGHT_CACHE", "default")
+CALLBACK_SINGLE_FLIGHT_WAIT = _AZ_IRANIAN_BANK_GATEWAYS.get("CALLBACK_SINGLE_FLIGHT_WAIT", 30)
+CALLBACK_SINGLE_FLIGHT_RESULT_TTL = _AZ_IRANIAN_BANK_GATEWAYS.get("CALLBACK_SINGLE_FLIGHT_RESULT_TTL", 600)
+IS_DEFERRED_SETTLEMENT_ENABLE = _AZ_IRANIAN_BANK_GATEWAYS.get("IS_DEFERRED_SETTLEMENT_ENABLE", False)
+SETTLEMENT_BATCH_SIZE = _AZ_IRANIAN_BANK_GATEWAYS.get("SETTLEMENT_BATCH_SIZE", 100)
+SETTLEMENT_MAX_WORKERS = _AZ_IRANIAN_BANK_GATEWAYS.get("SETTLEMENT_MAX_WORKERS", 8)
+SETTLEMENT_MAX_ATTEMPTS = _AZ_IRANIAN_BANK_GATEWAYS.get("SETTLEMENT_MAX_ATTEMPTS", 5)
+SETTLEMENT_RETRY_DELAY = _AZ_IRANIAN_BANK_GATEWAYS.get("SETTLEMENT_RETRY_DELAY", 60)
+METRICS_ENABLE = _AZ_IRANIAN_BANK_GATEWAYS.get("METRICS_ENABLE", False)
+METRICS_PREFIX = _AZ_IRANIAN_BANK_GATEWAYS.get("METRICS_PREFIX", "azbankgateways_")
+METRICS_BUCKETS = tuple(
+    _AZ_IRANIAN_BANK_GATEWAYS.get(
+        "METRICS_BUCKETS", (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    )
+)
+METRICS_VIEW_TOKEN = _AZ_IRANIAN_BANK_GATEWAYS.get("METRICS_VIEW_TOKEN")
+SIMULATOR_URL = _AZ_IRANIAN_BANK_GATEWAYS.get("SIMULATOR_URL")
+SIMULATOR_LATENCY = _AZ_IRANIAN_BANK_GATEWAYS.get("SIMULATOR_LATENCY", 0)
+SIMULATOR_FAILURE_RATE = _AZ_IRANIAN_BANK_GATEWAYS.get("SIMULATOR_FAILURE_RATE", 0)
+SIMULATOR_REJECT_RATE = _AZ_IRANIAN_BANK_GATEWAYS.get("SIMULATOR_REJECT_RATE", 0)
+SIMULATOR_CANCEL_RATE = _AZ_IRANIAN_BANK_GATEWAYS.get("SIMULATOR_CANCEL_RATE", 0)
+SIMULATOR_REJECT_CODES = _AZ_IRANIAN_BANK_GATEWAYS.get("SIMULATOR_REJECT_CODES", {})
+SIMULATOR_CACHE = _AZ_IRANIAN_BANK_GATEWAYS.get("SIMULATOR_CACHE", "default")
+RETRY_MAX_ATTEMPTS = _AZ_IRANIAN_BANK_GATEWAYS.get("RETRY_MAX_ATTEMPTS", 3)
+RETRY_BACKOFF = _AZ_IRANIAN_BANK_GATEWAYS.get("RETRY_BACKOFF", 0.2)
+RETRY_BACKOFF_MAX = _AZ_IRANIAN_BANK_GATEWAYS.get("RETRY_BACKOFF_MAX", 2)
+AUTO_CREATE_BUDGET = _AZ_IRANIAN_BANK_GATEWAYS.get("AUTO_CREATE_BUDGET")
+VERIFY_BUDGET = _AZ_IRANIAN_BANK_GATEWAYS.get("VERIFY_BUDGET")
+RATE_LIMIT_WAIT = _AZ_IRANIAN_BANK_GATEWAYS.get("RATE_LIMIT_WAIT", 0.5)
+RATE_LIMIT_CACHE = _AZ_IRANIAN_BANK_GATEWAYS.get("RATE_LIMIT_CACHE", "default")
 CUSTOM_APP = _AZ_IRANIAN_BANK_GATEWAYS.get("CUSTOM_APP")
 if CUSTOM_APP:
     CALLBACK_NAMESPACE = f"{CUSTOM_APP}:{AZIranianBankGatewaysConfig.name}:callback"
@@ -2,11 +2,15 @@ from .exceptions import (  # noqa
     AmountDoesNotSupport,
     AZBankGatewaysException,
     BankGatewayConnectionError,
+    BankGatewayDeadlineExceeded,
+    BankGatewayRateLimited,
     BankGatewayRejectPayment,
     BankGatewayStateInvalid,
     BankGatewayTokenExpired,
+    BankGatewayUnavailable,
     BankGatewayUnclear,
     CurrencyDoesNotSupport,
     SafeSettingsEnabled,
     SettingDoesNotExist,
+    SettlementFileInvalid,
 )
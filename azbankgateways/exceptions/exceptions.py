@@ -18,6 +18,10 @@ class BankGatewayConnectionError(AZBankGatewaysException):
     """The requested gateway connection error"""
 
 
+class BankGatewayDeadlineExceeded(BankGatewayConnectionError):
+    """The deadline of the request is exceeded before the gateway call"""
+
+
 class BankGatewayRejectPayment(AZBankGatewaysException):
     """The requested bank reject payment"""
 
@@ -38,5 +42,17 @@ class BankGatewayAutoConnectionFailed(AZBankGatewaysException):
     """The auto connection cant find bank"""
 
 
+class BankGatewayUnavailable(AZBankGatewaysException):
+    """The requested gateway circuit is open after consecutive failures"""
+
+
+class BankGatewayRateLimited(BankGatewayUnavailable):
+    """The requested gateway is saturated by its rate or concurrency limit"""
+
+
+class SettlementFileInvalid(AZBankGatewaysException):
+    """The settlement file does not match the checkpoint of its reconciliation"""
+
+
 class SafeSettingsEnabled(AZBankGatewaysException):
     """This feature is disabled when the safe gateway is active"""
@@ -0,0 +1,75 @@
+import datetime
+import logging
+import time
+
+from django.db.models import Q
+from django.utils import timezone
+
+from azbankgateways import default_settings as settings
+from azbankgateways.models import Bank, PaymentStatus
+
+
+# the status of expired records, base on current status.
+EXPIRE_STATUSES = {
+    PaymentStatus.WAITING: PaymentStatus.EXPIRE_GATEWAY_TOKEN,
+    PaymentStatus.REDIRECT_TO_BANK: PaymentStatus.EXPIRE_GATEWAY_TOKEN,
+    PaymentStatus.RETURN_FROM_BANK: PaymentStatus.EXPIRE_VERIFY_PAYMENT,
+}
+
+
+def expire_records(
+    ttls: dict = None, batch_size: int = None, max_runtime: float = None, progress=None
+) -> dict:
+    """
+    رکورد هایی که بیش از TTL وضعیت خود (ثانیه) تغییری نداشته اند منقضی می شوند.
+
+    Records are read in keyset batches on (update_at, pk), which follows the (status, update_at) index, and
+    every batch is expired by one conditional UPDATE, so rows changed by a callback meanwhile are skipped and
+    only a batch of rows is locked at a time. The cutoffs are computed once at start, a stopped run can be
+    started again.
+
+    :param ttls: seconds, base on status, default EXPIRE_RECORDS_TTL.
+    :param max_runtime: seconds, no new batch is started after it.
+    :param progress: callable(status, expired_count) called after each batch.
+    :return
+    for example:
+    {
+        'expired': {'WAITING': 10, 'REDIRECT_TO_BANK': 120, 'RETURN_FROM_BANK': 3},
+        'is_finished': True,
+    }
+    """
+    ttls = {**settings.EXPIRE_RECORDS_TTL, **(ttls or {})}
+    batch_size = batch_size or settings.EXPIRE_RECORDS_BATCH_SIZE
+    started_at = time.monotonic()
+    now = timezone.now()
+    result = {"expired": {status: 0 for status in EXPIRE_STATUSES}, "is_finished": True}
+
+    for status, expire_status in EXPIRE_STATUSES.items():
+        if ttls.get(status) is None:
+            continue
+        cutoff = now - datetime.timedelta(seconds=ttls[status])
+        queryset = (
+            Bank.objects.active().filter(status=status, update_at__lt=cutoff).order_by("update_at", "pk")
+        )
+        last_key = None
+        while True:
+            if max_runtime is not None and time.monotonic() - started_at > max_runtime:
+                logging.info("Expire records stopped by max runtime.", extra={"expired": result["expired"]})
+                result["is_finished"] = False
+                return result
+            batch = queryset
+            if last_key:
+                batch = batch.filter(
+                    Q(update_at__gt=last_key[0]) | Q(update_at=last_key[0], pk__gt=last_key[1])
+                )
+            keys = list(batch.values_list("update_at", "pk")[:batch_size])
+            if not keys:
+                break
+            last_key = keys[-1]
+            count = Bank.objects.filter(
+                pk__in=[pk for _, pk in keys], status=status, update_at__lt=cutoff
+            ).transition(expire_status)
+            result["expired"][status] += count
+            if progress:
+                progress(status, result["expired"][status])
+    return result
@@ -0,0 +1,167 @@
+import logging
+import time
+
+from django.core.cache import caches
+
+from . import default_settings as settings
+
+
+class CircuitState:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class HealthRegistry:
+    """
+    Passive health registry and circuit breaker per (bank_type, identifier).
+
+    The outcome and latency of every call to a gateway is recorded in the Django cache, so all worker
+    processes share the same view of the gateways. After ``CIRCUIT_BREAKER_FAILURE_THRESHOLD``
+    consecutive failures the circuit opens and new payments fail fast without a network round trip.
+    After ``CIRCUIT_BREAKER_RECOVERY_TIMEOUT`` seconds the circuit is half open: one payment is let
+    through as a trial, its success closes the circuit and its failure opens it again.
+
+    Verifying a payment never consults the breaker, the user has already paid.
+    """
+
+    # weight of the latest call in the moving averages (EWMA) of latency and success rate.
+    smoothing = 0.2
+
+    @property
+    def cache(self):
+        return caches[settings.CIRCUIT_BREAKER_CACHE]
+
+    @staticmethod
+    def _key(bank_type, identifier, name):
+        return f"azbankgateways:health:{bank_type}:{identifier}:{name}"
+
+    def get_state(self, bank_type, identifier) -> str:
+        opened_at = self.cache.get(self._key(bank_type, identifier, "opened_at"))
+        return self._get_state(opened_at)
+
+    @staticmethod
+    def _get_state(opened_at) -> str:
+        if opened_at is None:
+            return CircuitState.CLOSED
+        if time.time() - opened_at < settings.CIRCUIT_BREAKER_RECOVERY_TIMEOUT:
+            return CircuitState.OPEN
+        return CircuitState.HALF_OPEN
+
+    def is_available(self, bank_type, identifier) -> bool:
+        """Without reserving the trial of a half open circuit."""
+        if not settings.CIRCUIT_BREAKER_ENABLE:
+            return True
+        return self.get_state(bank_type, identifier) != CircuitState.OPEN
+
+    def allow_request(self, bank_type, identifier) -> bool:
+        if not settings.CIRCUIT_BREAKER_ENABLE:
+            return True
+        state = self.get_state(bank_type, identifier)
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.OPEN:
+            return False
+        # only one trial in all processes, it is released if the trial hangs.
+        return self.cache.add(self._key(bank_type, identifier, "trial"), True, timeout=settings.BANK_TIMEOUT)
+
+    def record(self, bank_type, identifier, succeeded: bool, latency: float):
+        # stats are kept for routing even if the breaker is disabled.
+        self._update_stats(bank_type, identifier, succeeded, latency)
+        if not settings.CIRCUIT_BREAKER_ENABLE:
+            return
+        slow_call_threshold = settings.CIRCUIT_BREAKER_SLOW_CALL_THRESHOLD
+        if succeeded and slow_call_threshold and latency >= slow_call_threshold:
+            logging.debug("Slow gateway call", extra={"bank_type": bank_type, "latency": latency})
+            succeeded = False
+        if succeeded:
+            self._record_success(bank_type, identifier)
+        else:
+            self._record_failure(bank_type, identifier)
+
+    def _record_success(self, bank_type, identifier):
+        failures_key = self._key(bank_type, identifier, "failures")
+        opened_at_key = self._key(bank_type, identifier, "opened_at")
+        values = self.cache.get_many([failures_key, opened_at_key])
+        if values.get(opened_at_key) is not None:
+            logging.info("Close circuit of gateway", extra={"bank_type": bank_type, "identifier": identifier})
+        if values:
+            self.cache.delete_many([failures_key, opened_at_key, self._key(bank_type, identifier, "trial")])
+
+    def _record_failure(self, bank_type, identifier):
+        failures_key = self._key(bank_type, identifier, "failures")
+        self.cache.add(failures_key, 0, timeout=None)
+        try:
+            failures = self.cache.incr(failures_key)
+        except ValueError:
+            # expired or evicted between add and incr.
+            self.cache.set(failures_key, 1, timeout=None)
+            failures = 1
+
+        opened_at_key = self._key(bank_type, identifier, "opened_at")
+        state = self._get_state(self.cache.get(opened_at_key))
+        if state == CircuitState.HALF_OPEN or (
+            state == CircuitState.CLOSED and failures >= settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD
+        ):
+            logging.warning(
+                "Open circuit of gateway",
+                extra={"bank_type": bank_type, "identifier": identifier, "failures": failures},
+            )
+            self.cache.set(opened_at_key, time.time(), timeout=None)
+            self.cache.delete(self._key(bank_type, identifier, "trial"))
+
+    def _update_stats(self, bank_type, identifier, succeeded, latency):
+        key = self._key(bank_type, identifier, "stats")
+        stats = self.cache.get(key) or {"requests": 0, "failures": 0, "latency": latency, "success_rate": 1.0}
+        stats["requests"] += 1
+        if not succeeded:
+            stats["failures"] += 1
+        stats["latency"] += self.smoothing * (latency - stats["latency"])
+        stats["success_rate"] += self.smoothing * (int(succeeded) - stats.get("success_rate", 1.0))
+        stats["last_request_at"] = time.time()
+        self.cache.set(key, stats, timeout=None)
+
+    def stats(self, bank_type, identifier) -> dict:
+        """
+        :return
+        for example:
+        {
+            'state': 'closed',
+            'failures': 0,
+            'requests': 120,
+            'total_failures': 3,
+            'latency': 0.42,
+            'success_rate': 0.98,
+            'last_request_at': 1700000000.0,
+        }
+        """
+        return self.get_many_stats([bank_type], identifier)[bank_type]
+
+    def get_many_stats(self, bank_types: list, identifier) -> dict:
+        """stats of several gateways in one cache round trip, base on bank type."""
+        names = ("opened_at", "failures", "stats")
+        keys = {
+            bank_type: [self._key(bank_type, identifier, name) for name in names] for bank_type in bank_types
+        }
+        values = self.cache.get_many([key for bank_keys in keys.values() for key in bank_keys])
+        result = {}
+        for bank_type, (opened_at_key, failures_key, stats_key) in keys.items():
+            stats = values.get(stats_key) or {"requests": 0, "failures": 0, "latency": None}
+            result[bank_type] = {
+                "state": self._get_state(values.get(opened_at_key)),
+                "failures": values.get(failures_key, 0),
+                "requests": stats["requests"],
+                "total_failures": stats["failures"],
+                "latency": stats["latency"],
+                "success_rate": stats.get("success_rate"),
+                "last_request_at": stats.get("last_request_at"),
+            }
+        return result
+
+    def reset(self, bank_type, identifier):
+        self.cache.delete_many(
+            [self._key(bank_type, identifier, name) for name in ("opened_at", "failures", "trial", "stats")]
+        )
+
+
+health_registry = HealthRegistry()
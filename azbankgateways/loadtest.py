@@ -0,0 +1,240 @@
+import collections
+import logging
+import random
+import threading
+import time
+from urllib import parse
+
+from django.db import close_old_connections, connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from azbankgateways import default_settings as settings
+from azbankgateways.bankfactories import BankFactory
+from azbankgateways.models import Bank, PaymentStatus
+from azbankgateways.simulator.simulator import parse_post_form
+from azbankgateways.transports import session_pool
+from azbankgateways.views import callback_view
+
+
+PHASES = ["auto_create", "ready", "get_gateway", "gateway", "callback", "result"]
+
+
+class _PrioritiesReader:
+    """setting reader of the factory of a checkout, the priorities are the gateway mix of the load test."""
+
+    def __init__(self, reader, bank_types):
+        self._reader = reader
+        self._bank_types = bank_types
+
+    def get_bank_priorities(self, identifier):
+        return self._bank_types
+
+    def __getattr__(self, name):
+        return getattr(self._reader, name)
+
+
+class CheckoutFailed(Exception):
+    pass
+
+
+class LoadTest:
+    """
+    Virtual users that run the whole payment flow concurrently against the gateways of SIMULATOR_URL:
+    auto_create, ready, get_gateway, the payment page of the gateway, callback_view and the lookup of the
+    result by the tracking code of the client callback, the same way a shop does.
+
+    The latency and the queries of each phase are recorded separately. The payment page is served by the
+    simulator, its latency is reported but it is not a part of this app.
+
+    :param gateways: weight of each bank type, for example {"ZIBAL": 3, "MELLAT": 1}. Each checkout picks a
+    gateway by the weights and auto_create tries it first and the others of the mix after it.
+    :param host: host of the requests of the virtual users, it must be in ALLOWED_HOSTS.
+    """
+
+    def __init__(self, gateways, users=10, amount=20000, identifier="1", host="localhost"):
+        self.gateways = gateways
+        self.users = users
+        self.amount = amount
+        self.identifier = identifier
+        self.request_factory = RequestFactory(HTTP_HOST=host)
+        self._lock = threading.Lock()
+        self._latencies = collections.defaultdict(list)
+        self._queries = collections.defaultdict(int)
+        self._errors = collections.Counter()
+        self._statuses = collections.Counter()
+        self._pks = []
+        self._started = 0
+
+    def run(self, checkouts=None, duration=None, progress=None) -> dict:
+        """
+        :param checkouts: total number of checkouts of all users.
+        :param duration: seconds, no new checkout is started after it.
+        :return: report, see get_report
+        """
+        started_at = time.monotonic()
+        deadline = started_at + duration if duration else None
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=self._run_user, args=(checkouts, deadline, stop), daemon=True)
+            for _ in range(self.users)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1)
+                if progress:
+                    progress(self.get_report(time.monotonic() - started_at))
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        return self.get_report(time.monotonic() - started_at)
+
+    def _take_checkout(self, checkouts, deadline, stop) -> bool:
+        if stop.is_set() or (deadline and time.monotonic() >= deadline):
+            return False
+        with self._lock:
+            if checkouts is not None and self._started >= checkouts:
+                return False
+            self._started += 1
+        return True
+
+    def _run_user(self, checkouts, deadline, stop):
+        close_old_connections()
+        try:
+            while self._take_checkout(checkouts, deadline, stop):
+                self._checkout()
+        finally:
+            close_old_connections()
+
+    def _choose_gateways(self) -> list:
+        bank_types = list(self.gateways)
+        first = random.choices(bank_types, weights=[self.gateways[bank_type] for bank_type in bank_types])[0]
+        return [first] + [bank_type for bank_type in bank_types if bank_type != first]
+
+    def _phase(self, name, func, *args):
+        started_at = time.perf_counter()
+        try:
+            with CaptureQueriesContext(connection) as context:
+                return func(*args)
+        except Exception as e:
+            with self._lock:
+                self._errors[f"{name}: {type(e).__name__}"] += 1
+            raise CheckoutFailed() from e
+        finally:
+            elapsed = time.perf_counter() - started_at
+            with self._lock:
+                self._latencies[name].append(elapsed)
+                self._queries[name] += len(context.captured_queries)
+
+    def _checkout(self):
+        factory = BankFactory()
+        factory._secret_value_reader = _PrioritiesReader(
+            factory._secret_value_reader, self._choose_gateways()
+        )
+        request = self.request_factory.get("/checkout/")
+
+        def prepare_bank(bank):
+            bank.set_request(request)
+            bank.set_amount(self.amount)
+            bank.set_client_callback_url("/checkout/result/")
+
+        try:
+            bank = self._phase("auto_create", factory.auto_create, self.identifier, self.amount, prepare_bank)
+            bank_record = self._phase("ready", bank.ready)
+            with self._lock:
+                self._pks.append(bank_record.pk)
+            context = self._phase("get_gateway", bank.get_gateway)
+            callback_request = self._phase("gateway", self._pay_on_gateway, context)
+            response = self._phase("callback", callback_view, callback_request)
+            bank_record = self._phase("result", self._get_result, response["Location"])
+        except CheckoutFailed as e:
+            logging.debug("Load test checkout failed", exc_info=e.__cause__)
+            return
+        with self._lock:
+            self._statuses[bank_record.status] += 1
+
+    def _pay_on_gateway(self, context):
+        """the browser of the user on the payment page, :return: the callback request of the gateway."""
+        url, params, method = context["url"], context["params"], context["method"]
+        session = session_pool.get_session(url)
+        if method == "GET":
+            response = session.get(url, params=params, allow_redirects=False, timeout=settings.BANK_TIMEOUT)
+        else:
+            response = session.post(url, data=params, allow_redirects=False, timeout=settings.BANK_TIMEOUT)
+        if response.is_redirect:
+            return self._get_request("GET", response.headers["Location"])
+        response.raise_for_status()
+        callback_url, callback_params = parse_post_form(response.text)
+        return self._get_request("POST", callback_url, callback_params)
+
+    def _get_request(self, method, url, data=None):
+        url_parts = parse.urlsplit(url)
+        path = parse.urlunsplit(("", "", url_parts.path, url_parts.query, ""))
+        if method == "GET":
+            return self.request_factory.get(path)
+        return self.request_factory.post(path, data)
+
+    @staticmethod
+    def _get_result(url):
+        query = dict(parse.parse_qsl(parse.urlsplit(url).query))
+        return Bank.objects.get(tracking_code=query[settings.TRACKING_CODE_QUERY_PARAM])
+
+    @staticmethod
+    def _percentile(values, percent):
+        index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+        return values[index]
+
+    def get_report(self, elapsed) -> dict:
+        """
+        :return
+        for example:
+        {
+            'checkouts': 1000,
+            'succeeded': 990,
+            'throughput': 85.3,  # finished checkouts per second
+            'elapsed': 11.72,
+            'phases': {'ready': {'count': 1000, 'p50': 0.012, 'p95': 0.03, 'p99': 0.05, 'queries': 1.0}, ...},
+            'statuses': {'COMPLETE': 990, 'CANCEL_BY_USER': 5},
+            'errors': {'auto_create: BankGatewayAutoConnectionFailed': 5},
+        }
+        """
+        with self._lock:
+            latencies = {name: sorted(values) for name, values in self._latencies.items()}
+            queries = dict(self._queries)
+            statuses = dict(self._statuses)
+            errors = dict(self._errors)
+        phases = {}
+        for name in PHASES:
+            values = latencies.get(name)
+            if not values:
+                continue
+            phases[name] = {
+                "count": len(values),
+                "p50": self._percentile(values, 50),
+                "p95": self._percentile(values, 95),
+                "p99": self._percentile(values, 99),
+                "queries": queries.get(name, 0) / len(values),
+            }
+        finished = sum(statuses.values()) + sum(errors.values())
+        return {
+            "checkouts": finished,
+            "succeeded": sum(count for status, count in statuses.items() if status == PaymentStatus.COMPLETE),
+            "throughput": finished / elapsed if elapsed else 0,
+            "elapsed": elapsed,
+            "phases": phases,
+            "statuses": statuses,
+            "errors": errors,
+        }
+
+    def delete_records(self) -> int:
+        """delete the bank records of the checkouts."""
+        with self._lock:
+            pks = list(self._pks)
+        deleted = 0
+        for index in range(0, len(pks), 500):
+            deleted += Bank.objects.filter(pk__in=pks[index : index + 500]).delete()[0]
+        return deleted
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from azbankgateways.expiry import EXPIRE_STATUSES, expire_records
+
+
+class Command(BaseCommand):
+    help = "Expire stale WAITING, REDIRECT_TO_BANK and RETURN_FROM_BANK bank records in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, help="records of each UPDATE, default EXPIRE_RECORDS_BATCH_SIZE"
+        )
+        parser.add_argument("--max-runtime", type=float, help="seconds, no new batch is started after it")
+        parser.add_argument(
+            "--ttl",
+            action="append",
+            default=[],
+            metavar="STATUS=SECONDS",
+            help="override EXPIRE_RECORDS_TTL of a status, for example --ttl WAITING=600",
+        )
+
+    def handle(self, *args, **options):
+        result = expire_records(
+            ttls=self._parse_ttls(options["ttl"]),
+            batch_size=options["batch_size"],
+            max_runtime=options["max_runtime"],
+            progress=self._progress if options["verbosity"] > 1 else None,
+        )
+        for status, count in result["expired"].items():
+            self.stdout.write(f"{status}: {count} expired")
+        if result["is_finished"]:
+            self.stdout.write(self.style.SUCCESS("Expire records finished."))
+        else:
+            self.stdout.write(self.style.WARNING("Max runtime reached, run the command again to continue."))
+
+    def _progress(self, status, count):
+        self.stdout.write(f"{status}: {count} expired so far")
+
+    @staticmethod
+    def _parse_ttls(values):
+        ttls = {}
+        for value in values:
+            status, _, seconds = value.partition("=")
+            if status not in EXPIRE_STATUSES or not seconds.isdigit():
+                raise CommandError(
+                    f"Invalid ttl {value}, use STATUS=SECONDS with one of {list(EXPIRE_STATUSES)}."
+                )
+            ttls[status] = int(seconds)
+        return ttls
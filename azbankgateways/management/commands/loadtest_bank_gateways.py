@@ -0,0 +1,142 @@
+import json
+
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand, CommandError
+
+from azbankgateways import default_settings as settings
+from azbankgateways.bankfactories import BankFactory
+from azbankgateways.loadtest import LoadTest
+from azbankgateways.simulator.adapter import install_simulator_adapter
+from azbankgateways.simulator.simulator import GatewaySimulator
+
+
+IN_PROCESS_SIMULATOR_URL = "http://azbankgateways-simulator.invalid"
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent checkouts through auto_create, ready, get_gateway, callback_view and the result lookup "
+        "against the simulated gateways and report throughput, latency, queries and errors of each phase. "
+        "The bank records are written to the database of the project, run it on a test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+        parser.add_argument("--checkouts", type=int, help="total checkouts, default 100 without --duration")
+        parser.add_argument("--duration", type=float, help="seconds, no new checkout is started after it")
+        parser.add_argument(
+            "--gateways",
+            help="mix of the gateways as BANK_TYPE:weight, for example ZIBAL:3,MELLAT:1. "
+            "default BANK_PRIORITIES of the identifier with equal weights",
+        )
+        parser.add_argument("--amount", type=int, default=20000)
+        parser.add_argument("--identifier", default="1")
+        parser.add_argument("--host", help="host of the requests, default the first host of ALLOWED_HOSTS")
+        parser.add_argument(
+            "--simulator-url",
+            help="url of a running simulator (run_bank_simulator), default a simulator in this process",
+        )
+        parser.add_argument("--latency", help="seconds added to each gateway call, a number or min,max")
+        parser.add_argument(
+            "--failure-rate", type=float, help="ratio of gateway calls answered with HTTP 500"
+        )
+        parser.add_argument("--reject-rate", type=float, help="ratio of rejected token requests")
+        parser.add_argument("--cancel-rate", type=float, help="ratio of payments canceled by the user")
+        parser.add_argument("--keep-records", action="store_true", help="do not delete the bank records")
+        parser.add_argument("--json", action="store_true", help="write the report as json")
+
+    def handle(self, *args, **options):
+        gateways = self._get_gateways(options["gateways"], options["identifier"])
+        checkouts = options["checkouts"]
+        if checkouts is None and options["duration"] is None:
+            checkouts = 100
+        previous_simulator_url = settings.SIMULATOR_URL
+        # the load test never reaches the real gateways.
+        if options["simulator_url"]:
+            settings.SIMULATOR_URL = options["simulator_url"]
+        else:
+            settings.SIMULATOR_URL = IN_PROCESS_SIMULATOR_URL
+            install_simulator_adapter(
+                GatewaySimulator(
+                    latency=self._get_latency(options["latency"]),
+                    failure_rate=options["failure_rate"],
+                    reject_rate=options["reject_rate"],
+                    cancel_rate=options["cancel_rate"],
+                )
+            )
+        load_test = LoadTest(
+            gateways,
+            users=options["users"],
+            amount=options["amount"],
+            identifier=options["identifier"],
+            host=options["host"] or self._get_host(),
+        )
+        try:
+            report = load_test.run(
+                checkouts=checkouts,
+                duration=options["duration"],
+                progress=self._progress if options["verbosity"] > 1 else None,
+            )
+        finally:
+            settings.SIMULATOR_URL = previous_simulator_url
+            if not options["keep_records"]:
+                load_test.delete_records()
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._write_report(report)
+
+    @staticmethod
+    def _get_gateways(value, identifier) -> dict:
+        if not value:
+            bank_types = BankFactory()._secret_value_reader.get_bank_priorities(identifier)
+            return {bank_type: 1 for bank_type in bank_types}
+        gateways = {}
+        for item in value.split(","):
+            bank_type, _, weight = item.partition(":")
+            try:
+                gateways[bank_type.strip().upper()] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f"Invalid weight of {bank_type}: {weight}")
+        return gateways
+
+    @staticmethod
+    def _get_latency(value):
+        if not value:
+            return None
+        try:
+            latency = [float(item) for item in value.split(",")]
+        except ValueError:
+            raise CommandError(f"Invalid latency: {value}")
+        return tuple(latency) if len(latency) > 1 else latency[0]
+
+    @staticmethod
+    def _get_host():
+        for host in django_settings.ALLOWED_HOSTS:
+            if host != "*":
+                return host.lstrip(".")
+        return "localhost"
+
+    def _progress(self, report):
+        self.stdout.write(
+            f"checkouts: {report['checkouts']}, throughput: {report['throughput']:.1f}/s, "
+            f"errors: {sum(report['errors'].values())}"
+        )
+
+    def _write_report(self, report):
+        self.stdout.write(
+            f"checkouts: {report['checkouts']}, succeeded: {report['succeeded']}, "
+            f"elapsed: {report['elapsed']:.2f}s, throughput: {report['throughput']:.1f} checkouts/s"
+        )
+        self.stdout.write(
+            f"{'phase':<14}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}"
+        )
+        for name, phase in report["phases"].items():
+            self.stdout.write(
+                f"{name:<14}{phase['count']:>8}{phase['p50'] * 1000:>10.1f}{phase['p95'] * 1000:>10.1f}"
+                f"{phase['p99'] * 1000:>10.1f}{phase['queries']:>9.1f}"
+            )
+        for status, count in sorted(report["statuses"].items()):
+            self.stdout.write(f"{status}: {count}")
+        for error, count in sorted(report["errors"].items()):
+            self.stdout.write(self.style.WARNING(f"{error}: {count}"))
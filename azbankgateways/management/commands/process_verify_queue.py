@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from azbankgateways.verify_queue import process_verify_queue
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify the payments whose callback is deferred (IS_DEFERRED_VERIFY_ENABLE) from the database queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="default VERIFY_QUEUE_BATCH_SIZE")
+        parser.add_argument("--max-runtime", type=float, help="seconds, default run forever")
+        parser.add_argument("--once", action="store_true", help="stop when the queue is empty")
+
+    def handle(self, *args, **options):
+        result = process_verify_queue(
+            batch_size=options["batch_size"],
+            max_runtime=options["max_runtime"],
+            is_once=options["once"],
+            progress=self._progress if options["verbosity"] > 1 else None,
+        )
+        self._progress(result)
+
+    def _progress(self, result):
+        self.stdout.write(f"verified: {result['verified']}, failed: {result['failed']}")
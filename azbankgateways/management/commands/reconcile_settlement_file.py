@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from azbankgateways.exceptions import SettlementFileInvalid
+from azbankgateways.models import BankType
+from azbankgateways.reconciliation import SettlementReconciler
+
+
+class Command(BaseCommand):
+    help = "Reconcile a settlement file of a bank against the bank records, mismatches are written to a CSV report."
+
+    def add_arguments(self, parser):
+        parser.add_argument("bank_type", choices=BankType.values)
+        parser.add_argument(
+            "source", help="settlement file, its layout is RECONCILIATION_FORMATS of the bank"
+        )
+        parser.add_argument("--report", help="default SOURCE.mismatches.csv")
+        parser.add_argument("--batch-size", type=int, help="default RECONCILIATION_BATCH_SIZE")
+        parser.add_argument(
+            "--restart", action="store_true", help="ignore the checkpoint and the report of the previous run"
+        )
+
+    def handle(self, *args, **options):
+        reconciler = SettlementReconciler(
+            bank_type=options["bank_type"],
+            source=options["source"],
+            report=options["report"] or f"{options['source']}.mismatches.csv",
+            batch_size=options["batch_size"],
+        )
+        try:
+            counters = reconciler.run(
+                restart=options["restart"],
+                progress=self._progress if options["verbosity"] > 1 else None,
+            )
+        except (OSError, SettlementFileInvalid) as e:
+            raise CommandError(str(e))
+        for name, count in counters.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Reconciliation finished, report: {reconciler.report}"))
+
+    def _progress(self, counters):
+        self.stdout.write(f"{counters['lines']} lines reconciled")
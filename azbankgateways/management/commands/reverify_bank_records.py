@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from azbankgateways.reverify import ReverifyWorker
+
+
+class Command(BaseCommand):
+    help = "Verify the payments stuck in RETURN_FROM_BANK again, concurrently and in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="default REVERIFY_BATCH_SIZE")
+        parser.add_argument("--max-workers", type=int, help="default REVERIFY_MAX_WORKERS")
+        parser.add_argument(
+            "--max-concurrency-per-gateway", type=int, help="default REVERIFY_MAX_CONCURRENCY_PER_GATEWAY"
+        )
+        parser.add_argument("--max-attempts", type=int, help="default REVERIFY_MAX_ATTEMPTS")
+        parser.add_argument("--min-age", type=float, help="seconds, default REVERIFY_MIN_AGE")
+        parser.add_argument("--max-runtime", type=float, help="seconds, no new batch is started after it")
+        parser.add_argument(
+            "--bank-type", action="append", dest="bank_types", help="only records of this bank, repeatable"
+        )
+
+    def handle(self, *args, **options):
+        worker = ReverifyWorker(
+            batch_size=options["batch_size"],
+            max_workers=options["max_workers"],
+            max_concurrency_per_gateway=options["max_concurrency_per_gateway"],
+            max_attempts=options["max_attempts"],
+            min_age=options["min_age"],
+            bank_types=options["bank_types"],
+            progress=self._progress if options["verbosity"] > 1 else None,
+        )
+        result = worker.run(max_runtime=options["max_runtime"])
+        self._write_result(result)
+        if result["is_finished"]:
+            self.stdout.write(self.style.SUCCESS("Reverify finished."))
+        else:
+            self.stdout.write(self.style.WARNING("Max runtime reached, run the command again to continue."))
+
+    def _progress(self, result):
+        self._write_result(result)
+
+    def _write_result(self, result):
+        for status, count in result["verified"].items():
+            self.stdout.write(f"{status}: {count}")
+        self.stdout.write(
+            f"conflicts: {result['conflicts']}, failed: {result['failed']}, skipped: {result['skipped']}"
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from azbankgateways.simulator.server import add_arguments, serve
+
+
+class Command(BaseCommand):
+    help = "Run the local simulator of the gateways, point the drivers at it by SIMULATOR_URL."
+
+    def add_arguments(self, parser):
+        add_arguments(parser)
+
+    def handle(self, *args, **options):
+        serve(options, stdout=self.stdout)
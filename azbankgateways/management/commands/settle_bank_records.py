@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from azbankgateways.settlement import settle_records
+
+
+class Command(BaseCommand):
+    help = "Settle the verified payments whose settlement is pending, for example on a schedule."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="default SETTLEMENT_BATCH_SIZE")
+        parser.add_argument("--max-workers", type=int, help="default SETTLEMENT_MAX_WORKERS")
+        parser.add_argument("--max-attempts", type=int, help="default SETTLEMENT_MAX_ATTEMPTS")
+        parser.add_argument("--max-runtime", type=float, help="seconds, no new batch is started after it")
+
+    def handle(self, *args, **options):
+        result = settle_records(
+            batch_size=options["batch_size"],
+            max_workers=options["max_workers"],
+            max_attempts=options["max_attempts"],
+            max_runtime=options["max_runtime"],
+            progress=self._progress if options["verbosity"] > 1 else None,
+        )
+        self._progress(result)
+        if result["is_finished"]:
+            self.stdout.write(self.style.SUCCESS("Settlement finished."))
+        else:
+            self.stdout.write(self.style.WARNING("Max runtime reached, run the command again to continue."))
+
+    def _progress(self, result):
+        self.stdout.write(
+            f"settled: {result['settled']}, failed: {result['failed']}, retry: {result['retry']}"
+        )
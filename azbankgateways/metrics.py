@@ -0,0 +1,150 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from . import default_settings as settings
+from .exceptions import (
+    BankGatewayConnectionError,
+    BankGatewayDeadlineExceeded,
+    BankGatewayRateLimited,
+    BankGatewayRejectPayment,
+    BankGatewayStateInvalid,
+    BankGatewayUnavailable,
+)
+
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+def get_error_outcome(error: BaseException) -> str:
+    if isinstance(error, BankGatewayDeadlineExceeded):
+        return "deadline_exceeded"
+    if isinstance(error, requests.Timeout) or (httpx and isinstance(error, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(error, (requests.ConnectionError, BankGatewayConnectionError)) or (
+        httpx and isinstance(error, httpx.TransportError)
+    ):
+        return "connection_error"
+    if isinstance(error, BankGatewayRejectPayment):
+        return "rejected"
+    if isinstance(error, BankGatewayRateLimited):
+        return "rate_limited"
+    if isinstance(error, BankGatewayUnavailable):
+        return "unavailable"
+    if isinstance(error, BankGatewayStateInvalid):
+        return "state_invalid"
+    return "error"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+class Metrics:
+    """
+    In process metrics of the gateways: latency histograms, outcome counters and status transitions,
+    labelled by bank_type and bank_choose_identifier and exported in the Prometheus text format.
+
+    Each process keeps its own values, like the default registry of prometheus_client. When METRICS_ENABLE
+    is off nothing is recorded and the instrumented code only pays for one settings lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        # (name, labels): [count of each bucket, count, sum]
+        self._histograms = {}
+
+    @property
+    def is_enabled(self) -> bool:
+        return settings.METRICS_ENABLE
+
+    def inc(self, name, value=1, **labels):
+        if not settings.METRICS_ENABLE:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not settings.METRICS_ENABLE:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(settings.METRICS_BUCKETS, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(settings.METRICS_BUCKETS), 0, 0.0]
+            if index < len(histogram[0]):
+                histogram[0][index] += 1
+            histogram[1] += 1
+            histogram[2] += seconds
+
+    @contextmanager
+    def measure(self, name, **labels):
+        """
+        Record the latency of the block in {name}_seconds and its outcome in {name}_total. The outcome of an
+        exception is base on its type, otherwise it is ok or the value the block sets in the yielded dict.
+        """
+        result = {"outcome": "ok"}
+        if not settings.METRICS_ENABLE:
+            yield result
+            return
+        started_at = time.perf_counter()
+        try:
+            yield result
+        except BaseException as e:
+            result["outcome"] = get_error_outcome(e)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - started_at, **labels)
+            self.inc(f"{name}_total", outcome=result["outcome"], **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, [list(value[0]), value[1], value[2]]) for key, value in self._histograms.items()
+            )
+        prefix = settings.METRICS_PREFIX
+        lines = []
+        last_name = None
+        for (name, labels), value in counters:
+            if name != last_name:
+                lines.append(f"# TYPE {prefix}{name} counter")
+                last_name = name
+            lines.append(f"{prefix}{name}{_format_labels(labels)} {value}")
+        for (name, labels), (buckets, count, total) in histograms:
+            if name != last_name:
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                last_name = name
+            cumulative = 0
+            for bound, bucket_count in zip(settings.METRICS_BUCKETS, buckets):
+                cumulative += bucket_count
+                lines.append(f"{prefix}{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{prefix}{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{prefix}{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{prefix}{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:08
+
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """Build the index without locking the table for writes on PostgreSQL, a plain AddIndex elsewhere."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.add_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.remove_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.remove_index(model, self.index)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('azbankgateways', '0005_alter_bank_bank_type_alter_bank_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bank',
+            name='bank_type',
+            field=models.CharField(
+                choices=[
+                    ('BMI', 'BMI'),
+                    ('SEP', 'SEP'),
+                    ('ZARINPAL', 'Zarinpal'),
+                    ('IDPAY', 'IDPay'),
+                    ('ZIBAL', 'Zibal'),
+                    ('BAHAMTA', 'Bahamta'),
+                    ('MELLAT', 'Mellat'),
+                    ('PAYV1', 'PayV1'),
+                    ('IRANDARGAH', 'IranDargah'),
+                    ('ASANPARDAKHT', 'AsanPardakht'),
+                ],
+                max_length=50,
+                verbose_name='Bank',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='bank',
+            index=models.Index(fields=['tracking_code'], name='azbankgateways_tc_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='bank',
+            index=models.Index(fields=['bank_type', 'tracking_code'], name='azbankgateways_type_tc_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='bank',
+            index=models.Index(fields=['status', 'update_at'], name='azbankgateways_status_upd_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='bank',
+            index=models.Index(fields=['bank_choose_identifier'], name='azbankgateways_identifier_idx'),
+        ),
+    ]
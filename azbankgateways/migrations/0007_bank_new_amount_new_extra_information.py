@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    First step of changing amount to an integer and extra_information to JSON without rewriting the table:
+    add nullable columns, they are filled by 0008 and replace the old columns in 0009.
+    """
+
+    dependencies = [
+        ('azbankgateways', '0006_bank_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bank',
+            name='new_amount',
+            field=models.BigIntegerField(null=True, blank=True, verbose_name='Amount'),
+        ),
+        migrations.AddField(
+            model_name='bank',
+            name='new_extra_information',
+            field=models.JSONField(null=True, blank=True, verbose_name='Extra information'),
+        ),
+    ]
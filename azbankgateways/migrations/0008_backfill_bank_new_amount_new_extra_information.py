@@ -0,0 +1,121 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:10
+
+import json
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, transaction
+
+
+BATCH_SIZE = 1000
+
+
+# key of extra_information that keeps an amount which is not a number, restored by the reverse migration.
+LEGACY_AMOUNT_KEY = 'legacy_amount'
+
+
+def parse_amount(value):
+    """:return: the amount, None if it is not a number."""
+    try:
+        return int(Decimal(str(value).strip()))
+    except (InvalidOperation, ValueError, OverflowError):
+        return None
+
+
+def parse_extra_information(value):
+    """JSON of drivers, 'key=value, key=value' of SEP and BMI or {'raw': value} for anything else."""
+    if value is None or value == '':
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        pass
+    items = [item.strip() for item in value.split(',')]
+    if all('=' in item for item in items):
+        return dict(item.split('=', 1) for item in items)
+    return {'raw': value}
+
+
+def migrate_row(Bank, pk, amount, extra_information):
+    new_amount = parse_amount(amount)
+    new_extra_information = parse_extra_information(extra_information)
+    if new_amount is None:
+        logging.warning(
+            "Invalid bank amount, it is migrated as zero and kept in extra_information.",
+            extra={"pk": pk, "amount": amount},
+        )
+        if not isinstance(new_extra_information, dict):
+            new_extra_information = {} if new_extra_information is None else {'raw': extra_information}
+        new_extra_information = {**new_extra_information, LEGACY_AMOUNT_KEY: amount}
+        new_amount = 0
+    return Bank(pk=pk, new_amount=new_amount, new_extra_information=new_extra_information)
+
+
+def format_extra_information(value):
+    if value is None:
+        return None
+    if isinstance(value, dict) and list(value) == ['raw']:
+        return value['raw']
+    return json.dumps(value, ensure_ascii=False)
+
+
+def backfill(apps, schema_editor):
+    """
+    Keyset batches in their own transaction, rows with new_amount are already migrated so an interrupted run
+    continues where it stopped.
+    """
+    Bank = apps.get_model('azbankgateways', 'Bank')
+    db_alias = schema_editor.connection.alias
+    queryset = Bank.objects.using(db_alias).filter(new_amount__isnull=True).order_by('pk')
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(batch.values_list('pk', 'amount', 'extra_information')[:BATCH_SIZE])
+        if not rows:
+            break
+        banks = [migrate_row(Bank, pk, amount, extra) for pk, amount, extra in rows]
+        with transaction.atomic(using=db_alias):
+            Bank.objects.using(db_alias).bulk_update(banks, ['new_amount', 'new_extra_information'])
+        last_pk = rows[-1][0]
+
+
+def restore(apps, schema_editor):
+    """
+    Reverse of backfill run by 0009, the old text columns are written again from the new ones. Until 0009 the
+    previous version keeps writing the old columns, so reversing only this migration has nothing to restore.
+    """
+    Bank = apps.get_model('azbankgateways', 'Bank')
+    db_alias = schema_editor.connection.alias
+    queryset = Bank.objects.using(db_alias).order_by('pk')
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(batch.values_list('pk', 'new_amount', 'new_extra_information')[:BATCH_SIZE])
+        if not rows:
+            break
+        banks = []
+        for pk, amount, extra_information in rows:
+            amount = '' if amount is None else str(amount)
+            if isinstance(extra_information, dict) and LEGACY_AMOUNT_KEY in extra_information:
+                extra_information = dict(extra_information)
+                amount = extra_information.pop(LEGACY_AMOUNT_KEY)
+                extra_information = extra_information or None
+            banks.append(
+                Bank(pk=pk, amount=amount, extra_information=format_extra_information(extra_information))
+            )
+        with transaction.atomic(using=db_alias):
+            Bank.objects.using(db_alias).bulk_update(banks, ['amount', 'extra_information'])
+        last_pk = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+    # every batch is committed separately, a long transaction on a large table is not needed.
+    atomic = False
+
+    dependencies = [
+        ('azbankgateways', '0007_bank_new_amount_new_extra_information'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop, elidable=True),
+    ]
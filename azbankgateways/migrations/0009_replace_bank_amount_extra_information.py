@@ -0,0 +1,128 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:10
+
+import importlib
+
+from django.db import migrations, models
+
+
+backfill_migration = importlib.import_module(
+    'azbankgateways.migrations.0008_backfill_bank_new_amount_new_extra_information'
+)
+
+AMOUNT_NOT_NULL_CHECK = 'azbankgateways_bank_amount_not_null'
+
+
+def catch_up(apps, schema_editor):
+    """
+    Rows written by the previous version since 0008 are migrated in the transaction of the swap. On PostgreSQL
+    writes to the table wait (reads go on) until the swap is committed, so no row without new_amount is written
+    meanwhile, only the rows since 0008 are read.
+    """
+    Bank = apps.get_model('azbankgateways', 'Bank')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'LOCK TABLE {} IN SHARE ROW EXCLUSIVE MODE'.format(schema_editor.quote_name(Bank._meta.db_table))
+        )
+    backfill_migration.backfill(apps, schema_editor)
+
+
+def set_legacy_amount_not_null(apps, schema_editor):
+    """Reverse only, the text column is re-added nullable so it can be filled by restore first."""
+    Bank = apps.get_model('azbankgateways', 'Bank')
+    old_field = models.CharField(max_length=10, null=True, verbose_name='Amount')
+    old_field.set_attributes_from_name('amount')
+    old_field.model = Bank
+    new_field = models.CharField(max_length=10, verbose_name='Amount')
+    new_field.set_attributes_from_name('amount')
+    new_field.model = Bank
+    schema_editor.alter_field(Bank, old_field, new_field)
+
+
+def get_amount_field(Bank, null):
+    field = models.BigIntegerField(null=null, verbose_name='Amount')
+    field.set_attributes_from_name('amount')
+    field.model = Bank
+    return field
+
+
+def set_amount_not_null(apps, schema_editor):
+    Bank = apps.get_model('azbankgateways', 'Bank')
+    if schema_editor.connection.vendor == 'postgresql':
+        # enforced for the new rows at once, the existing rows are validated by 0012 without blocking writes.
+        schema_editor.execute(
+            'ALTER TABLE {} ADD CONSTRAINT {} CHECK (amount IS NOT NULL) NOT VALID'.format(
+                schema_editor.quote_name(Bank._meta.db_table), schema_editor.quote_name(AMOUNT_NOT_NULL_CHECK)
+            )
+        )
+        return
+    schema_editor.alter_field(Bank, get_amount_field(Bank, null=True), get_amount_field(Bank, null=False))
+
+
+def set_amount_null(apps, schema_editor):
+    Bank = apps.get_model('azbankgateways', 'Bank')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE {} DROP CONSTRAINT IF EXISTS {}'.format(
+                schema_editor.quote_name(Bank._meta.db_table), schema_editor.quote_name(AMOUNT_NOT_NULL_CHECK)
+            )
+        )
+        return
+    schema_editor.alter_field(Bank, get_amount_field(Bank, null=False), get_amount_field(Bank, null=True))
+
+
+class Migration(migrations.Migration):
+    """
+    Last step of 0007-0009, deploy it together with the version that reads the new columns: 0007 and 0008 run
+    while the previous version serves, then 0009 migrates the rows written since 0008 and swaps the columns.
+    """
+
+    dependencies = [
+        ('azbankgateways', '0008_backfill_bank_new_amount_new_extra_information'),
+    ]
+
+    operations = [
+        # the dropped text column is nullable only in the state, so the reverse re-adds it before restore fills it.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='bank',
+                    name='amount',
+                    field=models.CharField(max_length=10, null=True, verbose_name='Amount'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(migrations.RunPython.noop, set_legacy_amount_not_null),
+            ],
+        ),
+        migrations.RunPython(catch_up, backfill_migration.restore),
+        migrations.RemoveField(
+            model_name='bank',
+            name='amount',
+        ),
+        migrations.RemoveField(
+            model_name='bank',
+            name='extra_information',
+        ),
+        migrations.RenameField(
+            model_name='bank',
+            old_name='new_amount',
+            new_name='amount',
+        ),
+        migrations.RenameField(
+            model_name='bank',
+            old_name='new_extra_information',
+            new_name='extra_information',
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='bank',
+                    name='amount',
+                    field=models.BigIntegerField(verbose_name='Amount'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(set_amount_not_null, set_amount_null),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('azbankgateways', '0009_replace_bank_amount_extra_information'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bank',
+            name='callback_payload',
+            field=models.JSONField(blank=True, null=True, verbose_name='Callback payload'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:27
+
+import importlib
+
+from django.db import migrations, models
+
+
+index_migration = importlib.import_module('azbankgateways.migrations.0006_bank_indexes')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('azbankgateways', '0010_bank_callback_payload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bank',
+            name='settled_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Settled at'),
+        ),
+        migrations.AddField(
+            model_name='bank',
+            name='settlement_attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Settlement attempts'),
+        ),
+        migrations.AddField(
+            model_name='bank',
+            name='settlement_status',
+            field=models.CharField(
+                blank=True,
+                choices=[('PENDING', 'Pending'), ('SETTLED', 'Settled'), ('FAILED', 'Failed')],
+                max_length=50,
+                null=True,
+                verbose_name='Settlement status',
+            ),
+        ),
+        index_migration.AddIndexConcurrently(
+            model_name='bank',
+            index=models.Index(
+                fields=['settlement_status', 'update_at'], name='azbankgateways_settle_upd_idx'
+            ),
+        ),
+    ]
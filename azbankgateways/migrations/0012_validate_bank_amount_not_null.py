@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:20
+
+from django.db import migrations
+
+
+AMOUNT_NOT_NULL_CHECK = 'azbankgateways_bank_amount_not_null'
+
+
+def validate_amount_not_null(apps, schema_editor):
+    """
+    PostgreSQL only, the other databases made amount NOT NULL in 0009. VALIDATE scans the table without blocking
+    reads and writes, then SET NOT NULL uses the valid check instead of a scan under ACCESS EXCLUSIVE lock
+    (PostgreSQL 12+).
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(apps.get_model('azbankgateways', 'Bank')._meta.db_table)
+    check = schema_editor.quote_name(AMOUNT_NOT_NULL_CHECK)
+    schema_editor.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {check}')
+    schema_editor.execute(f'ALTER TABLE {table} ALTER COLUMN amount SET NOT NULL')
+    schema_editor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {check}')
+
+
+def unvalidate_amount_not_null(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(apps.get_model('azbankgateways', 'Bank')._meta.db_table)
+    check = schema_editor.quote_name(AMOUNT_NOT_NULL_CHECK)
+    schema_editor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {check} CHECK (amount IS NOT NULL) NOT VALID')
+    schema_editor.execute(f'ALTER TABLE {table} ALTER COLUMN amount DROP NOT NULL')
+
+
+class Migration(migrations.Migration):
+    # each statement is committed separately, the locks are not held together.
+    atomic = False
+
+    dependencies = [
+        ('azbankgateways', '0011_bank_settlement'),
+    ]
+
+    operations = [
+        migrations.RunPython(validate_amount_not_null, unvalidate_amount_not_null),
+    ]
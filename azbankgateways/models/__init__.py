@@ -1,2 +1,9 @@
 from .banks import Bank  # noqa
-from .enum import BankType, CurrencyEnum, PaymentStatus  # noqa
+from .enum import (  # noqa
+    FINAL_PAYMENT_STATUSES,
+    PAYMENT_STATUS_TRANSITIONS,
+    BankType,
+    CurrencyEnum,
+    PaymentStatus,
+    SettlementStatus,
+)
@@ -1,9 +1,8 @@
-import datetime
-
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from .enum import BankType, PaymentStatus
+from .enum import PAYMENT_STATUS_TRANSITIONS, BankType, PaymentStatus, SettlementStatus
 
 
 class BankQuerySet(models.QuerySet):
@@ -13,6 +12,24 @@ class BankQuerySet(models.QuerySet):
     def active(self):
         return self.filter()
 
+    def _get_transition_queryset(self, payment_status, fields):
+        fields = {**fields, "status": payment_status, "update_at": timezone.now()}
+        return self.filter(status__in=PAYMENT_STATUS_TRANSITIONS[payment_status]), fields
+
+    def transition(self, payment_status, **fields) -> int:
+        """
+        تغییر وضعیت با یک UPDATE شرطی (WHERE status IN ...) بدون قفل، فقط رکورد هایی که تغییر وضعیت آنها از وضعیت
+        فعلی مجاز است تغییر می کنند.
+
+        :return: number of changed records
+        """
+        queryset, fields = self._get_transition_queryset(payment_status, fields)
+        return queryset.update(**fields)
+
+    async def atransition(self, payment_status, **fields) -> int:
+        queryset, fields = self._get_transition_queryset(payment_status, fields)
+        return await queryset.aupdate(**fields)
+
 
 class BankManager(models.Manager):
     def get_queryset(self):
@@ -22,20 +39,11 @@ class BankManager(models.Manager):
         return self.get_queryset().active()
 
     def update_expire_records(self):
-        count = (
-            self.active()
-            .filter(
-                status=PaymentStatus.RETURN_FROM_BANK,
-                update_at__lte=datetime.datetime.now() - datetime.timedelta(minutes=15),
-            )
-            .update(status=PaymentStatus.EXPIRE_VERIFY_PAYMENT)
-        )
+        """برای کنترل اندازه دسته ها و زمان اجرا از azbankgateways.expiry.expire_records یا دستور
+        expire_bank_records استفاده کنید."""
+        from azbankgateways.expiry import expire_records
 
-        count = count + self.active().filter(
-            status=PaymentStatus.REDIRECT_TO_BANK,
-            update_at__lt=datetime.datetime.now() - datetime.timedelta(minutes=15),
-        ).update(status=PaymentStatus.EXPIRE_GATEWAY_TOKEN)
-        return count
+        return sum(expire_records()["expired"].values())
 
     def filter_return_from_bank(self):
         return self.active().filter(status=PaymentStatus.RETURN_FROM_BANK)
@@ -56,7 +64,7 @@ class Bank(models.Model):
     )
     # It's local and generate locally
     tracking_code = models.CharField(max_length=255, null=False, blank=False, verbose_name=_("Tracking code"))
-    amount = models.CharField(max_length=10, null=False, blank=False, verbose_name=_("Amount"))
+    amount = models.BigIntegerField(null=False, blank=False, verbose_name=_("Amount"))
     # Reference number return from bank
     reference_number = models.CharField(
         unique=True,
@@ -67,7 +75,19 @@ class Bank(models.Model):
     )
     response_result = models.TextField(null=True, blank=True, verbose_name=_("Bank result"))
     callback_url = models.TextField(null=False, blank=False, verbose_name=_("Callback url"))
-    extra_information = models.TextField(null=True, blank=True, verbose_name=_("Extra information"))
+    extra_information = models.JSONField(null=True, blank=True, verbose_name=_("Extra information"))
+    # request of the gateway callback, saved when its verification is deferred.
+    callback_payload = models.JSONField(null=True, blank=True, verbose_name=_("Callback payload"))
+    # only for gateways with a separate settlement request, null for others.
+    settlement_status = models.CharField(
+        max_length=50,
+        null=True,
+        blank=True,
+        choices=SettlementStatus.choices,
+        verbose_name=_("Settlement status"),
+    )
+    settlement_attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_("Settlement attempts"))
+    settled_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Settled at"))
     bank_choose_identifier = models.CharField(
         max_length=255, blank=True, null=True, verbose_name=_("Bank choose identifier")
     )
@@ -80,10 +100,47 @@ class Bank(models.Model):
     class Meta:
         verbose_name = _("Bank gateway")
         verbose_name_plural = _("Bank gateways")
+        indexes = [
+            models.Index(fields=["tracking_code"], name="azbankgateways_tc_idx"),
+            models.Index(fields=["bank_type", "tracking_code"], name="azbankgateways_type_tc_idx"),
+            models.Index(fields=["status", "update_at"], name="azbankgateways_status_upd_idx"),
+            models.Index(fields=["bank_choose_identifier"], name="azbankgateways_identifier_idx"),
+            models.Index(fields=["settlement_status", "update_at"], name="azbankgateways_settle_upd_idx"),
+        ]
 
     def __str__(self):
         return "{}-{}".format(self.pk, self.tracking_code)
 
+    def _get_transition_fields(self, update_fields):
+        return {name: getattr(self, name) for name in update_fields if name not in ["status", "update_at"]}
+
+    def _set_transition(self, payment_status, fields):
+        self.status = payment_status
+        self.update_at = fields["update_at"]
+
+    def transition(self, payment_status, update_fields=()) -> bool:
+        """
+        compare and swap the status of this record, the changed update_fields are saved in the same UPDATE.
+
+        :return: False if another process changed the status first or the transition is not legal.
+        """
+        queryset, fields = Bank.objects.filter(pk=self.pk)._get_transition_queryset(
+            payment_status, self._get_transition_fields(update_fields)
+        )
+        if not queryset.update(**fields):
+            return False
+        self._set_transition(payment_status, fields)
+        return True
+
+    async def atransition(self, payment_status, update_fields=()) -> bool:
+        queryset, fields = Bank.objects.filter(pk=self.pk)._get_transition_queryset(
+            payment_status, self._get_transition_fields(update_fields)
+        )
+        if not await queryset.aupdate(**fields):
+            return False
+        self._set_transition(payment_status, fields)
+        return True
+
     @property
     def is_success(self):
         return self.status == PaymentStatus.COMPLETE
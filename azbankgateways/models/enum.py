@@ -37,3 +37,30 @@ class PaymentStatus(models.TextChoices):
     EXPIRE_VERIFY_PAYMENT = "EXPIRE_VERIFY_PAYMENT", _("Expire verify payment")
     COMPLETE = "COMPLETE", _("Complete")
     ERROR = "ERROR", _("Unknown error acquired")
+
+
+class SettlementStatus(models.TextChoices):
+    PENDING = "PENDING", _("Pending")
+    SETTLED = "SETTLED", _("Settled")
+    FAILED = "FAILED", _("Failed")
+
+
+# legal transitions of the payment status, base on the new status: the statuses it can be reached from.
+# a record is created with WAITING status.
+PAYMENT_STATUS_TRANSITIONS = {
+    PaymentStatus.WAITING: [],
+    PaymentStatus.REDIRECT_TO_BANK: [PaymentStatus.WAITING, PaymentStatus.REDIRECT_TO_BANK],
+    PaymentStatus.EXPIRE_GATEWAY_TOKEN: [PaymentStatus.WAITING, PaymentStatus.REDIRECT_TO_BANK],
+    PaymentStatus.RETURN_FROM_BANK: [PaymentStatus.REDIRECT_TO_BANK],
+    PaymentStatus.EXPIRE_VERIFY_PAYMENT: [PaymentStatus.RETURN_FROM_BANK],
+    PaymentStatus.COMPLETE: [PaymentStatus.RETURN_FROM_BANK, PaymentStatus.EXPIRE_VERIFY_PAYMENT],
+    PaymentStatus.CANCEL_BY_USER: [PaymentStatus.RETURN_FROM_BANK, PaymentStatus.EXPIRE_VERIFY_PAYMENT],
+    PaymentStatus.ERROR: [PaymentStatus.RETURN_FROM_BANK, PaymentStatus.EXPIRE_VERIFY_PAYMENT],
+}
+
+# statuses that no transition leaves, the payment is finished.
+FINAL_PAYMENT_STATUSES = [
+    status
+    for status in PaymentStatus
+    if not any(status in sources for sources in PAYMENT_STATUS_TRANSITIONS.values())
+]
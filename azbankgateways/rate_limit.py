@@ -0,0 +1,93 @@
+import logging
+import random
+import time
+import uuid
+
+from django.core.cache import caches
+
+from . import default_settings as settings
+
+
+class RateLimiter:
+    """
+    Admission control of the calls to a gateway per (bank_type, identifier).
+
+    The counters are kept in the Django cache, so all worker processes share the limits of a gateway:
+
+    * ``RATE`` calls in each ``PERIOD`` seconds (default 1), a counter per window increased atomically by
+      ``cache.incr``.
+    * ``CONCURRENCY`` calls in flight, each call holds one of the ``CONCURRENCY`` slot keys (``cache.add``)
+      with a lease, the slot of a killed worker is free again after the lease. The value of the key is a token
+      of the call, a call that outlives its lease never releases the slot taken by another call.
+
+    A cache error never blocks a payment, the call is allowed.
+    """
+
+    # seconds between the attempts of a call that waits for the limiter.
+    poll_interval = 0.05
+
+    @property
+    def cache(self):
+        return caches[settings.RATE_LIMIT_CACHE]
+
+    @staticmethod
+    def _key(bank_type, identifier, name):
+        return f"azbankgateways:rate_limit:{bank_type}:{identifier}:{name}"
+
+    def acquire(self, bank_type, identifier, limits: dict, lease: int) -> tuple:
+        """
+        :param limits: RATE_LIMIT of the gateway settings, for example {"RATE": 10, "CONCURRENCY": 5}
+        :param lease: seconds the slot is held at most
+        :return: (is_allowed, slot), the slot (key, token) must be released after the call.
+        """
+        try:
+            slot = None
+            if limits.get("CONCURRENCY"):
+                slot = self._acquire_slot(bank_type, identifier, limits["CONCURRENCY"], lease)
+                if slot is None:
+                    return False, None
+            if limits.get("RATE") and not self._take_rate(
+                bank_type, identifier, limits["RATE"], limits.get("PERIOD", 1)
+            ):
+                self.release(slot)
+                return False, None
+            return True, slot
+        except Exception as e:
+            logging.exception(e)
+            return True, None
+
+    def release(self, slot):
+        if slot is None:
+            return
+        key, token = slot
+        try:
+            if self.cache.get(key) == token:
+                self.cache.delete(key)
+        except Exception as e:
+            logging.exception(e)
+
+    def _acquire_slot(self, bank_type, identifier, concurrency, lease):
+        # start from a random slot, a free slot is usually found by the first add.
+        first = random.randrange(concurrency)
+        token = uuid.uuid4().hex
+        for index in range(concurrency):
+            key = self._key(bank_type, identifier, f"slot:{(first + index) % concurrency}")
+            if self.cache.add(key, token, timeout=lease):
+                return key, token
+        return None
+
+    def _take_rate(self, bank_type, identifier, rate, period) -> bool:
+        window = int(time.time() // period)
+        key = self._key(bank_type, identifier, f"rate:{window}")
+        timeout = int(period) + 1
+        self.cache.add(key, 0, timeout=timeout)
+        try:
+            count = self.cache.incr(key)
+        except ValueError:
+            # expired or evicted between add and incr.
+            self.cache.set(key, 1, timeout=timeout)
+            count = 1
+        return count <= rate
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,345 @@
+import abc
+import array
+import csv
+import importlib
+import json
+import logging
+import mmap
+import os
+
+import six
+
+from azbankgateways import default_settings as settings
+from azbankgateways.exceptions import SettlementFileInvalid
+from azbankgateways.models import Bank, PaymentStatus
+
+
+class SettlementLineInvalid(ValueError):
+    pass
+
+
+@six.add_metaclass(abc.ABCMeta)
+class SettlementFormat:
+    """
+    Layout of the lines of a settlement file.
+
+    :param skip_lines: header lines at the start of the file.
+    :param success_values: values of the status field of settled payments. Without a status field every line
+    of the file is a settled payment.
+    :param amount_multiplier: amount of the file = amount of the bank record * amount_multiplier, for example
+    10 if the file is in Rial and the records in Toman.
+    """
+
+    def __init__(self, encoding="utf-8", skip_lines=0, success_values=("0",), amount_multiplier=1):
+        self.encoding = encoding
+        self.skip_lines = skip_lines
+        self.success_values = set(success_values)
+        self.amount_multiplier = amount_multiplier
+
+    @abc.abstractmethod
+    def get_fields(self, line: str) -> dict:
+        """:return: raw values of reference_number, tracking_code, amount and status, any of them may be missed."""
+        pass
+
+    def parse(self, line: bytes):
+        """:return: (reference_number, tracking_code, amount, is_success)"""
+        try:
+            fields = self.get_fields(line.decode(self.encoding).rstrip("\r"))
+            amount = int(fields["amount"].strip().replace(",", ""))
+        except (KeyError, IndexError, ValueError) as e:
+            raise SettlementLineInvalid(str(e))
+        reference_number = (fields.get("reference_number") or "").strip()
+        tracking_code = (fields.get("tracking_code") or "").strip()
+        if not reference_number and not tracking_code:
+            raise SettlementLineInvalid("reference number and tracking code are empty")
+        status = fields.get("status")
+        is_success = status is None or status.strip() in self.success_values
+        return reference_number, tracking_code, amount, is_success
+
+
+class CSVSettlementFormat(SettlementFormat):
+    """Columns are zero based indexes, records must not contain line breaks."""
+
+    def __init__(
+        self,
+        reference_number_column=0,
+        tracking_code_column=1,
+        amount_column=2,
+        status_column=None,
+        delimiter=",",
+        skip_lines=1,
+        **kwargs,
+    ):
+        super(CSVSettlementFormat, self).__init__(skip_lines=skip_lines, **kwargs)
+        self.columns = {
+            "reference_number": reference_number_column,
+            "tracking_code": tracking_code_column,
+            "amount": amount_column,
+            "status": status_column,
+        }
+        self.delimiter = delimiter
+
+    def get_fields(self, line: str) -> dict:
+        values = next(csv.reader([line], delimiter=self.delimiter))
+        return {name: values[column] for name, column in self.columns.items() if column is not None}
+
+
+class FixedWidthSettlementFormat(SettlementFormat):
+    """
+    :param fields: (start, end) of each field in characters, for example
+    {'reference_number': (0, 20), 'amount': (20, 35), 'status': (35, 37)}
+    """
+
+    def __init__(self, fields: dict, **kwargs):
+        super(FixedWidthSettlementFormat, self).__init__(**kwargs)
+        self.fields = fields
+
+    def get_fields(self, line: str) -> dict:
+        if len(line) < max(end for _, end in self.fields.values()):
+            raise SettlementLineInvalid(f"line is shorter than the layout: {len(line)} characters")
+        return {name: line[start:end] for name, (start, end) in self.fields.items()}
+
+
+def get_settlement_format(bank_type) -> SettlementFormat:
+    """base on RECONCILIATION_FORMATS, CSVSettlementFormat with default columns for other banks."""
+    config = settings.RECONCILIATION_FORMATS.get(bank_type)
+    if not config:
+        return CSVSettlementFormat()
+    package, attr = config["CLASS"].rsplit(".", 1)
+    return getattr(importlib.import_module(package), attr)(**config.get("OPTIONS", {}))
+
+
+def iter_lines(path, offset=0):
+    """(offset of the next line, line) of a file, read through mmap, the file is never loaded in memory."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            position = offset
+            while position < size:
+                end = mm.find(b"\n", position)
+                if end == -1:
+                    end = size
+                yield end + 1, mm[position:end]
+                position = end + 1
+
+
+class SettlementBatch:
+    """Parsed lines of a batch, numbers are kept in arrays instead of a python object per value."""
+
+    def __init__(self):
+        self.line_numbers = array.array("q")
+        self.reference_numbers = []
+        self.tracking_codes = []
+        self.amounts = array.array("q")
+        self.is_success = array.array("b")
+
+    def __len__(self):
+        return len(self.line_numbers)
+
+    def append(self, line_number, reference_number, tracking_code, amount, is_success):
+        self.line_numbers.append(line_number)
+        self.reference_numbers.append(reference_number)
+        self.tracking_codes.append(tracking_code)
+        self.amounts.append(amount)
+        self.is_success.append(is_success)
+
+
+class SettlementReconciler:
+    """
+    Reconcile a settlement file of a bank against the bank records.
+
+    The file is read line by line through mmap and parsed into compact batches. Each batch is joined with
+    the records by at most two indexed queries, on reference_number and on (bank_type, tracking_code) for
+    the lines without a matched reference number. Mismatches are appended to a CSV report as they are found:
+
+    - missing: the payment of the line has no record.
+    - amount_differs: the amount of the line is not the amount of the record.
+    - status_differs: the line is settled and the record is not COMPLETE, or the reverse.
+    - invalid: the line can not be parsed.
+
+    After each batch the offset in the file, the size of the report and the counters are saved in a
+    checkpoint file, so a stopped run continues from the last batch.
+    """
+
+    report_fields = [
+        "line",
+        "mismatch",
+        "reference_number",
+        "tracking_code",
+        "file_amount",
+        "bank_amount",
+        "file_status",
+        "bank_status",
+        "error",
+    ]
+
+    def __init__(
+        self,
+        bank_type,
+        source,
+        report,
+        settlement_format: SettlementFormat = None,
+        batch_size: int = None,
+        checkpoint=None,
+    ):
+        self.bank_type = bank_type
+        self.source = source
+        self.report = report
+        self.settlement_format = settlement_format or get_settlement_format(bank_type)
+        self.batch_size = batch_size or settings.RECONCILIATION_BATCH_SIZE
+        self.checkpoint = checkpoint or f"{report}.checkpoint"
+
+    def _get_source_signature(self):
+        stat = os.stat(self.source)
+        return {"source": os.path.abspath(self.source), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint):
+            return None
+        with open(self.checkpoint) as f:
+            checkpoint = json.load(f)
+        if checkpoint["signature"] != self._get_source_signature():
+            raise SettlementFileInvalid(
+                f"{self.source} is changed after checkpoint {self.checkpoint}, reconcile it again with restart."
+            )
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint):
+        tmp_path = f"{self.checkpoint}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint)
+
+    def run(self, restart: bool = False, progress=None) -> dict:
+        """
+        :param restart: ignore the checkpoint and the report of the previous run.
+        :param progress: callable(counters) called after each batch.
+        :return
+        for example:
+        {
+            'lines': 1000000,
+            'matched': 999990,
+            'missing': 4,
+            'amount_differs': 1,
+            'status_differs': 5,
+            'invalid': 0,
+        }
+        """
+        checkpoint = None if restart else self._load_checkpoint()
+        if checkpoint is None:
+            checkpoint = {
+                "signature": self._get_source_signature(),
+                "offset": 0,
+                "line_number": 0,
+                "report_size": 0,
+                "counters": {
+                    "lines": 0,
+                    "matched": 0,
+                    "missing": 0,
+                    "amount_differs": 0,
+                    "status_differs": 0,
+                    "invalid": 0,
+                },
+            }
+        else:
+            logging.info(
+                "Continue reconciliation from checkpoint", extra={"line_number": checkpoint["line_number"]}
+            )
+
+        with open(self.report, "a+", newline="") as report_file:
+            # rows written after the last checkpoint are written again.
+            report_file.truncate(checkpoint["report_size"])
+            writer = csv.writer(report_file)
+            if not checkpoint["report_size"]:
+                writer.writerow(self.report_fields)
+
+            batch = SettlementBatch()
+            line_number = checkpoint["line_number"]
+            for offset, line in iter_lines(self.source, checkpoint["offset"]):
+                line_number += 1
+                if line_number <= self.settlement_format.skip_lines or not line.strip():
+                    continue
+                checkpoint["counters"]["lines"] += 1
+                try:
+                    batch.append(line_number, *self.settlement_format.parse(line))
+                except SettlementLineInvalid as e:
+                    writer.writerow([line_number, "invalid", "", "", "", "", "", "", str(e)])
+                    checkpoint["counters"]["invalid"] += 1
+                if len(batch) >= self.batch_size:
+                    self._reconcile(batch, writer, checkpoint["counters"])
+                    self._commit(report_file, checkpoint, offset, line_number, progress)
+                    batch = SettlementBatch()
+            if len(batch):
+                self._reconcile(batch, writer, checkpoint["counters"])
+            self._commit(report_file, checkpoint, os.path.getsize(self.source), line_number, progress)
+        return checkpoint["counters"]
+
+    def _commit(self, report_file, checkpoint, offset, line_number, progress):
+        report_file.flush()
+        os.fsync(report_file.fileno())
+        checkpoint.update(offset=offset, line_number=line_number, report_size=report_file.tell())
+        self._save_checkpoint(checkpoint)
+        if progress:
+            progress(checkpoint["counters"])
+
+    def _get_bank_records(self, batch: SettlementBatch):
+        fields = ["reference_number", "tracking_code", "amount", "status"]
+        queryset = Bank.objects.filter(bank_type=self.bank_type)
+        by_reference_number = {}
+        reference_numbers = {value for value in batch.reference_numbers if value}
+        if reference_numbers:
+            for row in queryset.filter(reference_number__in=reference_numbers).values_list(*fields):
+                by_reference_number[row[0]] = row
+
+        by_tracking_code = {}
+        tracking_codes = {
+            tracking_code
+            for reference_number, tracking_code in zip(batch.reference_numbers, batch.tracking_codes)
+            if tracking_code and reference_number not in by_reference_number
+        }
+        if tracking_codes:
+            for row in queryset.filter(tracking_code__in=tracking_codes).values_list(*fields):
+                by_tracking_code[row[1]] = row
+        return by_reference_number, by_tracking_code
+
+    def _reconcile(self, batch: SettlementBatch, writer, counters):
+        by_reference_number, by_tracking_code = self._get_bank_records(batch)
+        multiplier = self.settlement_format.amount_multiplier
+        for index in range(len(batch)):
+            row = by_reference_number.get(batch.reference_numbers[index]) or by_tracking_code.get(
+                batch.tracking_codes[index]
+            )
+            if row is None:
+                self._write_mismatch(writer, "missing", batch, index)
+                counters["missing"] += 1
+                continue
+
+            _, _, bank_amount, bank_status = row
+            mismatches = []
+            if bank_amount * multiplier != batch.amounts[index]:
+                mismatches.append("amount_differs")
+            if bool(batch.is_success[index]) != (bank_status == PaymentStatus.COMPLETE):
+                mismatches.append("status_differs")
+            for mismatch in mismatches:
+                self._write_mismatch(writer, mismatch, batch, index, bank_amount, bank_status)
+                counters[mismatch] += 1
+            if not mismatches:
+                counters["matched"] += 1
+
+    @staticmethod
+    def _write_mismatch(writer, mismatch, batch, index, bank_amount="", bank_status=""):
+        writer.writerow(
+            [
+                batch.line_numbers[index],
+                mismatch,
+                batch.reference_numbers[index],
+                batch.tracking_codes[index],
+                batch.amounts[index],
+                bank_amount,
+                "settled" if batch.is_success[index] else "not_settled",
+                bank_status,
+                "",
+            ]
+        )
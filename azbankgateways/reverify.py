@@ -0,0 +1,196 @@
+import datetime
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from azbankgateways import default_settings as settings
+from azbankgateways.bankfactories import BankFactory
+from azbankgateways.exceptions import BankGatewayStateInvalid
+from azbankgateways.models import Bank, PaymentStatus
+
+
+class ReverifyWorker:
+    """
+    Verify the payments stuck in RETURN_FROM_BANK again, for example after an outage of a gateway.
+
+    Records are read in batches by pk (one SELECT per batch) and verified concurrently on a bounded thread
+    pool, at most ``max_concurrency_per_gateway`` calls at a time to each gateway. A failed verify is retried
+    up to ``max_attempts`` times with jittered backoff, and after ``gateway_failure_limit`` consecutive
+    failures of a gateway its remaining records are skipped in this run. The results of each batch are saved
+    by one conditional bulk UPDATE (WHERE status = RETURN_FROM_BANK), so a record verified meanwhile by its
+    callback is never overwritten.
+
+    Records that are not verified stay in RETURN_FROM_BANK for the next run or the expiry sweeper.
+    """
+
+    # seconds, backoff of the first retry, doubled for each next one.
+    retry_backoff = 0.5
+
+    def __init__(
+        self,
+        batch_size: int = None,
+        max_workers: int = None,
+        max_concurrency_per_gateway: int = None,
+        max_attempts: int = None,
+        gateway_failure_limit: int = None,
+        min_age: float = None,
+        bank_types: list = None,
+        progress=None,
+    ):
+        """
+        :param min_age: seconds, younger records may still be verified by their callback.
+        :param bank_types: only records of these banks, default all.
+        :param progress: callable(result) called after each batch.
+        """
+        self.batch_size = batch_size or settings.REVERIFY_BATCH_SIZE
+        self.max_workers = max_workers or settings.REVERIFY_MAX_WORKERS
+        self.max_concurrency_per_gateway = (
+            max_concurrency_per_gateway or settings.REVERIFY_MAX_CONCURRENCY_PER_GATEWAY
+        )
+        self.max_attempts = max_attempts or settings.REVERIFY_MAX_ATTEMPTS
+        self.gateway_failure_limit = gateway_failure_limit or settings.REVERIFY_GATEWAY_FAILURE_LIMIT
+        self.min_age = settings.REVERIFY_MIN_AGE if min_age is None else min_age
+        self.bank_types = bank_types
+        self.progress = progress
+        self._factory = BankFactory()
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._gateway_failures = {}
+
+    def get_queryset(self):
+        # the records of the deferred verify queue are left to it until it gives up on them.
+        queryset = Bank.objects.filter_return_from_bank().filter(
+            Q(callback_payload__isnull=True)
+            | Q(callback_payload__attempts__gte=settings.VERIFY_QUEUE_MAX_ATTEMPTS),
+            update_at__lt=timezone.now() - datetime.timedelta(seconds=self.min_age),
+        )
+        if self.bank_types:
+            queryset = queryset.filter(bank_type__in=self.bank_types)
+        return queryset.order_by("pk")
+
+    def run(self, max_runtime: float = None) -> dict:
+        """
+        :param max_runtime: seconds, no new batch is started after it.
+        :return: verified is base on the result of gateways, conflicts are the records changed meanwhile (for
+        example by their callback) that are not saved.
+        for example:
+        {
+            'verified': {'COMPLETE': 950, 'CANCEL_BY_USER': 30, 'ERROR': 2},
+            'conflicts': 1,
+            'failed': 12,
+            'skipped': 0,
+            'is_finished': True,
+        }
+        """
+        started_at = time.monotonic()
+        queryset = self.get_queryset()
+        result = {"verified": {}, "conflicts": 0, "failed": 0, "skipped": 0, "is_finished": True}
+        last_pk = None
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="azbankgateways-reverify"
+        ) as executor:
+            while True:
+                if max_runtime is not None and time.monotonic() - started_at > max_runtime:
+                    logging.info("Reverify stopped by max runtime.", extra={"result": result})
+                    result["is_finished"] = False
+                    break
+                batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+                records = list(batch[: self.batch_size])
+                if not records:
+                    break
+                last_pk = records[-1].pk
+                outcomes = list(executor.map(self._verify_in_thread, records))
+                self._save(records, outcomes, result)
+                if self.progress:
+                    self.progress(result)
+        return result
+
+    def _save(self, records, outcomes, result):
+        verified_records = []
+        update_fields = set()
+        for record, outcome in zip(records, outcomes):
+            if outcome in ("failed", "skipped", "conflicts"):
+                result[outcome] += 1
+                continue
+            verified_records.append(record)
+            update_fields |= outcome
+        if not verified_records:
+            return
+
+        count = Bank.objects.filter(status=PaymentStatus.RETURN_FROM_BANK).bulk_update(
+            verified_records, fields=sorted(update_fields)
+        )
+        if count is None:
+            # Django < 4.0 does not return the count.
+            count = len(verified_records)
+        result["conflicts"] += len(verified_records) - count
+        for record in verified_records:
+            result["verified"][record.status] = result["verified"].get(record.status, 0) + 1
+
+    def _get_semaphore(self, bank_type) -> threading.BoundedSemaphore:
+        with self._lock:
+            if bank_type not in self._semaphores:
+                self._semaphores[bank_type] = threading.BoundedSemaphore(self.max_concurrency_per_gateway)
+            return self._semaphores[bank_type]
+
+    def _is_gateway_exhausted(self, bank_type) -> bool:
+        return self._gateway_failures.get(bank_type, 0) >= self.gateway_failure_limit
+
+    def _record_gateway_outcome(self, bank_type, succeeded):
+        with self._lock:
+            failures = 0 if succeeded else self._gateway_failures.get(bank_type, 0) + 1
+            self._gateway_failures[bank_type] = failures
+        if failures == self.gateway_failure_limit:
+            logging.warning(
+                "Reverify gateway failure limit reached, skip its remaining records.",
+                extra={"bank_type": bank_type},
+            )
+
+    def _verify_in_thread(self, record):
+        close_old_connections()
+        try:
+            return self._verify(record)
+        finally:
+            close_old_connections()
+
+    def _verify(self, record):
+        """:return: changed fields of the record, or failed, skipped or conflicts."""
+        semaphore = self._get_semaphore(record.bank_type)
+        for attempt in range(1, self.max_attempts + 1):
+            if self._is_gateway_exhausted(record.bank_type):
+                return "skipped"
+            try:
+                with semaphore:
+                    bank = self._factory.create(
+                        bank_type=record.bank_type, identifier=record.bank_choose_identifier
+                    )
+                    update_fields = bank.verify_record(record)
+            except BankGatewayStateInvalid as e:
+                logging.debug(str(e))
+                return "conflicts"
+            except Exception as e:
+                logging.debug(
+                    "Reverify failed",
+                    extra={
+                        "pk": record.pk,
+                        "bank_type": record.bank_type,
+                        "attempt": attempt,
+                        "error": str(e),
+                    },
+                )
+                self._record_gateway_outcome(record.bank_type, False)
+                # the record may be changed by the failed attempt.
+                record.status = PaymentStatus.RETURN_FROM_BANK
+                if attempt < self.max_attempts:
+                    time.sleep(random.uniform(0, self.retry_backoff * 2 ** (attempt - 1)))
+                continue
+            self._record_gateway_outcome(record.bank_type, True)
+            return update_fields
+        logging.warning("Reverify attempts exhausted", extra={"pk": record.pk, "bank_type": record.bank_type})
+        return "failed"
@@ -0,0 +1,87 @@
+import abc
+import logging
+import time
+
+import six
+
+from azbankgateways import default_settings as settings
+from azbankgateways.health import health_registry
+
+
+@six.add_metaclass(abc.ABCMeta)
+class RoutingPolicy:
+    @abc.abstractmethod
+    def order(self, bank_list: list, identifier: str) -> list:
+        """
+        :param bank_list: priorities of reader, for example ['BMI', 'SEP', 'ZIBAL']
+        :param identifier:
+        :return: the banks in the order auto_create tries them
+        """
+        pass
+
+
+class StaticRoutingPolicy(RoutingPolicy):
+    """Use BANK_PRIORITIES as is."""
+
+    def order(self, bank_list: list, identifier: str) -> list:
+        return list(bank_list)
+
+
+class LatencyRoutingPolicy(RoutingPolicy):
+    """
+    Reorder the priorities by the expected time of a successful call to each gateway, EWMA latency divided
+    by EWMA success rate of the health registry.
+
+    - a gateway never moves more than ROUTING_MAX_SHIFT positions ahead of its priority.
+    - gateways with less than ROUTING_MIN_SAMPLES calls or without call in the last ROUTING_STATS_MAX_AGE
+      seconds keep their priority, so they get traffic and samples.
+    - a gateway is preferred to a higher priority one only if it is faster than it by ROUTING_TOLERANCE
+      (ratio), so close gateways do not flap.
+    """
+
+    def order(self, bank_list: list, identifier: str) -> list:
+        if len(bank_list) < 2:
+            return list(bank_list)
+        try:
+            stats = health_registry.get_many_stats(bank_list, identifier)
+        except Exception as e:
+            logging.exception(e)
+            return list(bank_list)
+
+        scores = {bank_type: self.get_score(stats[bank_type]) for bank_type in bank_list}
+        remaining = list(bank_list)
+        result = []
+        for position in range(len(bank_list)):
+            candidates = [
+                bank_type
+                for bank_type in remaining
+                if bank_list.index(bank_type) - settings.ROUTING_MAX_SHIFT <= position
+            ]
+            known_scores = [scores[bank_type] for bank_type in candidates if scores[bank_type] is not None]
+            best_score = min(known_scores) if known_scores else 0
+            # candidates keep the priority order, take the first one which is unknown or close enough to the best.
+            chosen = next(
+                bank_type
+                for bank_type in candidates
+                if scores[bank_type] is None
+                or scores[bank_type] <= best_score * (1 + settings.ROUTING_TOLERANCE)
+            )
+            result.append(chosen)
+            remaining.remove(chosen)
+
+        if result != bank_list:
+            logging.debug("Reorder bank priorities", extra={"priorities": result, "scores": scores})
+        return result
+
+    @staticmethod
+    def get_score(stats: dict):
+        """expected seconds to a successful call, None for unknown gateways."""
+        if stats["requests"] < settings.ROUTING_MIN_SAMPLES or stats["latency"] is None:
+            return None
+        if (
+            stats["last_request_at"] is None
+            or time.time() - stats["last_request_at"] > settings.ROUTING_STATS_MAX_AGE
+        ):
+            return None
+        success_rate = stats["success_rate"] if stats["success_rate"] is not None else 1.0
+        return stats["latency"] / max(success_rate, 0.01)
@@ -0,0 +1,109 @@
+import datetime
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from azbankgateways import default_settings as settings
+from azbankgateways.bankfactories import BankFactory
+from azbankgateways.models import Bank, PaymentStatus, SettlementStatus
+
+
+def _settle_in_thread(factory, record) -> bool:
+    close_old_connections()
+    try:
+        bank = factory.create(bank_type=record.bank_type, identifier=record.bank_choose_identifier)
+        return bank.settle_record(record)
+    except Exception as e:
+        logging.debug(
+            "Settle failed", extra={"pk": record.pk, "bank_type": record.bank_type, "error": str(e)}
+        )
+        return False
+    finally:
+        close_old_connections()
+
+
+def _claim(batch_size, max_attempts) -> list:
+    """
+    Claim a batch by one UPDATE of update_at and settlement_attempts, which also delays the next attempt of a
+    failed settlement, the first attempt is not delayed. The claimed records are read back by the claim time, a
+    concurrent worker never claims the same records.
+    """
+    now = timezone.now()
+    queryset = Bank.objects.filter(
+        Q(settlement_attempts=0)
+        | Q(update_at__lt=now - datetime.timedelta(seconds=settings.SETTLEMENT_RETRY_DELAY)),
+        status=PaymentStatus.COMPLETE,
+        settlement_status=SettlementStatus.PENDING,
+        settlement_attempts__lt=max_attempts,
+    )
+    pks = list(queryset.order_by("update_at").values_list("pk", flat=True)[:batch_size])
+    if not pks:
+        return []
+    queryset.filter(pk__in=pks).update(update_at=now, settlement_attempts=F("settlement_attempts") + 1)
+    return list(Bank.objects.filter(pk__in=pks, update_at=now, settlement_status=SettlementStatus.PENDING))
+
+
+def settle_records(
+    batch_size: int = None,
+    max_workers: int = None,
+    max_attempts: int = None,
+    max_runtime: float = None,
+    progress=None,
+) -> dict:
+    """
+    تسویه پرداخت هایی که تسویه آنها به تعویق افتاده (IS_DEFERRED_SETTLEMENT_ENABLE) یا ناموفق بوده است.
+
+    Records are claimed in batches and settled concurrently on a thread pool, the result of each batch is
+    saved by at most two UPDATEs. A failed settlement is retried after SETTLEMENT_RETRY_DELAY seconds and the
+    records that fail max_attempts times are FAILED.
+
+    :param max_runtime: seconds, no new batch is started after it.
+    :return
+    for example:
+    {
+        'settled': 120,
+        'failed': 1,
+        'retry': 3,
+        'is_finished': True,
+    }
+    """
+    batch_size = batch_size or settings.SETTLEMENT_BATCH_SIZE
+    max_attempts = max_attempts or settings.SETTLEMENT_MAX_ATTEMPTS
+    started_at = time.monotonic()
+    factory = BankFactory()
+    result = {"settled": 0, "failed": 0, "retry": 0, "is_finished": True}
+    with ThreadPoolExecutor(
+        max_workers=max_workers or settings.SETTLEMENT_MAX_WORKERS, thread_name_prefix="azbankgateways-settle"
+    ) as executor:
+        while True:
+            if max_runtime is not None and time.monotonic() - started_at > max_runtime:
+                result["is_finished"] = False
+                break
+            records = _claim(batch_size, max_attempts)
+            if not records:
+                break
+            outcomes = list(executor.map(lambda record: _settle_in_thread(factory, record), records))
+            settled_pks = [record.pk for record, is_settled in zip(records, outcomes) if is_settled]
+            failed_pks = [
+                record.pk
+                for record, is_settled in zip(records, outcomes)
+                if not is_settled and record.settlement_attempts >= max_attempts
+            ]
+            pending = Bank.objects.filter(settlement_status=SettlementStatus.PENDING)
+            if settled_pks:
+                pending.filter(pk__in=settled_pks).update(
+                    settlement_status=SettlementStatus.SETTLED, settled_at=timezone.now()
+                )
+            if failed_pks:
+                logging.warning("Settlement attempts exhausted", extra={"pks": failed_pks})
+                pending.filter(pk__in=failed_pks).update(settlement_status=SettlementStatus.FAILED)
+            result["settled"] += len(settled_pks)
+            result["failed"] += len(failed_pks)
+            result["retry"] += len(records) - len(settled_pks) - len(failed_pks)
+            if progress:
+                progress(result)
+    return result
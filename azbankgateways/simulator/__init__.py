@@ -0,0 +1,6 @@
+"""
+Local simulator of the gateways for tests and load tests, see GatewaySimulator.
+
+- mounted in a Django project: path("bank-simulator/", simulator_urls()) of azbankgateways.simulator.urls
+- standalone: python -m azbankgateways.simulator --port 8800 or manage.py run_bank_simulator
+"""
@@ -0,0 +1,14 @@
+"""python -m azbankgateways.simulator, the standalone simulator without a Django project."""
+
+import django
+from django.conf import settings
+
+
+if not settings.configured:
+    settings.configure(INSTALLED_APPS=["azbankgateways"])
+    django.setup()
+
+from azbankgateways.simulator.server import main  # noqa: E402
+
+
+main()
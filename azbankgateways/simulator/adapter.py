@@ -0,0 +1,67 @@
+from urllib import parse
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from azbankgateways import default_settings as settings
+from azbankgateways.banks.mellat import MELLAT_WSDL, Mellat
+from azbankgateways.transports import session_pool
+
+from .simulator import GatewaySimulator, SimulatorRequest
+
+
+class SimulatorAdapter(BaseAdapter):
+    """
+    requests transport adapter that answers from a GatewaySimulator in the same process, without a socket.
+    Mounted on the sessions of the drivers by install_simulator_adapter, for benchmarks and tests.
+    """
+
+    def __init__(self, simulator: GatewaySimulator, base_url):
+        super(SimulatorAdapter, self).__init__()
+        self.simulator = simulator
+        self.base_url = base_url.rstrip("/")
+
+    def send(self, request, **kwargs):
+        url_parts = parse.urlsplit(request.url)
+        bank, _, path = url_parts.path[len(parse.urlsplit(self.base_url).path) :].lstrip("/").partition("/")
+        body = request.body or b""
+        simulator_request = SimulatorRequest(
+            method=request.method,
+            path=path,
+            query=dict(parse.parse_qsl(url_parts.query)),
+            body=body.encode("utf-8") if isinstance(body, str) else body,
+            content_type=request.headers.get("Content-Type", ""),
+            base_url=f"{self.base_url}/{bank}",
+        )
+        simulator_response = self.simulator.handle(bank, simulator_request)
+        response = requests.Response()
+        response.status_code = simulator_response.status
+        response._content = simulator_response.body
+        response.headers = CaseInsensitiveDict(
+            {"Content-Type": simulator_response.content_type, **simulator_response.headers}
+        )
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def install_simulator_adapter(simulator: GatewaySimulator = None) -> GatewaySimulator:
+    """
+    Answer the requests of the drivers to SIMULATOR_URL in process: the adapter is mounted on the shared
+    session of session_pool and on the sessions of the Mellat SOAP clients created so far.
+    """
+    if not settings.SIMULATOR_URL:
+        raise ValueError("SIMULATOR_URL is not set")
+    simulator = simulator or GatewaySimulator()
+    prefix = settings.SIMULATOR_URL.rstrip("/") + "/"
+    adapter = SimulatorAdapter(simulator, settings.SIMULATOR_URL)
+    session_pool.get_session(settings.SIMULATOR_URL).mount(prefix, adapter)
+    Mellat._get_cached_client(MELLAT_WSDL, settings.BANK_TIMEOUT)
+    for client in Mellat._clients.values():
+        client.transport.session.mount(prefix, adapter)
+    return simulator
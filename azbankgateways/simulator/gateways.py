@@ -0,0 +1,665 @@
+import abc
+import functools
+import re
+import secrets
+import time
+import uuid
+import xml.etree.ElementTree as ElementTree
+
+import six
+
+from azbankgateways.models import BankType
+from azbankgateways.utils import append_querystring
+
+from .simulator import SimulatorResponse
+
+
+class PaymentState:
+    CREATED = "created"
+    PAID = "paid"
+    CANCELED = "canceled"
+
+
+@six.add_metaclass(abc.ABCMeta)
+class SimulatedGateway:
+    """Protocol of a gateway in the simulator, the paths are the paths of the real gateway."""
+
+    bank_type = None
+    reject_code = None
+
+    def __init__(self, simulator, reject_code=None):
+        self.simulator = simulator
+        self.reject_code = reject_code if reject_code is not None else self.reject_code
+
+    @abc.abstractmethod
+    def get_routes(self) -> list:
+        """:return: list of (method, path regex, handler, is_api), groups of the regex are passed to handler."""
+        pass
+
+    def route(self, request):
+        for method, pattern, handler, is_api in self.get_routes():
+            match = re.fullmatch(pattern, request.path)
+            if match and method == request.method:
+                return functools.partial(handler, **match.groupdict()), is_api
+        return None, False
+
+    """
+    payments
+    """
+
+    @staticmethod
+    def new_token() -> str:
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def new_number() -> int:
+        return secrets.randbelow(10**12) + 10**12
+
+    def _key(self, name):
+        return f"{self.bank_type}:{name}"
+
+    def create_payment(self, token, order_id, amount, callback_url, **extra) -> dict:
+        payment = {
+            "token": str(token),
+            "order_id": str(order_id),
+            "amount": int(amount or 0),
+            "callback_url": callback_url,
+            "state": PaymentState.CREATED,
+            "reference_id": str(self.new_number()),
+            "extra": extra,
+        }
+        self.save_payment(payment)
+        self.simulator.store.set(self._key(f"order:{order_id}"), str(token))
+        return payment
+
+    def save_payment(self, payment):
+        self.simulator.store.set(self._key(f"token:{payment['token']}"), payment)
+
+    def get_payment(self, token):
+        if token is None:
+            return None
+        return self.simulator.store.get(self._key(f"token:{token}"))
+
+    def get_payment_by_order(self, order_id):
+        return self.get_payment(self.simulator.store.get(self._key(f"order:{order_id}")))
+
+    def pay(self, token):
+        """the user pays (or cancels) on the payment page."""
+        payment = self.get_payment(token)
+        if payment is None or payment["state"] != PaymentState.CREATED:
+            return payment
+        payment["state"] = PaymentState.CANCELED if self.simulator.is_canceled() else PaymentState.PAID
+        self.save_payment(payment)
+        return payment
+
+    @staticmethod
+    def is_paid(payment) -> bool:
+        return payment is not None and payment["state"] == PaymentState.PAID
+
+    @staticmethod
+    def not_found(message="payment not found"):
+        return SimulatorResponse.json({"error": message}, status=404)
+
+
+class SEPGateway(SimulatedGateway):
+    bank_type = BankType.SEP
+    reject_code = -1
+
+    def get_routes(self):
+        return [
+            ("POST", r"/onlinepg/onlinepg", self.token, True),
+            ("POST", r"/OnlinePG/OnlinePG", self.payment_page, False),
+            ("POST", r"/verifyTxnRandomSessionkey/ipg/VerifyTransaction", self.verify, True),
+        ]
+
+    def token(self, request):
+        data = request.json
+        if self.simulator.is_rejected():
+            return SimulatorResponse.json(
+                {"status": self.reject_code, "errorCode": 5, "errorDesc": "rejected"}
+            )
+        token = self.new_token()
+        self.create_payment(token, data.get("ResNum"), data.get("Amount"), data.get("RedirectURL"))
+        return SimulatorResponse.json({"status": 1, "token": token})
+
+    def payment_page(self, request):
+        token = request.data.get("Token")
+        payment = self.pay(token)
+        if payment is None:
+            return self.not_found()
+        params = {"MID": "0", "ResNum": payment["order_id"], "Token": token}
+        if self.is_paid(payment):
+            # RefNum is the reference number of the payment from now on.
+            self.simulator.store.set(self._key(f"ref:{payment['reference_id']}"), token)
+            params.update(State="OK", Status="2", RefNum=payment["reference_id"], TRACENO=self.new_number())
+        else:
+            params.update(State="CanceledByUser", Status="1")
+        return SimulatorResponse.redirect(append_querystring(payment["callback_url"], params))
+
+    def verify(self, request):
+        token = self.simulator.store.get(self._key(f"ref:{request.json.get('RefNum')}"))
+        payment = self.get_payment(token)
+        if not self.is_paid(payment):
+            return SimulatorResponse.json(
+                {"ResultCode": -2, "ResultDescription": "not found", "Success": False}
+            )
+        return SimulatorResponse.json(
+            {
+                "ResultCode": 0,
+                "ResultDescription": "success",
+                "Success": True,
+                "TransactionDetail": {"RefNum": payment["reference_id"], "OrginalAmount": payment["amount"]},
+            }
+        )
+
+
+class BMIGateway(SimulatedGateway):
+    bank_type = BankType.BMI
+    reject_code = 1001
+
+    def get_routes(self):
+        return [
+            ("POST", r"/vpg/api/v0/Request/PaymentRequest", self.token, True),
+            ("GET", r"/VPG/Purchase", self.payment_page, False),
+            ("POST", r"/vpg/api/v0/Advice/Verify", self.verify, True),
+        ]
+
+    def token(self, request):
+        data = request.json
+        if self.simulator.is_rejected():
+            return SimulatorResponse.json({"ResCode": self.reject_code, "Description": "rejected"})
+        token = self.new_token()
+        self.create_payment(token, data.get("OrderId"), data.get("Amount"), data.get("ReturnUrl"))
+        return SimulatorResponse.json({"ResCode": 0, "Token": token, "Description": "success"})
+
+    def payment_page(self, request):
+        token = request.query.get("Token")
+        payment = self.pay(token)
+        if payment is None:
+            return self.not_found()
+        res_code = 0 if self.is_paid(payment) else -1
+        return SimulatorResponse.post_form(
+            payment["callback_url"], {"token": token, "ResCode": res_code, "OrderId": payment["order_id"]}
+        )
+
+    def verify(self, request):
+        payment = self.get_payment(request.json.get("Token"))
+        if not self.is_paid(payment):
+            return SimulatorResponse.json({"ResCode": -1, "Description": "not found"})
+        return SimulatorResponse.json(
+            {
+                "ResCode": 0,
+                "Description": "success",
+                "Amount": payment["amount"],
+                "RetrivalRefNo": payment["reference_id"],
+                "SystemTraceNo": self.new_number(),
+                "OrderId": payment["order_id"],
+            }
+        )
+
+
+class ZarinpalGateway(SimulatedGateway):
+    bank_type = BankType.ZARINPAL
+    reject_code = -9
+
+    def get_routes(self):
+        return [
+            ("POST", r"/pg/v4/payment/request\.json", self.token, True),
+            ("GET", r"/pg/StartPay/(?P<token>[^/]+)", self.payment_page, False),
+            ("POST", r"/pg/v4/payment/verify\.json", self.verify, True),
+        ]
+
+    def _error(self, code, message):
+        return SimulatorResponse.json(
+            {"data": [], "errors": {"code": code, "message": message, "validations": []}}
+        )
+
+    def token(self, request):
+        data = request.json
+        if self.simulator.is_rejected():
+            return self._error(self.reject_code, "rejected")
+        token = "A" + uuid.uuid4().hex.upper()[:35]
+        # the order of zarinpal is its authority.
+        self.create_payment(token, token, data.get("amount"), data.get("callback_url"))
+        return SimulatorResponse.json(
+            {
+                "data": {
+                    "code": 100,
+                    "message": "Success",
+                    "authority": token,
+                    "fee_type": "Merchant",
+                    "fee": 0,
+                },
+                "errors": [],
+            }
+        )
+
+    def payment_page(self, request, token):
+        payment = self.pay(token)
+        if payment is None:
+            return self.not_found()
+        status = "OK" if self.is_paid(payment) else "NOK"
+        return SimulatorResponse.redirect(
+            append_querystring(payment["callback_url"], {"Authority": token, "Status": status})
+        )
+
+    def verify(self, request):
+        payment = self.get_payment(request.json.get("authority"))
+        if not self.is_paid(payment):
+            return self._error(-51, "Session is not valid, session is not active paid try.")
+        return SimulatorResponse.json(
+            {
+                "data": {
+                    "code": 100,
+                    "message": "Verified",
+                    "ref_id": int(payment["reference_id"]),
+                    "card_pan": "502229******5995",
+                    "fee_type": "Merchant",
+                    "fee": 0,
+                },
+                "errors": [],
+            }
+        )
+
+
+class IDPayGateway(SimulatedGateway):
+    bank_type = BankType.IDPAY
+    reject_code = 34
+
+    def get_routes(self):
+        return [
+            ("POST", r"/v1\.1/payment", self.token, True),
+            ("GET", r"/p/ws/(?P<token>[^/]+)", self.payment_page, False),
+            ("POST", r"/v1\.1/payment/verify", self.verify, True),
+        ]
+
+    def token(self, request):
+        data = request.json
+        if self.simulator.is_rejected():
+            return SimulatorResponse.json(
+                {"error_code": self.reject_code, "error_message": "rejected"}, status=406
+            )
+        token = self.new_token()
+        self.create_payment(token, data.get("order_id"), data.get("amount"), data.get("callback"))
+        return SimulatorResponse.json({"id": token, "link": f"{request.base_url}/p/ws/{token}"}, status=201)
+
+    def payment_page(self, request, token):
+        payment = self.pay(token)
+        if payment is None:
+            return self.not_found()
+        status = 10 if self.is_paid(payment) else 7
+        params = {
+            "status": status,
+            "track_id": payment["reference_id"],
+            "id": token,
+            "order_id": payment["order_id"],
+        }
+        return SimulatorResponse.redirect(append_querystring(payment["callback_url"], params))
+
+    def verify(self, request):
+        payment = self.get_payment(request.json.get("id"))
+        if not self.is_paid(payment):
+            return SimulatorResponse.json({"error_code": 53, "error_message": "not verified"}, status=405)
+        return SimulatorResponse.json(
+            {
+                "status": 100,
+                "track_id": payment["reference_id"],
+                "id": payment["token"],
+                "order_id": payment["order_id"],
+                "amount": payment["amount"],
+                "date": int(time.time()),
+                "payment": {"track_id": payment["reference_id"], "amount": payment["amount"]},
+                "verify": {"date": int(time.time())},
+            }
+        )
+
+
+class ZibalGateway(SimulatedGateway):
+    bank_type = BankType.ZIBAL
+    reject_code = 102
+
+    def get_routes(self):
+        return [
+            ("POST", r"/v1/request", self.token, True),
+            ("GET", r"/start/(?P<token>[^/]+)", self.payment_page, False),
+            ("POST", r"/v1/verify", self.verify, True),
+        ]
+
+    def token(self, request):
+        data = request.json
+        if self.simulator.is_rejected():
+            return SimulatorResponse.json({"result": self.reject_code, "message": "rejected"})
+        track_id = self.new_number()
+        self.create_payment(track_id, data.get("orderId"), data.get("amount"), data.get("callbackUrl"))
+        return SimulatorResponse.json({"result": 100, "trackId": track_id, "message": "success"})
+
+    def payment_page(self, request, token):
+        payment = self.pay(token)
+        if payment is None:
+            return self.not_found()
+        is_paid = self.is_paid(payment)
+        params = {
+            "trackId": token,
+            "success": 1 if is_paid else 0,
+            "status": 2 if is_paid else 3,
+            "orderId": payment["order_id"],
+        }
+        return SimulatorResponse.redirect(append_querystring(payment["callback_url"], params))
+
+    def verify(self, request):
+        payment = self.get_payment(request.json.get("trackId"))
+        if not self.is_paid(payment):
+            return SimulatorResponse.json({"result": 202, "status": 3, "message": "not paid"})
+        return SimulatorResponse.json(
+            {
+                "result": 100,
+                "status": 1,
+                "message": "success",
+                "amount": payment["amount"],
+                "refNumber": int(payment["reference_id"]),
+                "orderId": payment["order_id"],
+                "paidAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+        )
+
+
+class BahamtaGateway(SimulatedGateway):
+    bank_type = BankType.BAHAMTA
+    reject_code = "INVALID_API_CALL"
+
+    def get_routes(self):
+        return [
+            ("GET", r"/api/create_request", self.token, True),
+            ("GET", r"/pay/(?P<token>[^/]+)", self.payment_page, False),
+            ("GET", r"/api/confirm_payment", self.verify, True),
+        ]
+
+    def token(self, request):
+        data = request.query
+        if self.simulator.is_rejected():
+            return SimulatorResponse.json({"ok": False, "error": self.reject_code})
+        # the reference of the merchant is the token of bahamta.
+        reference = data.get("reference")
+        self.create_payment(reference, reference, data.get("amount_irr"), data.get("callback_url"))
+        payment_url = f"{request.base_url}/pay/{reference}"
+        return SimulatorResponse.json({"ok": True, "result": {"payment_url": payment_url}})
+
+    def payment_page(self, request, token):
+        payment = self.pay(token)
+        if payment is None:
+            return self.not_found()
+        state = "paid" if self.is_paid(payment) else "canceled"
+        return SimulatorResponse.redirect(
+            append_querystring(payment["callback_url"], {"reference": token, "state": state})
+        )
+
+    def verify(self, request):
+        payment = self.get_payment(request.query.get("reference"))
+        if not self.is_paid(payment):
+            return SimulatorResponse.json({"ok": False, "error": "NOT_CONFIRMED"})
+        return SimulatorResponse.json(
+            {
+                "ok": True,
+                "result": {
+                    "state": "paid",
+                    "total": payment["amount"],
+                    "wage": 0,
+                    "gateway": "sep",
+                    "pay_ref": payment["reference_id"],
+                    "pay_trace": str(self.new_number()),
+                    "pay_pan": "123456******1234",
+                    "pay_time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                },
+            }
+        )
+
+
+class MellatGateway(SimulatedGateway):
+    """SOAP service of behpardakht, the answer of each operation is a comma separated string."""
+
+    bank_type = BankType.MELLAT
+    reject_code = "17"
+    namespace = "http://interfaces.core.sw.bps.com/"
+
+    def get_routes(self):
+        return [
+            ("POST", r"/pgwchannel/services/pgw", self.service, True),
+            ("GET", r"/pgwchannel/startpay\.mellat", self.payment_page, False),
+            ("POST", r"/pgwchannel/startpay\.mellat", self.payment_page, False),
+        ]
+
+    def _parse(self, body):
+        root = ElementTree.fromstring(body)
+        for element in root.iter():
+            if element.tag.split("}")[-1].startswith("bp"):
+                return element.tag.split("}")[-1], {child.tag.split("}")[-1]: child.text for child in element}
+        raise ValueError("SOAP operation not found")
+
+    def _soap(self, operation, result):
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
+            f'<ns2:{operation}Response xmlns:ns2="{self.namespace}"><return>{result}</return>'
+            f"</ns2:{operation}Response></soap:Body></soap:Envelope>"
+        )
+        return SimulatorResponse(body, content_type="text/xml; charset=utf-8")
+
+    def service(self, request):
+        try:
+            operation, data = self._parse(request.body)
+        except (ValueError, ElementTree.ParseError):
+            return SimulatorResponse("invalid SOAP request", status=400, content_type="text/plain")
+        if operation == "bpPayRequest":
+            if self.simulator.is_rejected():
+                return self._soap(operation, self.reject_code)
+            token = self.new_token().upper()[:20]
+            self.create_payment(token, data.get("orderId"), data.get("amount"), data.get("callBackUrl"))
+            return self._soap(operation, f"0,{token}")
+        payment = self.get_payment_by_order(data.get("saleOrderId") or data.get("orderId"))
+        if operation in ["bpVerifyRequest", "bpInquiryRequest", "bpSettleRequest"]:
+            is_valid = self.is_paid(payment) and payment["reference_id"] == data.get("saleReferenceId")
+            return self._soap(operation, "0" if is_valid else "43")
+        if operation == "bpReversalRequest":
+            return self._soap(operation, "0" if payment else "48")
+        return self._soap(operation, "21")
+
+    def payment_page(self, request):
+        token = request.data.get("RefId")
+        payment = self.pay(token)
+        if payment is None:
+            return self.not_found()
+        params = {"RefId": token, "SaleOrderId": payment["order_id"]}
+        if self.is_paid(payment):
+            params.update(
+                ResCode="0",
+                SaleReferenceId=payment["reference_id"],
+                CardHolderInfo="",
+                CardHolderPan="603799******1234",
+                FinalAmount=payment["amount"],
+            )
+        else:
+            params.update(ResCode=self.reject_code)
+        return SimulatorResponse.post_form(payment["callback_url"], params)
+
+
+class PayV1Gateway(SimulatedGateway):
+    bank_type = BankType.PAYV1
+    reject_code = -3
+
+    def get_routes(self):
+        return [
+            ("POST", r"/pg/send", self.token, True),
+            ("POST", r"/pg/verify", self.verify, True),
+            ("GET", r"/pg/(?P<token>[^/]+)", self.payment_page, False),
+        ]
+
+    def token(self, request):
+        data = request.json
+        if self.simulator.is_rejected():
+            return SimulatorResponse.json(
+                {"status": 0, "errorCode": self.reject_code, "errorMessage": "rejected"}, status=422
+            )
+        token = self.new_token()
+        self.create_payment(token, data.get("factorNumber"), data.get("amount"), data.get("redirect"))
+        return SimulatorResponse.json({"status": 1, "token": token})
+
+    def payment_page(self, request, token):
+        payment = self.pay(token)
+        if payment is None:
+            return self.not_found()
+        status = 1 if self.is_paid(payment) else 0
+        return SimulatorResponse.redirect(
+            append_querystring(payment["callback_url"], {"status": status, "token": token})
+        )
+
+    def verify(self, request):
+        payment = self.get_payment(request.json.get("token"))
+        if not self.is_paid(payment):
+            return SimulatorResponse.json(
+                {"status": 0, "errorCode": -5, "errorMessage": "not paid"}, status=422
+            )
+        return SimulatorResponse.json(
+            {
+                "status": 1,
+                "amount": str(payment["amount"]),
+                "transId": int(payment["reference_id"]),
+                "factorNumber": payment["order_id"],
+                "cardNumber": "603799******1234",
+                "message": "OK",
+            }
+        )
+
+
+class IranDargahGateway(SimulatedGateway):
+    bank_type = BankType.IRANDARGAH
+    reject_code = -10
+
+    def get_routes(self):
+        return [
+            ("POST", r"(/sandbox)?/payment", self.token, True),
+            ("GET", r"(/sandbox)?/ird/startpay/(?P<token>[^/]+)", self.payment_page, False),
+            ("POST", r"(/sandbox)?/verification", self.verify, True),
+        ]
+
+    def token(self, request):
+        data = request.json
+        if self.simulator.is_rejected():
+            return SimulatorResponse.json({"status": self.reject_code, "message": "rejected"})
+        token = self.new_token()
+        self.create_payment(token, data.get("orderId"), data.get("amount"), data.get("callbackURL"))
+        return SimulatorResponse.json({"status": 200, "message": "success", "authority": token})
+
+    def payment_page(self, request, token):
+        payment = self.pay(token)
+        if payment is None:
+            return self.not_found()
+        is_paid = self.is_paid(payment)
+        params = {
+            "code": 100 if is_paid else -21,
+            "message": "paid" if is_paid else "canceled",
+            "authority": token,
+            "amount": payment["amount"],
+            "orderId": payment["order_id"],
+        }
+        return SimulatorResponse.post_form(payment["callback_url"], params)
+
+    def verify(self, request):
+        payment = self.get_payment(request.json.get("authority"))
+        if not self.is_paid(payment):
+            return SimulatorResponse.json({"status": -31, "message": "not paid"})
+        return SimulatorResponse.json(
+            {
+                "status": 100,
+                "message": "verified",
+                "refId": payment["reference_id"],
+                "cardNumber": "603799******1234",
+                "orderId": payment["order_id"],
+            }
+        )
+
+
+class AsanPardakhtGateway(SimulatedGateway):
+    """Errors of the REST API of asan pardakht are HTTP status codes."""
+
+    bank_type = BankType.ASANPARDAKHT
+    reject_code = 400
+
+    def get_routes(self):
+        return [
+            ("GET", r"/v1/Time", self.server_time, True),
+            ("POST", r"/v1/Token", self.token, True),
+            ("POST", r"/?", self.payment_page, False),
+            ("GET", r"/v1/TranResult", self.transaction_result, True),
+            ("POST", r"/v1/Verify", self.verify, True),
+            ("POST", r"/v1/Settlement", self.settle, True),
+        ]
+
+    def server_time(self, request):
+        return SimulatorResponse.json(time.strftime("%Y%m%d %H%M%S"))
+
+    def token(self, request):
+        data = request.json
+        if self.simulator.is_rejected():
+            return SimulatorResponse.json("", status=int(self.reject_code))
+        token = self.new_token()
+        self.create_payment(
+            token, data.get("localInvoiceId"), data.get("amountInRials"), data.get("callbackURL")
+        )
+        return SimulatorResponse.json(token)
+
+    def payment_page(self, request):
+        token = request.data.get("RefId")
+        payment = self.pay(token)
+        if payment is None:
+            return self.not_found()
+        # localInvoiceId is already a part of the callback url, the result is read by TranResult.
+        return SimulatorResponse.redirect(payment["callback_url"])
+
+    def transaction_result(self, request):
+        payment = self.get_payment_by_order(request.data.get("localInvoiceId"))
+        if not self.is_paid(payment):
+            return SimulatorResponse.json("", status=472)
+        return SimulatorResponse.json(
+            {
+                "cardNumber": "603799******1234",
+                "rrn": payment["reference_id"],
+                "refID": payment["token"],
+                "amount": payment["amount"],
+                "payGateTranID": payment["reference_id"],
+                "salesOrderID": payment["order_id"],
+                "serviceTypeId": 1,
+            }
+        )
+
+    def pay(self, token):
+        payment = super(AsanPardakhtGateway, self).pay(token)
+        if self.is_paid(payment):
+            # the reference id is the payGateTranID of the verify and settlement requests.
+            self.simulator.store.set(self._key(f"ref:{payment['reference_id']}"), payment["token"])
+        return payment
+
+    def verify(self, request):
+        token = self.simulator.store.get(self._key(f"ref:{request.json.get('payGateTranId')}"))
+        if not self.is_paid(self.get_payment(token)):
+            return SimulatorResponse.json("", status=472)
+        return SimulatorResponse("", content_type="text/plain")
+
+    def settle(self, request):
+        return self.verify(request)
+
+
+SIMULATED_GATEWAYS = {
+    gateway.bank_type: gateway
+    for gateway in [
+        SEPGateway,
+        BMIGateway,
+        ZarinpalGateway,
+        IDPayGateway,
+        ZibalGateway,
+        BahamtaGateway,
+        MellatGateway,
+        PayV1Gateway,
+        IranDargahGateway,
+        AsanPardakhtGateway,
+    ]
+}
@@ -0,0 +1,89 @@
+import argparse
+import logging
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse
+
+from .simulator import GatewaySimulator, SimulatorRequest
+
+
+class SimulatorRequestHandler(BaseHTTPRequestHandler):
+    """Handler of the standalone simulator, the first part of the path is the bank type: /zibal/v1/request"""
+
+    simulator = None
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        url_parts = parse.urlsplit(self.path)
+        bank, _, path = url_parts.path.lstrip("/").partition("/")
+        length = int(self.headers.get("Content-Length") or 0)
+        host = self.headers.get("Host") or "{}:{}".format(*self.server.server_address[:2])
+        request = SimulatorRequest(
+            method=self.command,
+            path=path,
+            query=dict(parse.parse_qsl(url_parts.query)),
+            body=self.rfile.read(length) if length else b"",
+            content_type=self.headers.get("Content-Type", ""),
+            base_url=f"http://{host}/{bank}",
+        )
+        response = self.simulator.handle(bank, request)
+        self.send_response(response.status)
+        self.send_header("Content-Type", response.content_type)
+        self.send_header("Content-Length", str(len(response.body)))
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(response.body)
+
+    def log_message(self, format, *args):
+        logging.debug("Bank simulator %s", format % args)
+
+
+def make_server(host="127.0.0.1", port=8800, simulator=None) -> ThreadingHTTPServer:
+    """
+    :param simulator: GatewaySimulator, default a simulator with the SIMULATOR_* settings and in memory payments.
+    """
+    handler = type("Handler", (SimulatorRequestHandler,), {"simulator": simulator or GatewaySimulator()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def add_arguments(parser):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, help="seconds added to each API call")
+    parser.add_argument("--failure-rate", type=float, help="ratio of API calls answered with HTTP 500")
+    parser.add_argument("--reject-rate", type=float, help="ratio of rejected token requests")
+    parser.add_argument("--cancel-rate", type=float, help="ratio of payments canceled by the user")
+
+
+def serve(options, stdout=None):
+    simulator = GatewaySimulator(
+        latency=options["latency"],
+        failure_rate=options["failure_rate"],
+        reject_rate=options["reject_rate"],
+        cancel_rate=options["cancel_rate"],
+    )
+    server = make_server(options["host"], options["port"], simulator)
+    if stdout:
+        stdout.write(
+            f"Bank simulator on http://{options['host']}:{options['port']}, "
+            f"set SIMULATOR_URL to this address.\n"
+        )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m azbankgateways.simulator")
+    add_arguments(parser)
+    serve(vars(parser.parse_args(argv)), stdout=sys.stdout)
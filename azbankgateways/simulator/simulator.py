@@ -0,0 +1,202 @@
+import json
+import random
+import re
+import threading
+import time
+from urllib import parse
+
+from django.core.cache import caches
+
+from azbankgateways import default_settings as settings
+
+
+class SimulatorRequest:
+    """Request to the simulator, independent of the server (Django view or the standalone http server)."""
+
+    def __init__(self, method, path, query=None, body=b"", content_type="", base_url=""):
+        """
+        :param path: path after the bank part, for example /v1/request for /zibal/v1/request
+        :param base_url: absolute url of the bank in the simulator, for example http://127.0.0.1:8800/zibal
+        """
+        self.method = method.upper()
+        self.path = "/" + path.lstrip("/")
+        self.query = query or {}
+        self.body = body or b""
+        self.content_type = content_type or ""
+        self.base_url = base_url.rstrip("/")
+
+    @property
+    def json(self) -> dict:
+        try:
+            return json.loads(self.body.decode("utf-8") or "{}")
+        except ValueError:
+            return {}
+
+    @property
+    def form(self) -> dict:
+        if "application/x-www-form-urlencoded" not in self.content_type:
+            return {}
+        return dict(parse.parse_qsl(self.body.decode("utf-8")))
+
+    @property
+    def data(self) -> dict:
+        """query string, form and json body together."""
+        return {**self.query, **self.form, **(self.json if "json" in self.content_type else {})}
+
+
+class SimulatorResponse:
+    def __init__(self, body="", status=200, content_type="application/json", headers=None):
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    @classmethod
+    def json(cls, data, status=200):
+        return cls(json.dumps(data), status=status)
+
+    @classmethod
+    def redirect(cls, url):
+        return cls("", status=302, content_type="text/plain", headers={"Location": url})
+
+    @classmethod
+    def post_form(cls, url, params):
+        """auto submitted form, the way gateways POST their callback through the browser of the user."""
+        inputs = "".join(
+            '<input type="hidden" name="{}" value="{}">'.format(_escape(name), _escape(value))
+            for name, value in params.items()
+        )
+        html = (
+            '<html><body onload="document.forms[0].submit()">'
+            f'<form method="post" action="{_escape(url)}">{inputs}<noscript><button>continue</button></noscript>'
+            "</form></body></html>"
+        )
+        return cls(html, content_type="text/html; charset=utf-8")
+
+
+def parse_post_form(html) -> tuple:
+    """:return: (url, params) of a form of SimulatorResponse.post_form, what the browser of the user posts."""
+    url = _unescape(re.search(r'action="([^"]*)"', html).group(1))
+    params = {
+        _unescape(name): _unescape(value)
+        for name, value in re.findall(r'name="([^"]*)" value="([^"]*)"', html)
+    }
+    return url, params
+
+
+def _unescape(value) -> str:
+    return value.replace("&lt;", "<").replace("&gt;", ">").replace("&quot;", '"').replace("&amp;", "&")
+
+
+def _escape(value) -> str:
+    return str(value).replace("&", "&amp;").replace('"', "&quot;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+class MemoryStore:
+    """Payments of the standalone simulator, shared by the threads of one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+
+
+class CacheStore:
+    """Payments of the simulator mounted in Django, a shared cache is needed for several processes."""
+
+    timeout = 24 * 60 * 60
+
+    def __init__(self, alias=None):
+        self.alias = alias or settings.SIMULATOR_CACHE
+
+    def get(self, key):
+        return caches[self.alias].get(f"azbankgateways:simulator:{key}")
+
+    def set(self, key, value):
+        caches[self.alias].set(f"azbankgateways:simulator:{key}", value, timeout=self.timeout)
+
+
+class GatewaySimulator:
+    """
+    شبیه ساز درگاه های پرداخت برای تست و load test بدون شبکه.
+
+    Each gateway of azbankgateways.simulator.gateways answers the requests of its driver with the same shapes:
+    token, payment page (which pays at once and returns the user to the callback with the parameters of the
+    gateway) and verify. Drivers are pointed at the simulator by SIMULATOR_URL.
+
+    :param latency: seconds added to each API call, a number or (min, max).
+    :param failure_rate: ratio of API calls answered with HTTP 500.
+    :param reject_rate: ratio of token requests rejected with the reject code of the gateway.
+    :param cancel_rate: ratio of payments canceled on the payment page, their verify fails.
+    :param reject_codes: reject code of each bank type, default the codes of azbankgateways.simulator.gateways.
+    """
+
+    def __init__(
+        self,
+        latency=None,
+        failure_rate=None,
+        reject_rate=None,
+        cancel_rate=None,
+        reject_codes=None,
+        store=None,
+    ):
+        from .gateways import SIMULATED_GATEWAYS
+
+        self.latency = settings.SIMULATOR_LATENCY if latency is None else latency
+        self.failure_rate = settings.SIMULATOR_FAILURE_RATE if failure_rate is None else failure_rate
+        self.reject_rate = settings.SIMULATOR_REJECT_RATE if reject_rate is None else reject_rate
+        self.cancel_rate = settings.SIMULATOR_CANCEL_RATE if cancel_rate is None else cancel_rate
+        reject_codes = {**settings.SIMULATOR_REJECT_CODES, **(reject_codes or {})}
+        self.store = store or MemoryStore()
+        self.gateways = {
+            bank_type.lower(): klass(self, reject_codes.get(bank_type, klass.reject_code))
+            for bank_type, klass in SIMULATED_GATEWAYS.items()
+        }
+
+    def handle(self, bank, request: SimulatorRequest) -> SimulatorResponse:
+        gateway = self.gateways.get(bank.lower())
+        if gateway is None:
+            return SimulatorResponse.json({"error": f"unknown bank {bank}"}, status=404)
+        handler, is_api = gateway.route(request)
+        if handler is None:
+            return SimulatorResponse.json({"error": f"unknown path {request.path}"}, status=404)
+        if is_api:
+            # the payment page is used by the browser, latency and failures are of the API calls.
+            self._sleep()
+            if self.failure_rate and random.random() < self.failure_rate:
+                return SimulatorResponse.json({"error": "simulated failure"}, status=500)
+        return handler(request)
+
+    def _sleep(self):
+        latency = self.latency
+        if isinstance(latency, (list, tuple)):
+            latency = random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def is_rejected(self) -> bool:
+        return bool(self.reject_rate) and random.random() < self.reject_rate
+
+    def is_canceled(self) -> bool:
+        return bool(self.cancel_rate) and random.random() < self.cancel_rate
+
+
+_simulator = None
+_simulator_lock = threading.Lock()
+
+
+def get_simulator() -> GatewaySimulator:
+    """simulator of the Django views, configured by the SIMULATOR_* settings."""
+    global _simulator
+    if _simulator is None:
+        with _simulator_lock:
+            if _simulator is None:
+                _simulator = GatewaySimulator(store=CacheStore())
+    return _simulator
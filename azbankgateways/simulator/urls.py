@@ -0,0 +1,14 @@
+from django.urls import re_path
+
+from .views import simulator_view
+
+
+app_name = "azbankgateways-simulator"
+
+_urlpatterns = [
+    re_path(r"^(?P<bank>\w+)/(?P<path>.*)$", simulator_view, name="gateway"),
+]
+
+
+def simulator_urls():
+    return _urlpatterns, app_name, app_name
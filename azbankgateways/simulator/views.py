@@ -0,0 +1,22 @@
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .simulator import SimulatorRequest, get_simulator
+
+
+@csrf_exempt
+def simulator_view(request, bank, path):
+    """gateways of the simulator mounted in the Django project, the payments are kept in SIMULATOR_CACHE."""
+    simulator_request = SimulatorRequest(
+        method=request.method,
+        path=path,
+        query=request.GET.dict(),
+        body=request.body,
+        content_type=request.content_type or "",
+        base_url=request.build_absolute_uri(request.path[: len(request.path) - len(path)]),
+    )
+    response = get_simulator().handle(bank, simulator_request)
+    http_response = HttpResponse(response.body, status=response.status, content_type=response.content_type)
+    for name, value in response.headers.items():
+        http_response[name] = value
+    return http_response
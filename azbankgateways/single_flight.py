@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import logging
+import time
+
+from django.core.cache import caches
+
+from . import default_settings as settings
+
+
+class CallbackSingleFlight:
+    """
+    Single flight of the callbacks of a payment, keyed by (bank_type, callback reference of the gateway).
+
+    The first callback verifies the payment and caches the url of the client callback for
+    ``CALLBACK_SINGLE_FLIGHT_RESULT_TTL`` seconds, unless the verify failed and left the payment retryable.
+    Concurrent duplicates (refresh of the return page, repeated POST of the gateway) wait for it at most
+    ``CALLBACK_SINGLE_FLIGHT_WAIT`` seconds and later duplicates are redirected to the cached url at once,
+    without any gateway or database work. Without a result in time,
+    or if the cache fails, a duplicate is verified as before and the status transitions keep it safe.
+    """
+
+    poll_interval = 0.05
+
+    @property
+    def cache(self):
+        return caches[settings.CALLBACK_SINGLE_FLIGHT_CACHE]
+
+    @staticmethod
+    def _key(bank_type, reference, name):
+        # the reference is sent by the client, it is hashed to be a valid cache key.
+        digest = hashlib.sha256(str(reference).encode()).hexdigest()
+        return f"azbankgateways:callback:{bank_type}:{digest}:{name}"
+
+    def _is_enabled(self, reference):
+        return settings.CALLBACK_SINGLE_FLIGHT_ENABLE and reference
+
+    def run(self, bank_type, reference, verify) -> str:
+        """
+        :param verify: callable() that verifies the payment and returns (url of the client callback, is the
+            url reusable by the duplicates).
+        :return: url of the client callback
+        """
+        if not self._is_enabled(reference):
+            return verify()[0]
+        result_key = self._key(bank_type, reference, "result")
+        lock_key = self._key(bank_type, reference, "lock")
+        deadline = time.monotonic() + settings.CALLBACK_SINGLE_FLIGHT_WAIT
+        while True:
+            try:
+                url = self.cache.get(result_key)
+                if url:
+                    logging.debug("Reuse result of duplicate callback", extra={"bank_type": bank_type})
+                    return url
+                is_owner = self.cache.add(lock_key, True, timeout=settings.CALLBACK_SINGLE_FLIGHT_WAIT)
+            except Exception as e:
+                logging.exception(e)
+                return verify()[0]
+            if is_owner:
+                try:
+                    url, is_reusable = verify()
+                    if is_reusable:
+                        self._set_result(result_key, url)
+                    return url
+                finally:
+                    self._release(lock_key)
+            if time.monotonic() >= deadline:
+                logging.warning("Duplicate callback wait timeout", extra={"bank_type": bank_type})
+                return verify()[0]
+            time.sleep(self.poll_interval)
+
+    async def arun(self, bank_type, reference, averify) -> str:
+        """نسخه async متد run، averify یک coroutine function است."""
+        if not self._is_enabled(reference):
+            return (await averify())[0]
+        result_key = self._key(bank_type, reference, "result")
+        lock_key = self._key(bank_type, reference, "lock")
+        deadline = time.monotonic() + settings.CALLBACK_SINGLE_FLIGHT_WAIT
+        while True:
+            try:
+                url = await self.cache.aget(result_key)
+                if url:
+                    logging.debug("Reuse result of duplicate callback", extra={"bank_type": bank_type})
+                    return url
+                is_owner = await self.cache.aadd(lock_key, True, timeout=settings.CALLBACK_SINGLE_FLIGHT_WAIT)
+            except Exception as e:
+                logging.exception(e)
+                return (await averify())[0]
+            if is_owner:
+                try:
+                    url, is_reusable = await averify()
+                    if is_reusable:
+                        await self._aset_result(result_key, url)
+                    return url
+                finally:
+                    await self._arelease(lock_key)
+            if time.monotonic() >= deadline:
+                logging.warning("Duplicate callback wait timeout", extra={"bank_type": bank_type})
+                return (await averify())[0]
+            await asyncio.sleep(self.poll_interval)
+
+    def _set_result(self, result_key, url):
+        try:
+            self.cache.set(result_key, url, timeout=settings.CALLBACK_SINGLE_FLIGHT_RESULT_TTL)
+        except Exception as e:
+            logging.exception(e)
+
+    def _release(self, lock_key):
+        try:
+            self.cache.delete(lock_key)
+        except Exception as e:
+            logging.exception(e)
+
+    async def _aset_result(self, result_key, url):
+        try:
+            await self.cache.aset(result_key, url, timeout=settings.CALLBACK_SINGLE_FLIGHT_RESULT_TTL)
+        except Exception as e:
+            logging.exception(e)
+
+    async def _arelease(self, lock_key):
+        try:
+            await self.cache.adelete(lock_key)
+        except Exception as e:
+            logging.exception(e)
+
+
+callback_single_flight = CallbackSingleFlight()
@@ -0,0 +1,238 @@
+import abc
+import importlib
+import logging
+import math
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+import six
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+from azbankgateways import default_settings as settings
+
+
+@six.add_metaclass(abc.ABCMeta)
+class TrackingCodeGenerator:
+    @abc.abstractmethod
+    def generate(self) -> int:
+        """tracking code with at most TRACKING_CODE_LENGTH digits"""
+        pass
+
+
+class RandomTrackingCodeGenerator(TrackingCodeGenerator):
+    """Random digits of uuid4, without any guarantee of uniqueness."""
+
+    def generate(self) -> int:
+        return int(str(uuid.uuid4().int)[-1 * settings.TRACKING_CODE_LENGTH :])
+
+
+class SnowflakeTrackingCodeGenerator(TrackingCodeGenerator):
+    """
+    Unique and time ordered tracking codes without any database round trip.
+
+    code = 10 ** (TRACKING_CODE_LENGTH - 1) + (seconds since epoch | node id | sequence), so every code has
+    exactly TRACKING_CODE_LENGTH digits. Codes are unique as long as no two processes use the same node id:
+
+    * AZ_IRANIAN_BANK_GATEWAYS_NODE_ID environment variable of the worker, read after fork so a server hook
+      (for example post_fork of gunicorn) can set it for each worker, or
+    * a node id leased from TRACKING_CODE_NODE_CACHE, a cache shared by all processes and hosts (Redis,
+      Memcached). generate() renews the lease and a lost lease is replaced by a new node id.
+
+    Without them (or with a per process cache such as LocMemCache) codes are made by the fallback generator, the
+    default configuration falls back to RandomTrackingCodeGenerator. Without a fallback the node id and the
+    first sequence of each second are random and an error is logged, codes of different processes may collide.
+
+    When the sequence of a second is exhausted or the clock goes back, the next seconds are borrowed, codes
+    stay unique and increasing.
+    """
+
+    epoch = 1704067200  # 2024-01-01 UTC
+    node_bits = 12
+    sequence_bits = 10
+    min_timestamp_bits = 30  # ~34 years
+
+    def __init__(self, fallback: TrackingCodeGenerator = None):
+        self._fallback = fallback
+        self._offset = 10 ** (settings.TRACKING_CODE_LENGTH - 1)
+        self._timestamp_bits = self.get_timestamp_bits(settings.TRACKING_CODE_LENGTH)
+        if self._timestamp_bits < self.min_timestamp_bits:
+            raise ImproperlyConfigured(
+                f"TRACKING_CODE_LENGTH {settings.TRACKING_CODE_LENGTH} is too short for {type(self).__name__}, "
+                "use 16 or more digits or azbankgateways.tracking_codes.RandomTrackingCodeGenerator."
+            )
+        if settings.TRACKING_CODE_NODE_ID is not None:
+            logging.warning(
+                "TRACKING_CODE_NODE_ID is deprecated and ignored, it is the same in every worker process. "
+                "Set AZ_IRANIAN_BANK_GATEWAYS_NODE_ID for each worker or a shared TRACKING_CODE_NODE_CACHE."
+            )
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    @classmethod
+    def get_timestamp_bits(cls, length) -> int:
+        offset = 10 ** (length - 1)
+        return int(math.log2(10**length - offset)) - cls.node_bits - cls.sequence_bits
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._node_id = None
+        # True when no unique node id is available and the node id is random.
+        self._is_random_node = False
+        # owner value and time of the lease of the node id in the cache, None without lease.
+        self._node_owner = None
+        self._node_leased_at = None
+        self._last_timestamp = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    @property
+    def node_cache(self):
+        return caches[settings.TRACKING_CODE_NODE_CACHE]
+
+    @staticmethod
+    def _get_node_key(node_id):
+        return f"azbankgateways:tracking_code:node:{node_id}"
+
+    def get_node_id(self):
+        """:return: a node id unique among the processes, None if it is not available."""
+        node_id = os.environ.get("AZ_IRANIAN_BANK_GATEWAYS_NODE_ID")
+        if node_id is not None:
+            return int(node_id) & self._get_max(self.node_bits)
+        if isinstance(self.node_cache, (LocMemCache, DummyCache)):
+            self._log_no_node_id(
+                "TRACKING_CODE_NODE_CACHE is not shared between processes. Set AZ_IRANIAN_BANK_GATEWAYS_NODE_ID "
+                "for each worker or use a shared cache (Redis, Memcached)."
+            )
+            return None
+        try:
+            node_id = self._lease_node_id()
+        except Exception as e:
+            logging.exception(e)
+        if node_id is None:
+            self._log_no_node_id("No tracking code node id is leased.")
+        return node_id
+
+    def _log_no_node_id(self, message):
+        if self._fallback is None:
+            logging.error(f"{message} Tracking codes may collide.")
+        else:
+            logging.warning(f"{message} Tracking codes are made by {type(self._fallback).__name__}.")
+
+    def _set_node_id(self, node_id):
+        self._is_random_node = node_id is None
+        self._node_id = random.getrandbits(self.node_bits) if node_id is None else node_id
+
+    def _lease_node_id(self):
+        """:return: a free node id of the shared cache, None if all of them are leased."""
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        count = 1 << self.node_bits
+        # start from a random node id, a free one is usually found by the first add.
+        first = random.randrange(count)
+        for index in range(count):
+            node_id = (first + index) % count
+            if self.node_cache.add(
+                self._get_node_key(node_id), owner, timeout=settings.TRACKING_CODE_NODE_LEASE
+            ):
+                self._node_owner = owner
+                self._node_leased_at = time.monotonic()
+                return node_id
+        return None
+
+    def _renew_node_id(self) -> int:
+        """
+        The lease is renewed after half of TRACKING_CODE_NODE_LEASE. A lease close to its expiry (the node id may
+        be leased by another process right after it) is never renewed, a new node id is leased instead.
+        """
+        lease = settings.TRACKING_CODE_NODE_LEASE
+        if time.monotonic() - self._node_leased_at < lease * 0.9:
+            key = self._get_node_key(self._node_id)
+            try:
+                if self.node_cache.get(key) == self._node_owner and self.node_cache.touch(key, lease):
+                    self._node_leased_at = time.monotonic()
+                    return self._node_id
+            except Exception as e:
+                logging.exception(e)
+        logging.warning(
+            "Tracking code node id lease is lost, lease a new one.", extra={"node_id": self._node_id}
+        )
+        self._node_owner = None
+        self._node_leased_at = None
+        return self.get_node_id()
+
+    @staticmethod
+    def _get_max(bits):
+        return (1 << bits) - 1
+
+    def generate(self) -> int:
+        if self._pid != os.getpid():
+            self._reset()
+        with self._lock:
+            if self._node_id is None:
+                self._set_node_id(self.get_node_id())
+            elif (
+                self._node_leased_at
+                and time.monotonic() - self._node_leased_at >= settings.TRACKING_CODE_NODE_LEASE / 2
+            ):
+                self._set_node_id(self._renew_node_id())
+            if self._is_random_node and self._fallback is not None:
+                return self._fallback.generate()
+            timestamp = max(int(time.time()) - self.epoch, self._last_timestamp)
+            if timestamp == self._last_timestamp:
+                self._sequence += 1
+                if self._sequence > self._get_max(self.sequence_bits):
+                    timestamp += 1
+                    self._sequence = 0
+            elif self._is_random_node:
+                # the random node id may be used by another process too, a random first sequence makes their
+                # codes of the same second less likely to be equal.
+                self._sequence = random.randrange(self._get_max(self.sequence_bits) + 1)
+            else:
+                self._sequence = 0
+            self._last_timestamp = timestamp
+            sequence = self._sequence
+        timestamp &= self._get_max(self._timestamp_bits)
+        code = (
+            (timestamp << (self.node_bits + self.sequence_bits))
+            | (self._node_id << self.sequence_bits)
+            | sequence
+        )
+        return self._offset + code
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def _create_generator() -> TrackingCodeGenerator:
+    path = settings.TRACKING_CODE_GENERATOR_CLASS
+    if path is not None:
+        package, attr = path.rsplit(".", 1)
+        return getattr(importlib.import_module(package), attr)()
+    if SnowflakeTrackingCodeGenerator.get_timestamp_bits(settings.TRACKING_CODE_LENGTH) >= (
+        SnowflakeTrackingCodeGenerator.min_timestamp_bits
+    ):
+        # without a unique node id the codes are random as before, never less unique.
+        return SnowflakeTrackingCodeGenerator(fallback=RandomTrackingCodeGenerator())
+    logging.warning(
+        f"TRACKING_CODE_LENGTH {settings.TRACKING_CODE_LENGTH} is deprecated, tracking codes are random and "
+        "may collide. Use 16 or more digits for unique tracking codes."
+    )
+    return RandomTrackingCodeGenerator()
+
+
+def get_tracking_code_generator() -> TrackingCodeGenerator:
+    """process wide instance of TRACKING_CODE_GENERATOR_CLASS"""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = _create_generator()
+    return _generator
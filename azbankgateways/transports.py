@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from urllib import parse
+
+import requests
+from asgiref.sync import sync_to_async
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from . import default_settings as settings
+
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+class SessionPool:
+    """
+    Process wide pool of keep-alive HTTP connections to the bank gateways.
+
+    Every host gets its own connection pool (``HTTPAdapter``) mounted on a single shared
+    ``requests.Session``, so the TCP and TLS handshake happen once per connection instead of once
+    per request. The pool is rebuilt in a forked child so sockets are never shared between
+    processes.
+    """
+
+    def __init__(self):
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._session = None
+        self._adapters = {}
+        self._stats = {}
+        # the lock may be held by another thread at fork time, never reuse it in the child.
+        self._lock = threading.RLock()
+
+    def _create_session(self):
+        session = requests.Session()
+        # the session is shared by all merchants and gateways; never carry cookies between requests.
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        if not settings.HTTP_KEEP_ALIVE:
+            session.headers["Connection"] = "close"
+        return session
+
+    @staticmethod
+    def _get_host(url):
+        url_parts = parse.urlsplit(url)
+        return f"{url_parts.scheme}://{url_parts.netloc}"
+
+    @staticmethod
+    def get_pool_size(host):
+        netloc = parse.urlsplit(host).netloc
+        return settings.HTTP_POOL_MAXSIZE_PER_HOST.get(netloc, settings.HTTP_POOL_MAXSIZE)
+
+    def get_session(self, url) -> requests.Session:
+        """Return the shared session with a connection pool mounted for the host of url."""
+        if self._pid != os.getpid():
+            self._reset()
+        host = self._get_host(url)
+        with self._lock:
+            if self._session is None:
+                self._session = self._create_session()
+            if host not in self._adapters:
+                pool_size = self.get_pool_size(host)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                self._session.mount(f"{host}/", adapter)
+                self._adapters[host] = adapter
+                self._stats[host] = {"requests": 0, "errors": 0, "pool_size": pool_size}
+                logging.debug("Mount http connection pool", extra={"host": host, "pool_size": pool_size})
+            return self._session
+
+    def request(self, method, url, **kwargs) -> requests.Response:
+        session = self.get_session(url)
+        host = self._get_host(url)
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self._increase(host, "errors")
+            raise
+        finally:
+            self._increase(host, "requests")
+        return response
+
+    def _increase(self, host, key):
+        with self._lock:
+            if host in self._stats:
+                self._stats[host][key] += 1
+
+    def stats(self) -> dict:
+        """
+        :return
+        base on host for example:
+        {
+            'https://sep.shaparak.ir': {
+                'requests': 120,
+                'errors': 1,
+                'pool_size': 10,
+                'connections': 3,
+            },
+        }
+        """
+        with self._lock:
+            result = {}
+            for host, adapter in self._adapters.items():
+                pools = adapter.poolmanager.pools
+                connections = sum(pools[key].num_connections for key in pools.keys())
+                result[host] = {**self._stats[host], "connections": connections}
+            return result
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._reset()
+
+
+class AsyncSessionPool:
+    """
+    Asyncio counterpart of ``SessionPool`` built on ``httpx`` (``pip install az-iranian-bank-gateways[async]``).
+
+    Clients are bound to the running event loop and keep one connection pool per gateway host. The
+    result is converted to a ``requests.Response`` and transport errors to ``requests`` exceptions, so
+    drivers handle both transports the same way. Without ``httpx`` the request is sent through
+    ``SessionPool`` in a worker thread.
+    """
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+
+    def get_client(self, url) -> "httpx.AsyncClient":
+        clients = self._clients.setdefault(asyncio.get_running_loop(), {})
+        host = SessionPool._get_host(url)
+        if host not in clients:
+            pool_size = SessionPool.get_pool_size(host)
+            limits = httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size if settings.HTTP_KEEP_ALIVE else 0,
+            )
+            # the client is shared by all merchants and gateways; never carry cookies between requests.
+            cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+            clients[host] = httpx.AsyncClient(limits=limits, cookies=cookies, follow_redirects=True)
+            logging.debug("Create async http connection pool", extra={"host": host, "pool_size": pool_size})
+        return clients[host]
+
+    async def request(self, method, url, **kwargs) -> requests.Response:
+        if httpx is None:
+            return await sync_to_async(session_pool.request, thread_sensitive=False)(method, url, **kwargs)
+
+        client = self.get_client(url)
+        timeout = kwargs.get("timeout")
+        if isinstance(timeout, tuple):
+            # (connect, read) of requests
+            kwargs["timeout"] = httpx.Timeout(timeout[1], connect=timeout[0])
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(e)
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(e)
+        return self._to_requests_response(response)
+
+    @staticmethod
+    def _to_requests_response(response) -> requests.Response:
+        result = requests.Response()
+        result.status_code = response.status_code
+        result.reason = response.reason_phrase
+        result.headers = CaseInsensitiveDict(response.headers)
+        result.encoding = response.encoding
+        result.url = str(response.url)
+        result._content = response.content
+        return result
+
+
+session_pool = SessionPool()
+async_session_pool = AsyncSessionPool()
@@ -3,8 +3,10 @@ from django.urls import path
 from . import default_settings as settings
 from .apps import AZIranianBankGatewaysConfig
 from .views import (
+    acallback_view,
     callback_view,
     go_to_bank_gateway,
+    metrics_view,
     sample_payment_view,
     sample_result_view,
 )
@@ -12,7 +14,11 @@ from .views import (
 app_name = AZIranianBankGatewaysConfig.name
 
 _urlpatterns = [
-    path("callback/", callback_view, name="callback"),
+    path(
+        "callback/",
+        acallback_view if settings.IS_ASYNC_CALLBACK_ENABLE else callback_view,
+        name="callback",
+    ),
 ]
 
 if not settings.IS_SAFE_GET_GATEWAY_PAYMENT:
@@ -26,6 +32,11 @@ if settings.IS_SAMPLE_FORM_ENABLE:
         path("sample-result/", sample_result_view, name="sample-result"),
     ]
 
+if settings.METRICS_ENABLE:
+    _urlpatterns += [
+        path("metrics/", metrics_view, name="metrics"),
+    ]
+
 
 def az_bank_gateways_urls():
     return _urlpatterns, app_name, app_name
@@ -2,6 +2,7 @@ import json
 from urllib import parse
 
 from django.conf import settings
+from django.http import HttpRequest, QueryDict
 from django.urls import reverse
 
 from azbankgateways.types import DictQuerystring
@@ -61,3 +62,20 @@ def build_full_url(viewname: str, *args, **kwargs):
 
     # Fallback: return only relative path
     return path
+
+
+def get_callback_payload(request) -> dict:
+    """query string and form data of a gateway callback, build_callback_request builds the request again."""
+    return {"method": request.method, "GET": dict(request.GET.lists()), "POST": dict(request.POST.lists())}
+
+
+def build_callback_request(payload: dict) -> HttpRequest:
+    request = HttpRequest()
+    request.method = payload["method"]
+    for name in ["GET", "POST"]:
+        query_dict = QueryDict(mutable=True)
+        for key, values in payload[name].items():
+            query_dict.setlist(key, values)
+        query_dict._mutable = False
+        setattr(request, name, query_dict)
+    return request
@@ -0,0 +1,132 @@
+import abc
+import datetime
+import importlib
+import logging
+import threading
+import time
+
+import six
+from django.db.models import Q
+from django.utils import timezone
+
+from azbankgateways import default_settings as settings
+from azbankgateways.bankfactories import BankFactory
+from azbankgateways.models import Bank, PaymentStatus
+
+
+@six.add_metaclass(abc.ABCMeta)
+class VerifyQueue:
+    @abc.abstractmethod
+    def enqueue(self, bank_record: Bank):
+        """
+        Called by the callback after the payload of the gateway is saved and the record is RETURN_FROM_BANK, the
+        consumer of the queue calls verify_deferred(bank_record.pk).
+        """
+        pass
+
+
+class DatabaseVerifyQueue(VerifyQueue):
+    """
+    The records in RETURN_FROM_BANK with a callback payload are the queue, process_verify_queue consumes it.
+
+    A record is claimed by a conditional UPDATE on its update_at, so several workers never verify it at the
+    same time. A record which is not verified is claimed again after VERIFY_QUEUE_LEASE seconds, at most
+    VERIFY_QUEUE_MAX_ATTEMPTS times.
+    """
+
+    def enqueue(self, bank_record: Bank):
+        # the record is the message.
+        pass
+
+    def get_queryset(self):
+        return Bank.objects.filter_return_from_bank().filter(
+            callback_payload__isnull=False,
+            callback_payload__attempts__lt=settings.VERIFY_QUEUE_MAX_ATTEMPTS,
+        )
+
+    def dequeue(self, batch_size: int) -> list:
+        now = timezone.now()
+        records = self.get_queryset().filter(
+            Q(callback_payload__attempts=0)
+            | Q(update_at__lt=now - datetime.timedelta(seconds=settings.VERIFY_QUEUE_LEASE))
+        )
+        claimed_records = []
+        for record in records.order_by("update_at")[:batch_size]:
+            payload = {**record.callback_payload, "attempts": record.callback_payload["attempts"] + 1}
+            is_claimed = Bank.objects.filter(
+                pk=record.pk, status=PaymentStatus.RETURN_FROM_BANK, update_at=record.update_at
+            ).update(update_at=now, callback_payload=payload)
+            if is_claimed:
+                record.update_at = now
+                record.callback_payload = payload
+                claimed_records.append(record)
+        return claimed_records
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_verify_queue() -> VerifyQueue:
+    """process wide instance of VERIFY_QUEUE_CLASS"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                package, attr = settings.VERIFY_QUEUE_CLASS.rsplit(".", 1)
+                _queue = getattr(importlib.import_module(package), attr)()
+    return _queue
+
+
+def verify_deferred(bank_record) -> Bank:
+    """
+    Verify a queued payment with the saved callback payload, the consumer of a custom queue calls it.
+
+    :param bank_record: record or its pk
+    """
+    if not isinstance(bank_record, Bank):
+        bank_record = Bank.objects.get(pk=bank_record)
+    bank = BankFactory().create(
+        bank_type=bank_record.bank_type, identifier=bank_record.bank_choose_identifier
+    )
+    bank.verify_deferred_from_gateway(bank_record)
+    return bank_record
+
+
+def process_verify_queue(
+    batch_size: int = None, max_runtime: float = None, is_once: bool = False, progress=None
+) -> dict:
+    """
+    Consume DatabaseVerifyQueue until max_runtime, or until it is empty if is_once.
+
+    :return
+    for example:
+    {
+        'verified': 120,
+        'failed': 2,
+    }
+    """
+    queue = get_verify_queue()
+    if not isinstance(queue, DatabaseVerifyQueue):
+        raise TypeError(f"{type(queue).__name__} is consumed by its own worker, it calls verify_deferred.")
+    batch_size = batch_size or settings.VERIFY_QUEUE_BATCH_SIZE
+    started_at = time.monotonic()
+    result = {"verified": 0, "failed": 0}
+    while max_runtime is None or time.monotonic() - started_at < max_runtime:
+        records = queue.dequeue(batch_size)
+        if not records:
+            if is_once:
+                break
+            time.sleep(settings.VERIFY_QUEUE_POLL_INTERVAL)
+            continue
+        for record in records:
+            try:
+                verify_deferred(record)
+                result["verified"] += 1
+            except Exception as e:
+                # the record stays in the queue and is claimed again after the lease.
+                logging.exception(e)
+                result["failed"] += 1
+        if progress:
+            progress(result)
+    return result
@@ -1,2 +1,3 @@
-from .banks import callback_view, go_to_bank_gateway  # noqa
+from .banks import acallback_view, callback_view, go_to_bank_gateway  # noqa
+from .metrics import metrics_view  # noqa
 from .samples import sample_payment_view, sample_result_view  # noqa
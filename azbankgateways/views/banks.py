@@ -1,12 +1,15 @@
 import logging
 from urllib.parse import unquote
 
+from asgiref.sync import sync_to_async
 from django.http import Http404
-from django.shortcuts import render
+from django.shortcuts import redirect, render
 from django.views.decorators.csrf import csrf_exempt
 
+from azbankgateways import default_settings as settings
 from azbankgateways.bankfactories import BankFactory
 from azbankgateways.exceptions import AZBankGatewaysException
+from azbankgateways.single_flight import callback_single_flight
 
 
 @csrf_exempt
@@ -20,11 +23,60 @@ def callback_view(request):
 
     factory = BankFactory()
     bank = factory.create(bank_type, identifier=identifier)
+
+    def verify():
+        try:
+            if settings.IS_DEFERRED_VERIFY_ENABLE:
+                bank.defer_verify_from_gateway(request)
+            else:
+                bank.verify_from_gateway(request)
+        except AZBankGatewaysException:
+            logging.exception("Verify from gateway failed.", stack_info=True)
+            # a payment left retryable (for example by a gateway timeout) is verified again by a duplicate.
+            return bank.get_client_callback_url(), bank.is_payment_final()
+        return bank.get_client_callback_url(), True
+
+    # duplicate callbacks of a payment wait for the first one and reuse its result.
+    url = callback_single_flight.run(bank_type, _get_callback_reference(bank, request), verify)
+    return redirect(url)
+
+
+@csrf_exempt
+async def acallback_view(request):
+    """نسخه async ویو کال بک. درخواست های درگاه بدون اشغال کردن thread منتظر می مانند."""
+    bank_type = request.GET.get("bank_type", None)
+    identifier = request.GET.get("identifier", None)
+
+    if not bank_type:
+        logging.critical("Bank type is required. but it doesnt send.")
+        raise Http404
+
+    factory = BankFactory()
+    # setting readers may hit the database.
+    bank = await sync_to_async(factory.create)(bank_type, identifier=identifier)
+
+    async def averify():
+        try:
+            if settings.IS_DEFERRED_VERIFY_ENABLE:
+                await bank.adefer_verify_from_gateway(request)
+            else:
+                await bank.averify_from_gateway(request)
+        except AZBankGatewaysException:
+            logging.exception("Verify from gateway failed.", stack_info=True)
+            return bank.get_client_callback_url(), bank.is_payment_final()
+        return bank.get_client_callback_url(), True
+
+    url = await callback_single_flight.arun(bank_type, _get_callback_reference(bank, request), averify)
+    return redirect(url)
+
+
+def _get_callback_reference(bank, request):
+    bank.set_request(request)
     try:
-        bank.verify_from_gateway(request)
-    except AZBankGatewaysException:
-        logging.exception("Verify from gateway failed.", stack_info=True)
-    return bank.redirect_client_callback()
+        return bank.get_callback_reference()
+    except Exception as e:
+        logging.debug(str(e))
+        return None
 
 
 @csrf_exempt
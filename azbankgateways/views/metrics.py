@@ -0,0 +1,16 @@
+import hmac
+
+from django.http import HttpResponse, HttpResponseForbidden
+
+from azbankgateways import default_settings as settings
+from azbankgateways.metrics import metrics
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, with METRICS_VIEW_TOKEN the scraper must send it as a bearer token."""
+    token = settings.METRICS_VIEW_TOKEN
+    if token:
+        authorization = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode()):
+            return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
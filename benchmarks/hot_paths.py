@@ -0,0 +1,303 @@
+"""
+Time, memory and query count of the hot paths of the library, compared with the stored baselines.
+
+The gateways are answered in process by the simulator (azbankgateways.simulator), mounted as a requests
+transport adapter on the shared session and on the Mellat SOAP client, so no socket is opened and the
+numbers only measure the work of the library: building the drivers, the payload and the urls, parsing the
+answers and the ``Bank`` reads and writes of each step (in memory SQLite).
+
+For each operation the median and mean time of ``--iterations`` calls, the peak of the memory allocated
+by one call (tracemalloc) and its count of queries and writes (INSERT/UPDATE/DELETE) are recorded. Times
+depend on the machine, save the baselines on the machine that checks them. Run from the repository root:
+
+    python benchmarks/hot_paths.py                  # compare with benchmarks/baselines.json
+    python benchmarks/hot_paths.py --filter MELLAT  # only the operations of one driver
+    python benchmarks/hot_paths.py --save           # store the current numbers as the baselines
+    python benchmarks/hot_paths.py --check          # exit 1 on a regression, for CI
+"""
+import argparse
+import html
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from urllib import parse
+
+import django
+from django.conf import settings
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# a single process, the tracking code node id is not leased from the cache.
+os.environ.setdefault("AZ_IRANIAN_BANK_GATEWAYS_NODE_ID", "1")
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+SIMULATOR_URL = "http://simulator.local"
+BANK_TYPES = [
+    "BMI",
+    "SEP",
+    "ZARINPAL",
+    "IDPAY",
+    "ZIBAL",
+    "BAHAMTA",
+    "MELLAT",
+    "PAYV1",
+    "IRANDARGAH",
+    "ASANPARDAKHT",
+]
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+settings.configure(
+    INSTALLED_APPS=["azbankgateways"],
+    USE_TZ=True,
+    ALLOWED_HOSTS=["*"],
+    SECURE_REFERRER_POLICY="strict-origin-when-cross-origin",
+    ROOT_URLCONF=__name__,
+    DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}},
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    AZ_IRANIAN_BANK_GATEWAYS={
+        "GATEWAYS": {
+            "BMI": {
+                "MERCHANT_CODE": "merchant",
+                "TERMINAL_CODE": "terminal",
+                "SECRET_KEY": "YTEyMzQ1Njc4OTAxMjM0NTY3ODkwMTIz",
+            },
+            "SEP": {"MERCHANT_CODE": "merchant", "TERMINAL_CODE": "terminal"},
+            "ZARINPAL": {"MERCHANT_CODE": "merchant", "SANDBOX": 0},
+            "IDPAY": {"MERCHANT_CODE": "merchant", "METHOD": "POST", "X_SANDBOX": 0},
+            "ZIBAL": {"MERCHANT_CODE": "merchant"},
+            "BAHAMTA": {"MERCHANT_CODE": "merchant"},
+            "MELLAT": {"TERMINAL_CODE": "1234", "USERNAME": "user", "PASSWORD": "password"},
+            "PAYV1": {"MERCHANT_CODE": "merchant", "X_SANDBOX": 0},
+            "IRANDARGAH": {"MERCHANT_CODE": "merchant", "SANDBOX": 0},
+            "ASANPARDAKHT": {"MERCHANT_CONFIGURATION_ID": "1", "USERNAME": "user", "PASSWORD": "password"},
+        },
+        "DEFAULT": "BMI",
+        "SIMULATOR_URL": SIMULATOR_URL,
+    },
+)
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.urls import path  # noqa: E402
+
+from azbankgateways.bankfactories import BankFactory  # noqa: E402
+from azbankgateways.simulator.adapter import install_simulator_adapter  # noqa: E402
+from azbankgateways.simulator.simulator import SimulatorRequest  # noqa: E402
+from azbankgateways.urls import az_bank_gateways_urls  # noqa: E402
+from azbankgateways.utils import append_querystring  # noqa: E402
+
+
+urlpatterns = [path("bankgateways/", az_bank_gateways_urls())]
+request_factory = RequestFactory()
+factory = BankFactory()
+simulator = None
+
+
+def new_bank(bank_type):
+    bank = factory.create(bank_type)
+    bank.set_request(request_factory.get("/pay/", {"order": "1"}))
+    bank.set_amount(20000)
+    bank.set_client_callback_url("/payment-result/")
+    return bank
+
+
+def pay_on_gateway(bank):
+    """the user on the payment page of the simulator, returns the callback request of the gateway."""
+    context = bank.get_gateway()
+    url_parts = parse.urlsplit(context["url"])
+    bank_name, _, gateway_path = url_parts.path[1:].partition("/")
+    query = dict(parse.parse_qsl(url_parts.query))
+    body = b""
+    if context["method"] == "GET":
+        query.update({key: str(value) for key, value in context["params"].items()})
+    else:
+        body = parse.urlencode(context["params"]).encode()
+    response = simulator.handle(
+        bank_name,
+        SimulatorRequest(
+            context["method"],
+            gateway_path,
+            query=query,
+            body=body,
+            content_type="application/x-www-form-urlencoded",
+            base_url=f"{SIMULATOR_URL}/{bank_name}",
+        ),
+    )
+    if response.status == 302:
+        return request_factory.get(response.headers["Location"])
+    page = response.body.decode()
+    action = html.unescape(re.search(r'action="([^"]*)"', page).group(1))
+    fields = re.findall(r'name="([^"]*)" value="([^"]*)"', page)
+    return request_factory.post(action, {html.unescape(name): html.unescape(value) for name, value in fields})
+
+
+def ready_bank(bank_type):
+    bank = new_bank(bank_type)
+    bank.ready()
+    return bank
+
+
+def paid_callback(bank_type):
+    return factory.create(bank_type), pay_on_gateway(ready_bank(bank_type))
+
+
+def lifecycle(bank_type):
+    bank = new_bank(bank_type)
+    bank.ready()
+    factory.create(bank_type).verify_from_gateway(pay_on_gateway(bank))
+
+
+def get_operations():
+    """:return: list of (name, func, setup), func is called with the result of setup (not measured)."""
+    operations = [
+        (
+            "append_querystring",
+            lambda: append_querystring(
+                "https://example.com/callback/?tc=1234", {"bank_type": "BMI", "identifier": "1"}
+            ),
+            None,
+        ),
+        ("callback_url", lambda bank: bank._get_gateway_callback_url(), lambda: (new_bank("ZIBAL"),)),
+        ("gateway_payment_url", lambda bank: bank.get_gateway_payment_url(), lambda: (ready_bank("ZIBAL"),)),
+        (
+            "bmi_encrypt_des3",
+            lambda bank: bank._encrypt_des3("a1b2c3d4e5f6a7b8c9d0"),
+            lambda: (new_bank("BMI"),),
+        ),
+    ]
+    for bank_type in BANK_TYPES:
+        operations += [
+            (f"create/{bank_type}", lambda bank_type=bank_type: factory.create(bank_type), None),
+            (
+                f"ready/{bank_type}",
+                lambda bank: bank.ready(),
+                lambda bank_type=bank_type: (new_bank(bank_type),),
+            ),
+            (
+                f"verify_from_gateway/{bank_type}",
+                lambda bank, request: bank.verify_from_gateway(request),
+                lambda bank_type=bank_type: paid_callback(bank_type),
+            ),
+            (f"lifecycle/{bank_type}", lambda bank_type=bank_type: lifecycle(bank_type), None),
+        ]
+    return operations
+
+
+def measure(func, setup, iterations) -> dict:
+    setup = setup or tuple
+    func(*setup())  # warm up: caches, clients and the offset of asan pardakht
+    timings = []
+    for _ in range(iterations):
+        args = setup()
+        started_at = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - started_at) * 1e6)
+
+    args = setup()
+    with CaptureQueriesContext(connection) as context:
+        func(*args)
+    queries = [query["sql"].lstrip().upper() for query in context.captured_queries]
+
+    peaks = []
+    for _ in range(3):
+        args = setup()
+        tracemalloc.start()
+        func(*args)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+    return {
+        "p50_us": round(statistics.median(timings), 1),
+        "mean_us": round(statistics.mean(timings), 1),
+        "peak_kib": round(statistics.median(peaks), 1),
+        "queries": len(queries),
+        "writes": sum(1 for query in queries if query.startswith(WRITE_STATEMENTS)),
+    }
+
+
+def get_regressions(result, baseline, threshold) -> list:
+    if not baseline:
+        return []
+    regressions = []
+    for key in ["p50_us", "peak_kib"]:
+        if baseline.get(key) and result[key] > baseline[key] * (1 + threshold / 100):
+            regressions.append(key)
+    for key in ["queries", "writes"]:
+        if key in baseline and result[key] > baseline[key]:
+            regressions.append(key)
+    return regressions
+
+
+def change(value, base_value) -> str:
+    if not base_value:
+        return ""
+    return f"{(value - base_value) / base_value * 100:+.0f}%"
+
+
+def main():
+    global simulator
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--filter", default="", help="only the operations whose name contains this text")
+    parser.add_argument("--baselines", default=BASELINES)
+    parser.add_argument("--save", action="store_true", help="store the results as the baselines")
+    parser.add_argument("--check", action="store_true", help="exit 1 if an operation regressed")
+    parser.add_argument(
+        "--threshold", type=float, default=25, help="allowed increase of time and memory in percent"
+    )
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    simulator = install_simulator_adapter()
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as fh:
+            baselines = json.load(fh)["operations"]
+
+    results = {}
+    regressed = []
+    print(
+        f"{'operation':<34}{'p50 us':>10}{'':>7}{'mean us':>10}{'peak KiB':>10}{'':>7}{'queries':>9}{'writes':>8}"
+    )
+    for name, func, setup in get_operations():
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(func, setup, args.iterations)
+        baseline = baselines.get(name, {})
+        regressions = get_regressions(result, baseline, args.threshold)
+        if regressions:
+            regressed.append(name)
+        queries = (
+            f"{baseline['queries']}->{result['queries']}" if "queries" in regressions else result["queries"]
+        )
+        writes = f"{baseline['writes']}->{result['writes']}" if "writes" in regressions else result["writes"]
+        print(
+            f"{name:<34}{result['p50_us']:>10.1f}{change(result['p50_us'], baseline.get('p50_us')):>7}"
+            f"{result['mean_us']:>10.1f}{result['peak_kib']:>10.1f}"
+            f"{change(result['peak_kib'], baseline.get('peak_kib')):>7}{queries:>9}{writes:>8}"
+            f"{'  REGRESSION ' + ','.join(regressions) if regressions else ''}"
+        )
+
+    if args.save:
+        with open(args.baselines, "w") as fh:
+            operations = {**baselines, **results} if args.filter else results
+            environment = {"python": platform.python_version(), "django": django.get_version()}
+            json.dump({"environment": environment, "operations": operations}, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"Baselines saved to {args.baselines}")
+    if regressed:
+        print(f"{len(regressed)} operations regressed more than {args.threshold}% or added queries.")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Per-call latency of a Mellat SOAP operation before and after caching the zeep client.
+
+before: a new ``zeep.Client`` is built from the remote WSDL for every call (download + parse).
+after:  the process-wide client built from the bundled WSDL is reused.
+
+A local HTTP server stands in for ``bpm.shaparak.ir`` and serves both the WSDL and the SOAP
+responses, so the numbers only measure the client side work. Run from the repository root:
+
+    python benchmarks/mellat_client.py --calls 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import django
+from django.conf import settings
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+settings.configure(INSTALLED_APPS=["azbankgateways"], USE_TZ=True)
+django.setup()
+
+from zeep import Client, Transport  # noqa: E402
+
+from azbankgateways.banks.mellat import MELLAT_WSDL, Mellat  # noqa: E402
+
+
+BINDING = "{http://interfaces.core.sw.bps.com/}PaymentGatewayImplServiceSoapBinding"
+SOAP_RESPONSE = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
+    '<ns2:bpInquiryRequestResponse xmlns:ns2="http://interfaces.core.sw.bps.com/">'
+    "<return>0</return></ns2:bpInquiryRequestResponse></soap:Body></soap:Envelope>"
+).encode()
+INQUIRY_DATA = {
+    "terminalId": 1234,
+    "userName": "user",
+    "userPassword": "password",
+    "orderId": 1,
+    "saleOrderId": 1,
+    "saleReferenceId": 1,
+}
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with open(MELLAT_WSDL, "rb") as fh:
+            self._reply(fh.read())
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self._reply(SOAP_RESPONSE)
+
+    def _reply(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def uncached_call(wsdl_url, address):
+    transport = Transport(timeout=5, operation_timeout=5)
+    client = Client(wsdl_url, transport=transport)
+    return client.create_service(BINDING, address).bpInquiryRequest(**INQUIRY_DATA)
+
+
+def cached_call(wsdl_url, address):
+    client = Mellat._get_cached_client(MELLAT_WSDL, 5)
+    return client.create_service(BINDING, address).bpInquiryRequest(**INQUIRY_DATA)
+
+
+def measure(func, calls, *args):
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "mean": statistics.mean(timings),
+        "p50": timings[len(timings) // 2],
+        "p95": timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--calls", type=int, default=100)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GatewayHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/pgwchannel/services/pgw"
+
+    rows = [
+        ("before (new client per call)", measure(uncached_call, args.calls, f"{base_url}?wsdl", base_url)),
+        ("after (cached client)", measure(cached_call, args.calls, f"{base_url}?wsdl", base_url)),
+    ]
+    server.shutdown()
+
+    print(
+        f"{'bpInquiryRequest, ' + str(args.calls) + ' calls':<32}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}"
+    )
+    for name, result in rows:
+        print(f"{name:<32}{result['mean']:>10.2f}{result['p50']:>10.2f}{result['p95']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
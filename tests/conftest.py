@@ -0,0 +1,23 @@
+import django
+from django.conf import settings
+
+
+def pytest_configure():
+    settings.configure(
+        DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}},
+        INSTALLED_APPS=["django.contrib.contenttypes", "django.contrib.auth", "azbankgateways"],
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        ROOT_URLCONF="tests.urls",
+        USE_TZ=True,
+        AZ_IRANIAN_BANK_GATEWAYS={
+            "GATEWAYS": {"ZIBAL": {"MERCHANT_CODE": "zibal"}},
+            "DEFAULT": "ZIBAL",
+        },
+    )
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
@@ -0,0 +1,21 @@
+import itertools
+
+from azbankgateways.models import Bank, BankType, PaymentStatus
+
+
+_sequence = itertools.count(1)
+
+
+def create_bank_record(status=PaymentStatus.REDIRECT_TO_BANK, **fields) -> Bank:
+    number = next(_sequence)
+    data = {
+        "status": status,
+        "bank_type": BankType.ZIBAL,
+        "tracking_code": str(10**15 + number),
+        "amount": 10000,
+        "reference_number": f"ref-{number}",
+        "callback_url": "https://example.com/done",
+        "bank_choose_identifier": "1",
+    }
+    data.update(fields)
+    return Bank.objects.create(**data)
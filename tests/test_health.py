@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from azbankgateways import default_settings as settings
+from azbankgateways.health import CircuitState, health_registry
+
+
+@mock.patch.multiple(
+    settings,
+    CIRCUIT_BREAKER_ENABLE=True,
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD=3,
+    CIRCUIT_BREAKER_RECOVERY_TIMEOUT=30,
+    CIRCUIT_BREAKER_SLOW_CALL_THRESHOLD=None,
+)
+class CircuitBreakerTest(SimpleTestCase):
+    bank_type = "ZIBAL"
+    identifier = "1"
+
+    def setUp(self):
+        cache.clear()
+
+    def _fail(self, count=1):
+        for _ in range(count):
+            health_registry.record(self.bank_type, self.identifier, False, 0.1)
+
+    def _state(self):
+        return health_registry.get_state(self.bank_type, self.identifier)
+
+    def _allow(self):
+        return health_registry.allow_request(self.bank_type, self.identifier)
+
+    def _open_long_ago(self):
+        key = health_registry._key(self.bank_type, self.identifier, "opened_at")
+        cache.set(key, cache.get(key) - settings.CIRCUIT_BREAKER_RECOVERY_TIMEOUT - 1, timeout=None)
+
+    def test_opens_after_consecutive_failures(self):
+        self._fail(2)
+        self.assertEqual(self._state(), CircuitState.CLOSED)
+        self.assertTrue(self._allow())
+
+        self._fail()
+
+        self.assertEqual(self._state(), CircuitState.OPEN)
+        self.assertFalse(self._allow())
+        self.assertFalse(health_registry.is_available(self.bank_type, self.identifier))
+
+    def test_success_resets_the_failures(self):
+        self._fail(2)
+        health_registry.record(self.bank_type, self.identifier, True, 0.1)
+        self._fail(2)
+
+        self.assertEqual(self._state(), CircuitState.CLOSED)
+
+    def test_half_open_allows_a_single_trial(self):
+        self._fail(3)
+        self._open_long_ago()
+
+        self.assertEqual(self._state(), CircuitState.HALF_OPEN)
+        self.assertTrue(health_registry.is_available(self.bank_type, self.identifier))
+        self.assertTrue(self._allow())
+        self.assertFalse(self._allow())
+
+    def test_successful_trial_closes_the_circuit(self):
+        self._fail(3)
+        self._open_long_ago()
+        self.assertTrue(self._allow())
+
+        health_registry.record(self.bank_type, self.identifier, True, 0.1)
+
+        self.assertEqual(self._state(), CircuitState.CLOSED)
+        self.assertTrue(self._allow())
+        self.assertEqual(health_registry.stats(self.bank_type, self.identifier)["failures"], 0)
+
+    def test_failed_trial_opens_the_circuit_again(self):
+        self._fail(3)
+        self._open_long_ago()
+        self.assertTrue(self._allow())
+
+        self._fail()
+
+        self.assertEqual(self._state(), CircuitState.OPEN)
+        self.assertFalse(self._allow())
+
+    def test_slow_call_is_a_failure(self):
+        with mock.patch.object(settings, "CIRCUIT_BREAKER_SLOW_CALL_THRESHOLD", 1):
+            for _ in range(3):
+                health_registry.record(self.bank_type, self.identifier, True, 2)
+
+        self.assertEqual(self._state(), CircuitState.OPEN)
+
+    def test_circuits_are_per_identifier(self):
+        self._fail(3)
+
+        self.assertTrue(health_registry.allow_request(self.bank_type, "2"))
+
+    def test_disabled_breaker_always_allows(self):
+        with mock.patch.object(settings, "CIRCUIT_BREAKER_ENABLE", False):
+            self._fail(5)
+            self.assertTrue(self._allow())
+        self.assertEqual(self._state(), CircuitState.CLOSED)
+        self.assertEqual(health_registry.stats(self.bank_type, self.identifier)["total_failures"], 5)
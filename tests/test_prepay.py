@@ -0,0 +1,52 @@
+from unittest import mock
+
+from django.test import RequestFactory, TestCase
+
+from azbankgateways.bankfactories import BankFactory
+from azbankgateways.banks import Zibal
+from azbankgateways.models import BankType
+
+
+class PrepayTest(TestCase):
+    def _create_bank(self):
+        bank = BankFactory().create(BankType.ZIBAL)
+        bank.set_request(RequestFactory().get("/"))
+        bank.set_amount(10000)
+        bank.set_client_callback_url("/done")
+        return bank
+
+    def _send_data(self):
+        responses = ({"result": 100, "trackId": f"track-{number}"} for number in range(1, 10))
+        return mock.patch.object(Zibal, "_send_data", side_effect=lambda *args, **kwargs: next(responses))
+
+    def test_ready_reuses_the_prepay_token(self):
+        bank = self._create_bank()
+
+        with self._send_data() as send_data:
+            bank.prepay()
+            record = bank.ready()
+
+        send_data.assert_called_once()
+        self.assertEqual(record.reference_number, "track-1")
+
+    def test_changed_payment_is_paid_again(self):
+        bank = self._create_bank()
+
+        with self._send_data() as send_data:
+            bank.prepay()
+            bank.set_amount(20000)
+            record = bank.ready()
+
+        self.assertEqual(send_data.call_count, 2)
+        self.assertEqual(send_data.call_args.args[1]["amount"], 20000)
+        self.assertEqual(record.amount, 20000)
+
+    def test_prepay_token_is_used_once(self):
+        bank = self._create_bank()
+
+        with self._send_data() as send_data:
+            bank.prepay()
+            bank.ready()
+            bank.ready()
+
+        self.assertEqual(send_data.call_count, 2)
@@ -0,0 +1,39 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from azbankgateways.rate_limit import rate_limiter
+
+
+class RateLimiterTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _acquire(self, limits, lease=30):
+        return rate_limiter.acquire("ZIBAL", "1", limits, lease)
+
+    def test_concurrency(self):
+        is_allowed, slot = self._acquire({"CONCURRENCY": 1})
+        self.assertTrue(is_allowed)
+        self.assertFalse(self._acquire({"CONCURRENCY": 1})[0])
+
+        rate_limiter.release(slot)
+
+        self.assertTrue(self._acquire({"CONCURRENCY": 1})[0])
+
+    def test_late_release_keeps_the_slot_of_another_call(self):
+        _, expired_slot = self._acquire({"CONCURRENCY": 1})
+        # the lease of the first call expires and another call takes the slot.
+        cache.delete(expired_slot[0])
+        is_allowed, slot = self._acquire({"CONCURRENCY": 1})
+        self.assertTrue(is_allowed)
+
+        rate_limiter.release(expired_slot)
+
+        self.assertFalse(self._acquire({"CONCURRENCY": 1})[0])
+        rate_limiter.release(slot)
+        self.assertTrue(self._acquire({"CONCURRENCY": 1})[0])
+
+    def test_rate(self):
+        limits = {"RATE": 2, "PERIOD": 60}
+
+        self.assertEqual([self._acquire(limits)[0] for _ in range(3)], [True, True, False])
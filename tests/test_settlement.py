@@ -0,0 +1,101 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from azbankgateways import default_settings as settings
+from azbankgateways.banks import Zibal
+from azbankgateways.models import Bank, PaymentStatus, SettlementStatus
+from azbankgateways.settlement import settle_records
+
+from .factories import create_bank_record
+
+
+@mock.patch.object(settings, "SETTLEMENT_RETRY_DELAY", 60)
+class SettleRecordsTest(TestCase):
+    def _create_pending(self, status=PaymentStatus.COMPLETE):
+        return create_bank_record(status=status, settlement_status=SettlementStatus.PENDING)
+
+    def _settle(self, succeeded=True, **kwargs):
+        with mock.patch.object(Zibal, "settle", return_value=succeeded) as settle:
+            result = settle_records(max_workers=1, **kwargs)
+        return result, settle
+
+    def _retry_later(self, record):
+        Bank.objects.filter(pk=record.pk).update(
+            update_at=timezone.now() - datetime.timedelta(seconds=settings.SETTLEMENT_RETRY_DELAY + 1)
+        )
+
+    def test_new_records_are_settled_at_once(self):
+        records = [self._create_pending() for _ in range(3)]
+
+        result, _ = self._settle()
+
+        self.assertEqual(result, {"settled": 3, "failed": 0, "retry": 0, "is_finished": True})
+        for record in records:
+            record.refresh_from_db()
+            self.assertEqual(record.settlement_status, SettlementStatus.SETTLED)
+            self.assertEqual(record.settlement_attempts, 1)
+            self.assertIsNotNone(record.settled_at)
+
+    def test_only_pending_completed_records_are_claimed(self):
+        self._create_pending(status=PaymentStatus.RETURN_FROM_BANK)
+        create_bank_record(status=PaymentStatus.COMPLETE, settlement_status=SettlementStatus.SETTLED)
+        create_bank_record(status=PaymentStatus.COMPLETE)
+
+        result, settle = self._settle()
+
+        self.assertEqual(result["settled"], 0)
+        settle.assert_not_called()
+
+    def test_failed_settlement_waits_for_the_retry_delay(self):
+        record = self._create_pending()
+
+        result, _ = self._settle(succeeded=False)
+        self.assertEqual(result["retry"], 1)
+
+        result, settle = self._settle()
+        self.assertEqual(result["settled"], 0)
+        settle.assert_not_called()
+
+        self._retry_later(record)
+        result, _ = self._settle()
+        self.assertEqual(result["settled"], 1)
+        record.refresh_from_db()
+        self.assertEqual(record.settlement_status, SettlementStatus.SETTLED)
+        self.assertEqual(record.settlement_attempts, 2)
+
+    def test_settlement_fails_after_max_attempts(self):
+        record = self._create_pending()
+
+        for _ in range(2):
+            result, _ = self._settle(succeeded=False, max_attempts=2)
+            self._retry_later(record)
+
+        self.assertEqual(result["failed"], 1)
+        record.refresh_from_db()
+        self.assertEqual(record.settlement_status, SettlementStatus.FAILED)
+        result, settle = self._settle(max_attempts=2)
+        settle.assert_not_called()
+
+    def test_gateway_error_is_retried(self):
+        record = self._create_pending()
+
+        with mock.patch.object(Zibal, "settle", side_effect=ConnectionError):
+            result = settle_records(max_workers=1)
+
+        self.assertEqual(result["retry"], 1)
+        record.refresh_from_db()
+        self.assertEqual(record.settlement_status, SettlementStatus.PENDING)
+        self.assertEqual(record.settlement_attempts, 1)
+
+    def test_batches(self):
+        for _ in range(5):
+            self._create_pending()
+        progress = mock.Mock()
+
+        result, _ = self._settle(batch_size=2, progress=progress)
+
+        self.assertEqual(result["settled"], 5)
+        self.assertEqual(progress.call_count, 3)
@@ -0,0 +1,84 @@
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from azbankgateways import default_settings as settings
+from azbankgateways.single_flight import callback_single_flight
+
+
+@mock.patch.multiple(settings, CALLBACK_SINGLE_FLIGHT_ENABLE=True, CALLBACK_SINGLE_FLIGHT_WAIT=5)
+class CallbackSingleFlightTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_later_duplicate_reuses_the_result(self):
+        verify = mock.Mock(return_value=("/done?tc=1", True))
+
+        self.assertEqual(callback_single_flight.run("ZIBAL", "ref", verify), "/done?tc=1")
+        self.assertEqual(callback_single_flight.run("ZIBAL", "ref", verify), "/done?tc=1")
+
+        verify.assert_called_once()
+
+    def test_retryable_result_is_not_reused(self):
+        verify = mock.Mock(return_value=("/done?tc=1", False))
+
+        callback_single_flight.run("ZIBAL", "ref", verify)
+        callback_single_flight.run("ZIBAL", "ref", verify)
+
+        self.assertEqual(verify.call_count, 2)
+
+    def test_concurrent_duplicates_wait_for_the_first(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def verify():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "/done?tc=1", True
+
+        urls = []
+        first = threading.Thread(
+            target=lambda: urls.append(callback_single_flight.run("ZIBAL", "ref", verify))
+        )
+        first.start()
+        started.wait(5)
+        duplicate = threading.Thread(
+            target=lambda: urls.append(callback_single_flight.run("ZIBAL", "ref", verify))
+        )
+        duplicate.start()
+        release.set()
+        first.join()
+        duplicate.join()
+
+        self.assertEqual(urls, ["/done?tc=1", "/done?tc=1"])
+        self.assertEqual(len(calls), 1)
+
+    def test_references_are_separate(self):
+        verify = mock.Mock(return_value=("/done", True))
+
+        callback_single_flight.run("ZIBAL", "ref-1", verify)
+        callback_single_flight.run("ZIBAL", "ref-2", verify)
+        callback_single_flight.run("SEP", "ref-1", verify)
+
+        self.assertEqual(verify.call_count, 3)
+
+    def test_disabled(self):
+        verify = mock.Mock(return_value=("/done", True))
+
+        with mock.patch.object(settings, "CALLBACK_SINGLE_FLIGHT_ENABLE", False):
+            callback_single_flight.run("ZIBAL", "ref", verify)
+            callback_single_flight.run("ZIBAL", "ref", verify)
+
+        self.assertEqual(verify.call_count, 2)
+
+    async def test_arun(self):
+        averify = mock.AsyncMock(return_value=("/done?tc=1", True))
+
+        self.assertEqual(await callback_single_flight.arun("ZIBAL", "ref", averify), "/done?tc=1")
+        self.assertEqual(await callback_single_flight.arun("ZIBAL", "ref", averify), "/done?tc=1")
+
+        averify.assert_awaited_once()
@@ -0,0 +1,93 @@
+from django.test import TestCase
+
+from azbankgateways.models import Bank, PaymentStatus
+
+from .factories import create_bank_record
+
+
+class BankTransitionTest(TestCase):
+    def test_legal_transition(self):
+        record = create_bank_record()
+
+        self.assertTrue(record.transition(PaymentStatus.RETURN_FROM_BANK))
+
+        self.assertEqual(record.status, PaymentStatus.RETURN_FROM_BANK)
+        record.refresh_from_db()
+        self.assertEqual(record.status, PaymentStatus.RETURN_FROM_BANK)
+
+    def test_illegal_transition_is_rejected(self):
+        record = create_bank_record(status=PaymentStatus.WAITING)
+
+        self.assertFalse(record.transition(PaymentStatus.COMPLETE))
+
+        self.assertEqual(record.status, PaymentStatus.WAITING)
+        record.refresh_from_db()
+        self.assertEqual(record.status, PaymentStatus.WAITING)
+
+    def test_stale_record_loses_the_swap(self):
+        record = create_bank_record()
+        stale = Bank.objects.get(pk=record.pk)
+
+        self.assertTrue(record.transition(PaymentStatus.RETURN_FROM_BANK))
+        self.assertTrue(record.transition(PaymentStatus.COMPLETE))
+        # the other process still sees REDIRECT_TO_BANK, the record is COMPLETE already.
+        self.assertFalse(stale.transition(PaymentStatus.RETURN_FROM_BANK))
+
+        self.assertEqual(stale.status, PaymentStatus.REDIRECT_TO_BANK)
+        record.refresh_from_db()
+        self.assertEqual(record.status, PaymentStatus.COMPLETE)
+
+    def test_only_one_of_concurrent_callbacks_claims_the_record(self):
+        record = create_bank_record()
+        first = Bank.objects.get(pk=record.pk)
+        second = Bank.objects.get(pk=record.pk)
+
+        self.assertTrue(first.transition(PaymentStatus.RETURN_FROM_BANK))
+        self.assertFalse(second.transition(PaymentStatus.RETURN_FROM_BANK))
+
+    def test_update_fields_are_saved_with_the_status(self):
+        record = create_bank_record()
+        record.response_result = "paid"
+        record.amount = 1
+
+        self.assertTrue(record.transition(PaymentStatus.RETURN_FROM_BANK, update_fields=["response_result"]))
+
+        record.refresh_from_db()
+        self.assertEqual(record.response_result, "paid")
+        self.assertEqual(record.amount, 10000)
+
+    def test_update_fields_are_not_saved_by_a_rejected_transition(self):
+        record = create_bank_record(status=PaymentStatus.COMPLETE)
+        record.response_result = "paid"
+
+        self.assertFalse(record.transition(PaymentStatus.RETURN_FROM_BANK, update_fields=["response_result"]))
+
+        record.refresh_from_db()
+        self.assertIsNone(record.response_result)
+
+    def test_queryset_transition_changes_only_legal_records(self):
+        returned = create_bank_record(status=PaymentStatus.RETURN_FROM_BANK)
+        completed = create_bank_record(status=PaymentStatus.COMPLETE)
+
+        changed = Bank.objects.filter(pk__in=[returned.pk, completed.pk]).transition(
+            PaymentStatus.EXPIRE_VERIFY_PAYMENT
+        )
+
+        self.assertEqual(changed, 1)
+        returned.refresh_from_db()
+        completed.refresh_from_db()
+        self.assertEqual(returned.status, PaymentStatus.EXPIRE_VERIFY_PAYMENT)
+        self.assertEqual(completed.status, PaymentStatus.COMPLETE)
+
+    async def test_atransition(self):
+        record = await Bank.objects.acreate(
+            status=PaymentStatus.REDIRECT_TO_BANK,
+            bank_type="ZIBAL",
+            tracking_code="1",
+            amount=10000,
+            reference_number="async-ref",
+            callback_url="https://example.com/done",
+        )
+
+        self.assertTrue(await record.atransition(PaymentStatus.RETURN_FROM_BANK))
+        self.assertFalse(await record.atransition(PaymentStatus.WAITING))
@@ -0,0 +1,59 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from azbankgateways import default_settings as settings
+from azbankgateways.models import Bank, PaymentStatus
+from azbankgateways.verify_queue import DatabaseVerifyQueue
+
+from .factories import create_bank_record
+
+
+@mock.patch.multiple(settings, VERIFY_QUEUE_LEASE=60, VERIFY_QUEUE_MAX_ATTEMPTS=2)
+class DatabaseVerifyQueueTest(TestCase):
+    def setUp(self):
+        self.queue = DatabaseVerifyQueue()
+
+    def _enqueue(self, **fields):
+        fields.setdefault("callback_payload", {"method": "GET", "GET": {}, "POST": {}, "attempts": 0})
+        return create_bank_record(status=PaymentStatus.RETURN_FROM_BANK, **fields)
+
+    def _lease_expired(self, record):
+        Bank.objects.filter(pk=record.pk).update(
+            update_at=timezone.now() - datetime.timedelta(seconds=settings.VERIFY_QUEUE_LEASE + 1)
+        )
+
+    def test_dequeue_claims_queued_records(self):
+        record = self._enqueue()
+        self._enqueue(callback_payload=None)
+        create_bank_record(status=PaymentStatus.COMPLETE, callback_payload={"attempts": 0})
+
+        claimed = self.queue.dequeue(10)
+
+        self.assertEqual([item.pk for item in claimed], [record.pk])
+        record.refresh_from_db()
+        self.assertEqual(record.callback_payload["attempts"], 1)
+
+    def test_claimed_record_is_not_claimed_again_during_the_lease(self):
+        self._enqueue()
+
+        self.assertEqual(len(self.queue.dequeue(10)), 1)
+        self.assertEqual(self.queue.dequeue(10), [])
+
+    def test_record_is_claimed_again_after_the_lease(self):
+        record = self._enqueue()
+        self.queue.dequeue(10)
+
+        self._lease_expired(record)
+
+        self.assertEqual([item.pk for item in self.queue.dequeue(10)], [record.pk])
+
+    def test_record_leaves_the_queue_after_max_attempts(self):
+        record = self._enqueue()
+        for _ in range(2):
+            self.assertEqual(len(self.queue.dequeue(10)), 1)
+            self._lease_expired(record)
+
+        self.assertEqual(self.queue.dequeue(10), [])
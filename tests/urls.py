@@ -0,0 +1,8 @@
+from django.urls import path
+
+from azbankgateways.urls import az_bank_gateways_urls
+
+
+urlpatterns = [
+    path("bankgateways/", az_bank_gateways_urls()),
+]